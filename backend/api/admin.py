@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import EquipmentDataset
+from .models import EquipmentDataset, RetentionPolicy, UploadJob
 
 
 @admin.register(EquipmentDataset)
@@ -7,4 +7,18 @@ class EquipmentDatasetAdmin(admin.ModelAdmin):
     list_display = ('filename', 'user', 'row_count', 'uploaded_at')
     list_filter = ('uploaded_at', 'user')
     search_fields = ('filename', 'user__username')
-    readonly_fields = ('uploaded_at', 'raw_data', 'summary_stats', 'equipment_types')
+    readonly_fields = ('uploaded_at', 'rows_file', 'raw_data', 'summary_stats', 'equipment_types')
+
+
+@admin.register(UploadJob)
+class UploadJobAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'user', 'status', 'progress', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('filename', 'user__username')
+    readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(RetentionPolicy)
+class RetentionPolicyAdmin(admin.ModelAdmin):
+    list_display = ('user', 'keep_count')
+    search_fields = ('user__username',)
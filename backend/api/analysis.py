@@ -0,0 +1,64 @@
+"""
+Whole-dataset analysis run once per upload over the stored columns.
+
+Results such as per-type percentiles and anomaly flags depend on every
+value of a column, so they cannot come from the running per-chunk
+statistics. They are computed after the row file is written, in two
+passes over its record batches (see DatasetAnalysis) reading only the
+type and numeric columns; the few rows reported as top anomalies are
+fetched by position afterwards.
+"""
+import pandas as pd
+from django.conf import settings
+
+from .storage import iter_row_batches, take_rows
+from .utils import DatasetAnalysis, get_numeric_columns, get_text_columns
+
+
+def analysis_columns():
+    """Columns of the rows reported with the analysis."""
+    return get_text_columns() + get_numeric_columns()
+
+
+def run_analysis(chunks, fetch_rows):
+    """
+    Run every upload-time analysis. 'chunks' returns a fresh iterator of
+    DataFrames each time it is called; 'fetch_rows' returns the rows at
+    the given positions as a DataFrame.
+    """
+    analysis = DatasetAnalysis(
+        settings.HISTOGRAM_BINS, settings.QUANTILE_SKETCH_COMPRESSION,
+        settings.ANOMALY_Z_THRESHOLD, settings.ANOMALY_IQR_FACTOR,
+        top=settings.REPORT_MAX_ANOMALIES
+    )
+    for df in chunks():
+        analysis.observe(df)
+    for df in chunks():
+        analysis.evaluate(df)
+    
+    return {
+        'type_stats': analysis.type_statistics(),
+        'distributions': analysis.distributions(),
+        'anomalies': analysis.anomalies(fetch_rows),
+    }
+
+
+def analyze_frame(df):
+    """Run every upload-time analysis over the rows of one DataFrame."""
+    return run_analysis(lambda: [df], lambda rows: df.iloc[rows])
+
+
+def analyze_rows(name):
+    """
+    Analyze a stored row file batch by batch; an empty name (no rows)
+    yields empty results.
+    """
+    if not name:
+        return analyze_frame(pd.DataFrame(columns=analysis_columns()))
+    
+    columns = ['Type'] + get_numeric_columns()
+    return run_analysis(
+        lambda: (batch.to_pandas() for batch in iter_row_batches(name, columns)),
+        lambda rows: take_rows(name, rows, analysis_columns()).to_pandas(),
+    )
+
@@ -0,0 +1,93 @@
+"""
+Token authentication with cached token lookups.
+"""
+import hashlib
+import threading
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import LRUCache
+
+
+_token_cache = None
+_token_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """Return the process-wide LRU of authenticated tokens."""
+    global _token_cache
+    with _token_cache_lock:
+        if _token_cache is None:
+            _token_cache = LRUCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
+        return _token_cache
+
+
+def _cache_key(key):
+    # Never use the raw token as a cache key
+    return f'auth-token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def invalidate_token(key):
+    """Drop a token from the in-process LRU and the shared Django cache."""
+    cache_key = _cache_key(key)
+    get_token_cache().delete(cache_key)
+    cache.delete(cache_key)
+
+
+# User fields kept with a cached token; the password hash never is
+CACHED_USER_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'email',
+    'is_staff', 'is_active', 'is_superuser', 'last_login', 'date_joined',
+)
+
+
+def _user_state(user):
+    return {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+
+
+def _user_from_state(state):
+    """
+    Build a fresh User from cached fields without a query. Fields that
+    are not cached (the password) are deferred, so they load on access
+    and save() never overwrites them.
+    """
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in state]
+    return User.from_db(None, fields, [state[field] for field in fields])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that remembers the user of a token for
+    TOKEN_CACHE_TTL seconds, first in an in-process LRU and then in the
+    Django cache, so repeated requests with the same token need no
+    Token or User query. Only the user's non-secret fields are cached
+    and every request gets its own User built from them.
+    
+    Logout, deactivation and password changes invalidate the token in
+    this process and in the Django cache (see the signals in models).
+    Other processes keep their in-process copy, and with a per-process
+    Django cache (the default) their cached entry too, so there a
+    logout or deactivation takes effect up to TOKEN_CACHE_TTL seconds
+    later.
+    """
+    
+    def authenticate_credentials(self, key):
+        cache_key = _cache_key(key)
+        local = get_token_cache()
+        
+        state = local.get(cache_key)
+        if state is None:
+            state = cache.get(cache_key)
+            if state is None:
+                # Raises AuthenticationFailed for unknown tokens and inactive users
+                user, token = super().authenticate_credentials(key)
+                state = _user_state(user)
+                cache.set(cache_key, state, settings.TOKEN_CACHE_TTL)
+                local.set(cache_key, state)
+                return user, token
+            local.set(cache_key, state)
+        
+        user = _user_from_state(state)
+        return user, self.get_model()(key=key, user=user)
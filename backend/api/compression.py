@@ -0,0 +1,202 @@
+"""
+Response body compression and the pre-compressed payload cache.
+
+Encodings are chosen from the client's Accept-Encoding in the order of
+COMPRESSION_ENCODINGS; brotli and zstd are used only when their packages
+are installed. Streaming bodies are compressed chunk by chunk. Dataset
+payloads never change after upload, so their compressed bodies are kept
+under MEDIA_ROOT/compressed and reused.
+"""
+import glob
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSED_DIR = 'compressed'
+
+# Bytes per chunk when streaming a stored compressed body
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _compress_gzip(content, level):
+    return gzip.compress(content, compresslevel=level, mtime=0)
+
+
+def _compress_brotli(content, level):
+    return brotli.compress(content, quality=level)
+
+
+def _compress_zstd(content, level):
+    return zstandard.ZstdCompressor(level=level).compress(content)
+
+
+def get_codecs():
+    """Return {encoding: compress function} for the installed codecs."""
+    codecs = {'gzip': _compress_gzip}
+    if brotli is not None:
+        codecs['br'] = _compress_brotli
+    if zstandard is not None:
+        codecs['zstd'] = _compress_zstd
+    return codecs
+
+
+def _gzip_stream(level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+def _brotli_stream(level):
+    compressor = brotli.Compressor(quality=level)
+    return compressor.process, compressor.finish
+
+
+def _zstd_stream(level):
+    compressor = zstandard.ZstdCompressor(level=level).compressobj()
+    return compressor.compress, compressor.flush
+
+
+def get_stream_codecs():
+    """
+    Return {encoding: factory} for the installed codecs; a factory takes
+    the level and returns (compress chunk, finish) functions.
+    """
+    codecs = {'gzip': _gzip_stream}
+    if brotli is not None:
+        codecs['br'] = _brotli_stream
+    if zstandard is not None:
+        codecs['zstd'] = _zstd_stream
+    return codecs
+
+
+def parse_accept_encoding(header):
+    """Parse an Accept-Encoding header into {encoding: quality}."""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    """
+    Pick the preferred configured encoding the client accepts, or None.
+    """
+    accepted = parse_accept_encoding(header)
+    codecs = get_codecs()
+    for encoding in settings.COMPRESSION_ENCODINGS:
+        if encoding not in codecs:
+            continue
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def compress(content, encoding):
+    """Compress bytes with the given encoding at its configured level."""
+    return get_codecs()[encoding](content, settings.COMPRESSION_LEVELS[encoding])
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of byte chunks incrementally."""
+    compress_chunk, finish = get_stream_codecs()[encoding](settings.COMPRESSION_LEVELS[encoding])
+    for chunk in chunks:
+        compressed = compress_chunk(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
+
+
+def _cache_path(dataset_id, key, encoding):
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return default_storage.path(f'{COMPRESSED_DIR}/{int(dataset_id)}-{digest}.{encoding}')
+
+
+def get_compressed(dataset_id, key, content, encoding):
+    """
+    Return 'content' compressed with 'encoding', reusing the stored copy
+    for the dataset payload identified by 'key' (host and ETag).
+    """
+    path = _cache_path(dataset_id, key, encoding)
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    
+    compressed = compress(content, encoding)
+    
+    # Write atomically so concurrent readers never see a partial body
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(compressed)
+    os.replace(tmp_path, path)
+    return compressed
+
+
+def get_compressed_stream(dataset_id, key, chunks, encoding):
+    """
+    Streaming counterpart of get_compressed: yield the stored compressed
+    body if there is one, else compress 'chunks' as they come and store
+    the result once the whole body has been sent.
+    """
+    path = _cache_path(dataset_id, key, encoding)
+    try:
+        stored = open(path, 'rb')
+    except FileNotFoundError:
+        stored = None
+    if stored is not None:
+        with stored:
+            yield from iter(lambda: stored.read(STREAM_CHUNK_SIZE), b'')
+        return
+    
+    # A body cut short (e.g. by a disconnect) is never stored
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            for compressed in compress_stream(chunks, encoding):
+                f.write(compressed)
+                yield compressed
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def evict_compressed(dataset_ids):
+    """Remove every stored compressed payload of the given datasets."""
+    for dataset_id in dataset_ids:
+        pattern = default_storage.path(f'{COMPRESSED_DIR}/{int(dataset_id)}-*')
+        for path in glob.glob(pattern):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
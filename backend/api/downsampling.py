@@ -0,0 +1,93 @@
+"""
+Downsampling of long numeric series for trend charts.
+
+Both methods keep the shape of the series at a fixed number of points:
+Largest-Triangle-Three-Buckets keeps the visually most significant point
+of each bucket, min/max bucketing keeps the extremes of each bucket.
+"""
+import numpy as np
+
+
+def _bucket_bounds(length, buckets):
+    """Start/end indices of 'buckets' near-equal buckets over 'length' points."""
+    bounds = np.linspace(0, length, buckets + 1).astype(np.int64)
+    return bounds[:-1], bounds[1:]
+
+
+def lttb(x, y, points):
+    """
+    Downsample (x, y) to 'points' points with Largest-Triangle-Three-Buckets.
+    The first and last points are always kept. Returns index positions of
+    the selected points.
+    """
+    length = len(y)
+    if points >= length or points < 3:
+        return np.arange(length)
+    
+    # Interior points are split into points - 2 buckets (the bounds are
+    # views of one array, so shift them without updating in place)
+    starts, ends = _bucket_bounds(length - 2, points - 2)
+    starts, ends = starts + 1, ends + 1
+    
+    # Average of every bucket, used as the third triangle vertex
+    sums_x = np.add.reduceat(x[1:-1], starts - 1)
+    sums_y = np.add.reduceat(y[1:-1], starts - 1)
+    sizes = ends - starts
+    avg_x = np.append(sums_x / sizes, x[-1])
+    avg_y = np.append(sums_y / sizes, y[-1])
+    
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+    
+    previous = 0
+    for bucket in range(points - 2):
+        start, end = starts[bucket], ends[bucket]
+        # Twice the triangle area for every candidate in the bucket at once
+        area = np.abs(
+            (x[previous] - avg_x[bucket + 1]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y[bucket + 1] - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    
+    return selected
+
+
+def minmax(y, points):
+    """
+    Downsample 'y' by keeping the minimum and maximum of each of
+    points // 2 buckets, in order. Returns index positions of the
+    selected points.
+    """
+    length = len(y)
+    buckets = points // 2
+    if points >= length or buckets < 1:
+        return np.arange(length)
+    
+    starts, ends = _bucket_bounds(length, buckets)
+    bucket_ids = np.repeat(np.arange(buckets), ends - starts)
+    
+    # Sort by (bucket, value): the first and last of each bucket are its extremes
+    order = np.lexsort((y, bucket_ids))
+    lows = order[starts]
+    highs = order[ends - 1]
+    
+    return np.unique(np.concatenate([lows, highs]))
+
+
+DOWNSAMPLERS = {
+    'lttb': lambda x, y, points: lttb(x, y, points),
+    'minmax': lambda x, y, points: minmax(y, points),
+}
+
+
+def downsample(x, y, points, method='lttb'):
+    """
+    Downsample a series with the given method, dropping missing values
+    first. Returns the selected (x, y) arrays.
+    """
+    present = ~np.isnan(y)
+    x, y = x[present], y[present]
+    selected = DOWNSAMPLERS[method](x, y, points)
+    return x[selected], y[selected]
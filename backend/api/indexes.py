@@ -0,0 +1,290 @@
+"""
+In-memory indexes for querying and searching dataset rows without a
+full scan.
+
+Indexes are built from the stored columns the first time a dataset is
+queried and kept in a bounded process-wide LRU, next to the batch
+offsets of its row file, so result pages are read from the memory map
+by row id. Datasets never change after upload, so an index stays valid
+for as long as it is cached; the upload time is part of the cache key
+so a reused id never sees a stale index.
+"""
+import bisect
+import collections
+import threading
+import numpy as np
+import pyarrow as pa
+from django.conf import settings
+
+from .cache import LRUCache
+from .storage import batch_offsets
+from .utils import get_numeric_columns, get_text_columns
+
+
+# Substring search indexes names by n-grams of this many characters
+NGRAM_SIZE = 3
+
+
+_index_cache = None
+_index_cache_lock = threading.Lock()
+
+
+def get_index_cache():
+    """Return the process-wide LRU of dataset indexes."""
+    global _index_cache
+    with _index_cache_lock:
+        if _index_cache is None:
+            _index_cache = LRUCache(settings.QUERY_INDEX_CACHE_SIZE, settings.QUERY_INDEX_CACHE_TTL)
+        return _index_cache
+
+
+def _page(rows, valid, descending, offset, limit):
+    """
+    Slice one page out of 'rows', whose first 'valid' entries are in
+    ascending order and the rest have missing values. Descending pages
+    reverse the valued part only, so missing values always come last.
+    """
+    if not descending:
+        return rows[offset:offset + limit]
+    
+    head = rows[:valid][::-1][offset:offset + limit]
+    tail_offset = max(offset - valid, 0)
+    tail = rows[valid:][tail_offset:tail_offset + limit - len(head)]
+    return np.concatenate([head, tail])
+
+
+class RowIndex:
+    """
+    Query index over the rows of one dataset: a row-id bitmap and row-id
+    list per equipment type, and per numeric column the row ids in value
+    order next to the sorted values (missing values last). Type filters
+    are a dictionary lookup and range filters a binary search, so a
+    selective query touches only the rows it returns.
+    """
+    
+    def __init__(self, types, columns):
+        self.row_count = len(types)
+        
+        # Type -> row ids, as a bitmap for membership and a list for scans
+        encoded = types.combine_chunks().dictionary_encode()
+        codes = encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+        labels = encoded.dictionary.to_pylist()
+        self.type_bitmaps = {}
+        self.type_rows = {}
+        for code, label in enumerate(labels):
+            bitmap = codes == code
+            self.type_bitmaps[label] = bitmap
+            self.type_rows[label] = np.flatnonzero(bitmap)
+        
+        # Column -> values in row order, row ids in value order, sorted values
+        self.values = {}
+        self.orders = {}
+        self.sorted_values = {}
+        self.valid_counts = {}
+        for name, values in columns.items():
+            order = np.argsort(values, kind='stable')
+            self.values[name] = values
+            self.orders[name] = order
+            self.sorted_values[name] = values[order]
+            self.valid_counts[name] = int(np.count_nonzero(~np.isnan(values)))
+    
+    @classmethod
+    def from_table(cls, table):
+        """Build the index from an Arrow table of the Type and numeric columns."""
+        columns = {
+            name: table.column(name).to_numpy(zero_copy_only=False).astype(np.float64)
+            for name in get_numeric_columns()
+        }
+        return cls(table.column('Type'), columns)
+    
+    def _bounds(self, column, low, high):
+        """Positions in the sorted values of 'column' within [low, high]."""
+        sorted_values = self.sorted_values[column][:self.valid_counts[column]]
+        start = 0 if low is None else int(np.searchsorted(sorted_values, low, side='left'))
+        stop = len(sorted_values) if high is None else int(np.searchsorted(sorted_values, high, side='right'))
+        return start, max(start, stop)
+    
+    def query(self, equipment_type=None, ranges=None, sort=None, descending=False, offset=0, limit=None):
+        """
+        Return (total, row ids of the requested page) for rows of
+        'equipment_type' whose values fall within every (low, high) range
+        of 'ranges' (either bound may be None). Rows come in row order,
+        or ordered by the 'sort' column with missing values last.
+        """
+        ranges = ranges or {}
+        limit = self.row_count if limit is None else limit
+        
+        # Start from the smallest candidate set: a type or the narrowest range
+        bounds = {column: self._bounds(column, low, high) for column, (low, high) in ranges.items()}
+        driver = min(bounds, key=lambda column: bounds[column][1] - bounds[column][0], default=None)
+        if equipment_type is not None:
+            type_rows = self.type_rows.get(equipment_type, np.empty(0, dtype=np.int64))
+            if driver is None or len(type_rows) <= bounds[driver][1] - bounds[driver][0]:
+                driver = None
+        
+        if driver is not None:
+            start, stop = bounds[driver]
+            candidates = self.orders[driver][start:stop]
+        elif equipment_type is not None:
+            candidates = type_rows
+        else:
+            # No filters: page straight out of the row or sort order
+            if sort is None:
+                return self.row_count, np.arange(offset, min(offset + limit, self.row_count))
+            page = _page(self.orders[sort], self.valid_counts[sort], descending, offset, limit)
+            return self.row_count, page
+        
+        # Check the remaining filters on the candidates only
+        keep = np.ones(len(candidates), dtype=bool)
+        if equipment_type is not None and driver is not None:
+            keep &= self.type_bitmaps.get(equipment_type, np.zeros(self.row_count, dtype=bool))[candidates]
+        for column, (low, high) in ranges.items():
+            if column == driver:
+                continue
+            values = self.values[column][candidates]
+            keep &= ~np.isnan(values)
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+        candidates = candidates[keep]
+        
+        # Candidates are in 'driver' value order, or row order without a driver
+        valid = len(candidates)
+        if sort is None:
+            if driver is not None:
+                candidates = np.sort(candidates)
+            descending = False
+        elif sort != driver:
+            values = self.values[sort][candidates]
+            candidates = candidates[np.argsort(values, kind='stable')]
+            valid = int(np.count_nonzero(~np.isnan(values)))
+        return len(candidates), _page(candidates, valid, descending, offset, limit)
+
+
+def _ngrams(text):
+    """The distinct n-grams of a string (none if it is shorter than NGRAM_SIZE)."""
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+class NameIndex:
+    """
+    Search index over equipment names, matched case-insensitively: the
+    names in sorted order for prefix lookups by binary search, and an
+    n-gram -> row ids map for substring lookups. Matches come back in
+    name order.
+    """
+    
+    def __init__(self, names, types):
+        self.names = names
+        self.types = np.array(types, dtype=object)
+        self.keys = [(name or '').lower() for name in names]
+        
+        # Row ids in name order, the sorted names and each row's position
+        order = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+        self.order = np.array(order, dtype=np.int64)
+        self.sorted_keys = [self.keys[row] for row in order]
+        self.ranks = np.empty(len(order), dtype=np.int64)
+        self.ranks[self.order] = np.arange(len(order))
+        
+        postings = collections.defaultdict(list)
+        for row, key in enumerate(self.keys):
+            for gram in _ngrams(key):
+                postings[gram].append(row)
+        self.ngrams = {gram: np.array(rows, dtype=np.int64) for gram, rows in postings.items()}
+    
+    @classmethod
+    def from_table(cls, table):
+        """Build the index from an Arrow table of the Equipment Name and Type columns."""
+        return cls(table.column('Equipment Name').to_pylist(), table.column('Type').to_pylist())
+    
+    def prefix(self, text):
+        """Row ids of names starting with 'text', in name order."""
+        text = text.lower()
+        start = bisect.bisect_left(self.sorted_keys, text)
+        stop = bisect.bisect_left(self.sorted_keys, text + '\U0010ffff')
+        return self.order[start:stop]
+    
+    def substring(self, text):
+        """Row ids of names containing 'text', in name order."""
+        text = text.lower()
+        grams = _ngrams(text)
+        if grams:
+            # Rows holding every n-gram of the text, smallest posting list first
+            postings = sorted((self.ngrams.get(gram, np.empty(0, dtype=np.int64)) for gram in grams), key=len)
+            candidates = postings[0]
+            for rows in postings[1:]:
+                candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        else:
+            # Too short for n-grams: check every name
+            candidates = self.order
+        
+        # N-grams can match out of order, so confirm each candidate
+        matches = np.array([row for row in candidates if text in self.keys[row]], dtype=np.int64)
+        return matches[np.argsort(self.ranks[matches], kind='stable')]
+    
+    def search(self, text, mode='prefix', equipment_type=None, limit=None):
+        """
+        Return (total, row ids of the first 'limit' matches) for names
+        matching 'text' by 'prefix' or 'substring', optionally within one
+        equipment type.
+        """
+        rows = self.prefix(text) if mode == 'prefix' else self.substring(text)
+        if equipment_type is not None:
+            rows = rows[self.types[rows] == equipment_type]
+        return len(rows), rows[:limit]
+
+
+def _cache_key(kind, dataset):
+    """Index cache key of one kind of index of a dataset."""
+    return (kind, dataset.id, int(dataset.uploaded_at.timestamp() * 1000000))
+
+
+def _get_index(dataset, kind, columns):
+    """
+    Return a cached index of a dataset, building it from 'columns' if
+    needed.
+    """
+    cache = get_index_cache()
+    key = _cache_key(kind.__name__, dataset)
+    index = cache.get(key)
+    if index is None:
+        if dataset.row_count:
+            table = dataset.load_table(columns)
+        else:
+            text_columns = get_text_columns()
+            table = pa.table({
+                name: pa.array([], pa.string() if name in text_columns else pa.float64())
+                for name in columns
+            })
+        index = kind.from_table(table)
+        cache.set(key, index)
+    return index
+
+
+def get_row_index(dataset):
+    """Return the query index of a dataset, building and caching it if needed."""
+    return _get_index(dataset, RowIndex, ['Type'] + get_numeric_columns())
+
+
+def get_name_index(dataset):
+    """Return the name search index of a dataset, building and caching it if needed."""
+    return _get_index(dataset, NameIndex, ['Equipment Name', 'Type'])
+
+
+def get_batch_offsets(dataset):
+    """
+    Return the first row of every record batch of a dataset's row file
+    (see storage.batch_offsets), finding and caching them if needed.
+    Datasets without a row file have none.
+    """
+    if not dataset.rows_file:
+        return None
+    
+    cache = get_index_cache()
+    key = _cache_key('batch_offsets', dataset)
+    offsets = cache.get(key)
+    if offsets is None:
+        offsets = batch_offsets(dataset.rows_file.name)
+        cache.set(key, offsets)
+    return offsets
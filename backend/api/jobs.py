@@ -0,0 +1,123 @@
+"""
+Background job execution for long-running work such as CSV processing.
+
+Jobs run on an in-process thread pool; their state is kept in the
+database (UploadJob), so any worker can report on them. With
+BACKGROUND_WORKERS set to 0, jobs run inline in the calling thread.
+The pool's queue does not survive a restart, so every process recovers
+the jobs it may have lost when it starts (recover_upload_jobs).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+from .models import UploadJob
+from .processing import process_csv_upload
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the shared background thread pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS,
+                thread_name_prefix='api-background',
+            )
+    return _executor
+
+
+def _run_in_background(func, *args):
+    try:
+        func(*args)
+    finally:
+        # Worker threads hold their own database connections
+        close_old_connections()
+
+
+def submit_background(func, *args):
+    """
+    Run func(*args) on the background pool, or inline when background
+    workers are disabled.
+    """
+    if settings.BACKGROUND_WORKERS <= 0:
+        func(*args)
+        return
+    get_executor().submit(_run_in_background, func, *args)
+
+
+def run_upload_job(job_id):
+    """
+    Process the CSV stored for an upload job and record the outcome.
+    """
+    # Claim the job, so a job queued by several processes runs once
+    claimed = UploadJob.objects.filter(pk=job_id, status=UploadJob.Status.QUEUED).update(
+        status=UploadJob.Status.RUNNING, updated_at=timezone.now()
+    )
+    if not claimed:
+        return
+    job = UploadJob.objects.select_related('user').get(pk=job_id)
+    
+    def report_progress(fraction):
+        UploadJob.objects.filter(pk=job.pk).update(progress=fraction, updated_at=timezone.now())
+    
+    try:
+        with job.file.open('rb') as csv_file:
+            dataset = process_csv_upload(
+                csv_file, job.user, job.filename, job.content_hash, progress=report_progress
+            )
+        job.dataset = dataset
+        job.status = UploadJob.Status.SUCCEEDED
+        job.progress = 1.0
+    except ValueError as e:
+        job.status = UploadJob.Status.FAILED
+        job.error = str(e)
+    except Exception as e:
+        job.status = UploadJob.Status.FAILED
+        job.error = f'An error occurred while processing the file: {str(e)}'
+    finally:
+        # The stored upload is only needed while the job runs
+        job.file.delete(save=False)
+        job.save()
+
+
+def enqueue_upload_job(job):
+    """Queue an upload job for background processing."""
+    submit_background(run_upload_job, job.pk)
+
+
+def recover_upload_jobs():
+    """
+    Recover upload jobs lost with a stopped process: stale running jobs
+    are marked failed and queued jobs are queued again. Safe to run in
+    every process, since each job is processed only by the one that
+    claims it. Returns (failed, requeued).
+    """
+    failed = UploadJob.expire_stale()
+    queued = list(UploadJob.objects.filter(status=UploadJob.Status.QUEUED).values_list('pk', flat=True))
+    for job_id in queued:
+        submit_background(run_upload_job, job_id)
+    return failed, len(queued)
+
+
+def recover_upload_jobs_on_startup():
+    """
+    Run recover_upload_jobs on a separate thread when a process starts,
+    so startup never waits for it or fails because of it.
+    """
+    def recover():
+        try:
+            recover_upload_jobs()
+        except DatabaseError:
+            # E.g. migrations not applied yet; the next start tries again
+            pass
+        finally:
+            close_old_connections()
+    
+    threading.Thread(target=recover, name='api-recover-jobs', daemon=True).start()
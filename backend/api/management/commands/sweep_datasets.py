@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.models import EquipmentDataset, UploadJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete datasets beyond each user's history limit (for DATASET_RETENTION_MODE='sweep') "
+        "and finished upload jobs older than UPLOAD_JOB_RETENTION."
+    )
+    
+    def handle(self, *args, **options):
+        deleted = EquipmentDataset.sweep_old_datasets()
+        self.stdout.write(f'Deleted {deleted} old dataset(s).')
+        jobs = UploadJob.cleanup_finished()
+        self.stdout.write(f'Deleted {jobs} finished upload job(s).')
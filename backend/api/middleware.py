@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .compression import choose_encoding, compress, compress_stream, get_compressed, get_compressed_stream
+
+
+class CompressionMiddleware:
+    """
+    Compress API responses with gzip, brotli or zstd, as negotiated via
+    Accept-Encoding. Bodies below COMPRESSION_MIN_SIZE and already-encoded
+    responses are left alone; streaming responses of the compressed
+    content types are compressed chunk by chunk. Views mark the fixed
+    whole-dataset payloads with a 'compression_cache' attribute of
+    (dataset id, cache key) so their compressed bodies are stored and
+    reused; everything else is compressed per response.
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+    
+    def __call__(self, request):
+        response = self.get_response(request)
+        
+        if response.status_code != 200 or response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type not in settings.COMPRESSION_CONTENT_TYPES:
+            return response
+        
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        
+        cache = getattr(response, 'compression_cache', None)
+        if response.streaming:
+            # The length is unknown up front, so every body is compressed
+            if cache is not None:
+                response.streaming_content = get_compressed_stream(
+                    cache[0], cache[1], response.streaming_content, encoding
+                )
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            if response.has_header('Content-Length'):
+                del response['Content-Length']
+            return self._encoded(response, encoding)
+        
+        if cache is not None:
+            compressed = get_compressed(cache[0], cache[1], response.content, encoding)
+        else:
+            compressed = compress(response.content, encoding)
+        
+        # Skip the encoding if it does not pay off
+        if len(compressed) >= len(response.content):
+            return response
+        
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        return self._encoded(response, encoding)
+    
+    def _encoded(self, response, encoding):
+        """Mark a response as encoded with 'encoding'."""
+        response['Content-Encoding'] = encoding
+        
+        # The encoded body is a different byte sequence, so the ETag
+        # can only be weak (same as Django's GZipMiddleware)
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,54 @@
+# Move dataset rows from the raw_data JSON column to Arrow IPC files
+
+from django.db import migrations, models
+import pandas as pd
+
+
+def move_rows_to_files(apps, schema_editor):
+    from api.storage import RowFileWriter
+    
+    EquipmentDataset = apps.get_model('api', 'EquipmentDataset')
+    datasets = EquipmentDataset.objects.filter(raw_data__isnull=False, rows_file='')
+    
+    for dataset in datasets.iterator():
+        with RowFileWriter() as writer:
+            if dataset.raw_data:
+                writer.write(pd.DataFrame.from_records(dataset.raw_data))
+            dataset.rows_file = writer.close()
+        
+        dataset.raw_data = None
+        dataset.save(update_fields=['rows_file', 'raw_data'])
+
+
+def move_rows_to_json(apps, schema_editor):
+    from api.storage import read_rows, delete_rows
+    
+    EquipmentDataset = apps.get_model('api', 'EquipmentDataset')
+    
+    for dataset in EquipmentDataset.objects.exclude(rows_file='').iterator():
+        name = dataset.rows_file.name
+        dataset.raw_data = read_rows(name).to_pylist()
+        dataset.rows_file = ''
+        dataset.save(update_fields=['rows_file', 'raw_data'])
+        delete_rows(name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentdataset',
+            name='rows_file',
+            field=models.FileField(blank=True, help_text='Columnar (Arrow IPC) row storage', upload_to='datasets/'),
+        ),
+        migrations.AlterField(
+            model_name='equipmentdataset',
+            name='raw_data',
+            field=models.JSONField(blank=True, help_text='Legacy CSV data as list of dictionaries', null=True),
+        ),
+        migrations.RunPython(move_rows_to_files, move_rows_to_json),
+    ]
@@ -0,0 +1,55 @@
+# Normalized per-row readings for SQL-side aggregation
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_readings(apps, schema_editor):
+    from api.storage import iter_row_batches
+    
+    EquipmentDataset = apps.get_model('api', 'EquipmentDataset')
+    EquipmentReading = apps.get_model('api', 'EquipmentReading')
+    columns = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+    
+    for dataset in EquipmentDataset.objects.exclude(rows_file='').only('id', 'rows_file').iterator():
+        for batch in iter_row_batches(dataset.rows_file.name, columns):
+            values = [batch.column(col).to_pylist() for col in columns]
+            EquipmentReading.objects.bulk_create([
+                EquipmentReading(
+                    dataset_id=dataset.id,
+                    name=name[:255] if name is not None else None,
+                    type=equip_type[:255] if equip_type is not None else None,
+                    flowrate=flowrate,
+                    pressure=pressure,
+                    temperature=temperature,
+                )
+                for name, equip_type, flowrate, pressure, temperature in zip(*values)
+            ], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_columnar_row_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=255, null=True)),
+                ('type', models.CharField(blank=True, max_length=255, null=True)),
+                ('flowrate', models.FloatField(blank=True, null=True)),
+                ('pressure', models.FloatField(blank=True, null=True)),
+                ('temperature', models.FloatField(blank=True, null=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='readings', to='api.equipmentdataset')),
+            ],
+            options={
+                'verbose_name': 'Equipment Reading',
+                'verbose_name_plural': 'Equipment Readings',
+                'indexes': [models.Index(fields=['dataset', 'type'], name='reading_dataset_type_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_readings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_retentionpolicy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentdataset',
+            name='aggregates',
+            field=models.JSONField(blank=True, default=dict, help_text='Partial aggregates (count, mean, M2, min, max)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Add per-type statistics (filled in for existing datasets by 0011)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_equipmentdataset_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentdataset',
+            name='type_stats',
+            field=models.JSONField(blank=True, default=dict, help_text='Statistics per equipment type'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Add histograms and quantile sketches (filled in for existing datasets by 0011)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_equipmentdataset_type_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentdataset',
+            name='distributions',
+            field=models.JSONField(blank=True, default=dict, help_text='Histograms and quantile sketches'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Add the anomaly index (filled in for existing datasets by 0011)
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_equipmentdataset_distributions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipmentdataset',
+            name='anomalies',
+            field=models.JSONField(blank=True, default=dict, help_text='Flagged outlier rows (z-score and IQR)'),
+        ),
+    ]
@@ -0,0 +1,248 @@
+# Compute per-type statistics, distributions and the anomaly index for
+# existing datasets in a single pass over their rows.
+#
+# The analysis below is a frozen copy of the upload-time analysis as of
+# this migration, so later changes to api.analysis or api.utils cannot
+# change what this migration does. Only the tunables are read from
+# settings, with the defaults of this release.
+
+import os
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import migrations
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+TEXT_COLUMNS = ['Equipment Name', 'Type']
+NUMERIC_COLUMNS = ['Flowrate', 'Pressure', 'Temperature']
+TYPE_PERCENTILES = {'p25': 0.25, 'median': 0.5, 'p75': 0.75}
+ANOMALY_METHODS = ('zscore', 'iqr')
+ANOMALY_SCOPES = ('global', 'type')
+
+
+def load_frame(rows_file, raw_data):
+    """
+    The analysis columns of a dataset as a DataFrame, from its row file
+    or legacy raw_data rows; None when there is nothing to analyze.
+    """
+    columns = TEXT_COLUMNS + NUMERIC_COLUMNS
+    if rows_file:
+        path = default_storage.path(rows_file)
+        if not os.path.exists(path):
+            return None
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        return table.select(columns).to_pandas()
+    
+    df = pd.DataFrame(raw_data or [])
+    if not set(columns) <= set(df.columns):
+        return None
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def type_statistics(df):
+    """Per-type count, mean, min, max, std and percentiles per numeric column."""
+    df = df.dropna(subset=['Type'])
+    if df.empty:
+        return {}
+    
+    grouped = df[NUMERIC_COLUMNS].astype('float64').groupby(df['Type'].astype(str), sort=True)
+    sizes = grouped.size()
+    values = grouped.agg(['count', 'mean', 'min', 'max', 'std']).round(2)
+    quantiles = grouped.quantile(list(TYPE_PERCENTILES.values())).round(2)
+    
+    type_stats = {}
+    for equip_type in sizes.index:
+        entry = {'count': int(sizes[equip_type])}
+        for col in NUMERIC_COLUMNS:
+            if values.at[equip_type, (col, 'count')] == 0:
+                entry[col.lower()] = {
+                    'count': 0, 'mean': 0.0, 'min': 0.0, 'max': 0.0, 'std': 0.0,
+                    **{name: 0.0 for name in TYPE_PERCENTILES},
+                }
+                continue
+            
+            std = values.at[equip_type, (col, 'std')]
+            entry[col.lower()] = {
+                'count': int(values.at[equip_type, (col, 'count')]),
+                'mean': float(values.at[equip_type, (col, 'mean')]),
+                'min': float(values.at[equip_type, (col, 'min')]),
+                'max': float(values.at[equip_type, (col, 'max')]),
+                'std': 0.0 if np.isnan(std) else float(std),
+                **{
+                    name: float(quantiles.at[(equip_type, q), col])
+                    for name, q in TYPE_PERCENTILES.items()
+                },
+            }
+        type_stats[str(equip_type)] = entry
+    return type_stats
+
+
+def quantile_sketch(values, compression):
+    """Merging t-digest of a 1-D float array (NaN ignored), as stored JSON."""
+    values = np.sort(values[~np.isnan(values)], kind='mergesort')
+    if len(values) == 0:
+        return {'means': [], 'weights': [], 'min': None, 'max': None}
+    
+    # Every value starts as a centroid of weight one
+    total = len(values)
+    midpoints = (np.arange(total) + 0.5) / total
+    k = compression / (2 * np.pi) * np.arcsin(2 * midpoints - 1)
+    buckets = np.floor(k - k[0]).astype(np.int64)
+    weights = np.bincount(buckets)
+    sums = np.bincount(buckets, weights=values)
+    present = weights > 0
+    
+    return {
+        'means': [float(v) for v in sums[present] / weights[present]],
+        'weights': [float(v) for v in weights[present]],
+        'min': float(values[0]),
+        'max': float(values[-1]),
+    }
+
+
+def distributions(df, bins, compression):
+    """Histograms and quantile sketches per numeric column, overall and per type."""
+    codes, type_names = pd.factorize(df['Type'].astype(object))
+    type_names = [str(name) for name in type_names]
+    result = {'bins': bins, 'columns': {}, 'types': {name: {} for name in sorted(type_names)}}
+    
+    for col in NUMERIC_COLUMNS:
+        values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        present = ~np.isnan(values)
+        key = col.lower()
+        
+        if present.any():
+            low, high = values[present].min(), values[present].max()
+            if low == high:
+                low, high = low - 0.5, high + 0.5
+        else:
+            low, high = 0.0, 1.0
+        edges = np.linspace(low, high, bins + 1)
+        index = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, bins - 1)
+        
+        result['columns'][key] = {
+            'edges': [float(v) for v in edges],
+            'counts': [int(v) for v in np.bincount(index[present], minlength=bins)],
+            'sketch': quantile_sketch(values, compression),
+        }
+        
+        typed = present & (codes >= 0)
+        type_counts = np.bincount(
+            codes[typed] * bins + index[typed], minlength=len(type_names) * bins
+        ).reshape(len(type_names), bins)
+        for code, name in enumerate(type_names):
+            result['types'][name][key] = {
+                'counts': [int(v) for v in type_counts[code]],
+                'sketch': quantile_sketch(values[codes == code], compression),
+            }
+    return result
+
+
+def outliers(values, mean, std, q1, q3, z_threshold, iqr_factor):
+    """Z-score and IQR outlier masks of 'values', and |z| (0 where undefined)."""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.nan_to_num(np.abs(values - mean) / std, nan=0.0, posinf=0.0)
+    fence = iqr_factor * (q3 - q1)
+    return {'zscore': z > z_threshold, 'iqr': (values < q1 - fence) | (values > q3 + fence)}, z
+
+
+def anomalies(df, z_threshold, iqr_factor, top):
+    """The anomaly index: flagged rows with flag bits, counts per flag and the top rows."""
+    names = [
+        f'{col.lower()}:{method}:{scope}'
+        for col in NUMERIC_COLUMNS for method in ANOMALY_METHODS for scope in ANOMALY_SCOPES
+    ]
+    codes, _ = pd.factorize(df['Type'].astype(object))
+    typed = codes >= 0
+    flags = np.zeros(len(df), dtype=np.int64)
+    score = np.zeros(len(df))
+    
+    bit = 0
+    for col in NUMERIC_COLUMNS:
+        values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        present = values[~np.isnan(values)]
+        if len(present) > 1:
+            q1, q3 = np.percentile(present, [25, 75])
+            overall = (present.mean(), present.std(ddof=1), q1, q3)
+        else:
+            overall = (np.nan, np.nan, np.nan, np.nan)
+        
+        # Per-type centers and spreads, broadcast back to the rows
+        grouped = pd.Series(values[typed]).groupby(codes[typed])
+        per_type = pd.DataFrame({
+            'mean': grouped.mean(),
+            'std': grouped.std(),
+            'q1': grouped.quantile(0.25),
+            'q3': grouped.quantile(0.75),
+        }).reindex(range(codes.max() + 1 if len(codes) else 0))
+        spread = []
+        for name in ('mean', 'std', 'q1', 'q3'):
+            per_row = np.full(len(values), np.nan)
+            per_row[typed] = per_type[name].to_numpy()[codes[typed]]
+            spread.append(per_row)
+        
+        global_masks, z = outliers(values, *overall, z_threshold, iqr_factor)
+        type_masks, _ = outliers(values, *spread, z_threshold, iqr_factor)
+        score = np.maximum(score, z)
+        for method in ANOMALY_METHODS:
+            for masks in (global_masks, type_masks):
+                flags |= masks[method].astype(np.int64) << bit
+                bit += 1
+    
+    rows = np.flatnonzero(flags)
+    row_flags = flags[rows]
+    top_rows = []
+    for row in rows[np.argsort(-score[rows], kind='stable')][:top]:
+        entry = {'row': int(row), 'flags': [name for i, name in enumerate(names) if flags[row] >> i & 1]}
+        for col in df.columns:
+            value = df[col].iat[row]
+            if pd.isna(value):
+                entry[col] = None
+            else:
+                entry[col] = float(value) if col in NUMERIC_COLUMNS else str(value)
+        top_rows.append(entry)
+    
+    return {
+        'z_threshold': z_threshold,
+        'iqr_factor': iqr_factor,
+        'flag_names': names,
+        'counts': {name: int(((row_flags >> i) & 1).sum()) for i, name in enumerate(names)},
+        'rows': [int(v) for v in rows],
+        'flags': [int(v) for v in row_flags],
+        'top': top_rows,
+    }
+
+
+def backfill_analysis(apps, schema_editor):
+    """Store all three analysis results, reading each dataset's rows once."""
+    bins = getattr(settings, 'HISTOGRAM_BINS', 20)
+    compression = getattr(settings, 'QUANTILE_SKETCH_COMPRESSION', 100)
+    z_threshold = getattr(settings, 'ANOMALY_Z_THRESHOLD', 3.0)
+    iqr_factor = getattr(settings, 'ANOMALY_IQR_FACTOR', 1.5)
+    top = getattr(settings, 'REPORT_MAX_ANOMALIES', 20)
+    
+    EquipmentDataset = apps.get_model('api', 'EquipmentDataset')
+    for dataset in EquipmentDataset.objects.only('id', 'rows_file', 'raw_data').iterator():
+        df = load_frame(dataset.rows_file.name, dataset.raw_data)
+        if df is None:
+            continue
+        
+        dataset.type_stats = type_statistics(df)
+        dataset.distributions = distributions(df, bins, compression)
+        dataset.anomalies = anomalies(df, z_threshold, iqr_factor, top)
+        dataset.save(update_fields=['type_stats', 'distributions', 'anomalies'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_equipmentdataset_anomalies'),
+    ]
+    
+    operations = [
+        migrations.RunPython(backfill_analysis, migrations.RunPython.noop),
+    ]
@@ -1,22 +1,56 @@
-from django.db import models
+from django.conf import settings
+import math
+import uuid
+from datetime import timedelta
+import orjson
+import pandas as pd
+import pyarrow as pa
+from django.db import connection, models, transaction
+from django.db.models import Avg, Count, F, Max, Min, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from .authentication import invalidate_token
+from .compression import evict_compressed
+from .reports import evict_reports
+from .storage import read_rows, read_rows_json, iter_rows_json, iter_row_batches, delete_rows, take_rows
+from .utils import RunningStatistics
 
 
 class EquipmentDataset(models.Model):
     """
     Model to store uploaded CSV datasets and processed results.
-    Automatically manages history (keeps only last 5 datasets per user).
+    Automatically manages history (keeps the most recent datasets per
+    user, see RetentionPolicy).
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='datasets')
     filename = models.CharField(max_length=255)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
-    # Store processed data as JSON
-    raw_data = models.JSONField(help_text="Original CSV data as list of dictionaries")
+    # Rows live in a compressed Arrow file under MEDIA_ROOT; raw_data is only
+    # kept for datasets stored before columnar storage existed
+    rows_file = models.FileField(upload_to='datasets/', blank=True, help_text="Columnar (Arrow IPC) row storage")
+    raw_data = models.JSONField(null=True, blank=True, help_text="Legacy CSV data as list of dictionaries")
     summary_stats = models.JSONField(help_text="Computed summary statistics")
     
+    # SHA-256 of the uploaded file, used to reuse results of identical uploads
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    
+    # Per-type count, mean, min, max, std and percentiles per numeric column
+    type_stats = models.JSONField(default=dict, blank=True, help_text="Statistics per equipment type")
+    
+    # Histograms and quantile sketches per numeric column and per type
+    distributions = models.JSONField(default=dict, blank=True, help_text="Histograms and quantile sketches")
+    
+    # Outlier rows flagged at upload, as row positions with flag bits
+    anomalies = models.JSONField(default=dict, blank=True, help_text="Flagged outlier rows (z-score and IQR)")
+    
+    # Mergeable moments overall and per type, for combining datasets
+    aggregates = models.JSONField(default=dict, blank=True, help_text="Partial aggregates (count, mean, M2, min, max)")
+    
     # Metadata
     row_count = models.IntegerField(default=0)
     equipment_types = models.JSONField(default=list, help_text="List of equipment types")
@@ -29,23 +63,498 @@ class EquipmentDataset(models.Model):
     def __str__(self):
         return f"{self.filename} - {self.uploaded_at.strftime('%Y-%m-%d %H:%M')}"
     
+    def load_rows(self, columns=None, offset=0, limit=None):
+        """
+        Return the dataset rows (or a slice of them) as a list of dictionaries.
+        Reads from columnar storage, falling back to legacy raw_data.
+        Raises ValueError for unknown columns.
+        """
+        if self.rows_file:
+            return read_rows(self.rows_file.name, columns, offset, limit).to_pylist()
+        
+        rows = self.raw_data or []
+        stop = offset + limit if limit is not None else None
+        rows = rows[offset:stop]
+        if columns is not None:
+            known = set(self.raw_data[0]) if self.raw_data else set()
+            missing = [col for col in columns if col not in known]
+            if missing:
+                raise ValueError(f"Unknown columns: {', '.join(missing)}")
+            rows = [{col: row.get(col) for col in columns} for row in rows]
+        return rows
+    
+    def load_table(self, columns=None, offset=0, limit=None):
+        """
+        Return the dataset rows (or a slice of them) as an Arrow table,
+        for the columnar response formats. Raises ValueError for unknown
+        columns.
+        """
+        if self.rows_file:
+            return read_rows(self.rows_file.name, columns, offset, limit)
+        return pa.Table.from_pylist(self.load_rows(columns, offset, limit))
+    
+    def take_table(self, rows, columns=None, offsets=None):
+        """
+        Return the rows at the given positions, in that order, as an
+        Arrow table. Only the record batches holding them are read from
+        the row file; 'offsets' are its batch offsets when known. Raises
+        ValueError for unknown columns.
+        """
+        if self.rows_file:
+            return take_rows(self.rows_file.name, rows, columns, offsets)
+        return self.load_table(columns).take(pa.array(rows, pa.int64()))
+    
+    def rows_json(self):
+        """
+        Return all rows as pre-encoded JSON bytes, ready to be spliced
+        into a response without building Python objects per row.
+        """
+        if self.rows_file:
+            return read_rows_json(self.rows_file.name)
+        return orjson.dumps(self.raw_data or [])
+    
+    def iter_rows_json(self):
+        """
+        Yield all rows as pre-encoded JSON in chunks, for streaming
+        responses that never hold the whole row list in memory.
+        """
+        if self.rows_file:
+            yield from iter_rows_json(self.rows_file.name)
+        else:
+            yield orjson.dumps(self.raw_data or [])
+    
+    def get_aggregates(self):
+        """
+        Return the stored partial aggregates. Datasets uploaded before
+        aggregates were kept get them computed from their rows once.
+        """
+        if self.aggregates:
+            return self.aggregates
+        
+        running_stats = RunningStatistics()
+        if self.rows_file:
+            for batch in iter_row_batches(self.rows_file.name):
+                running_stats.update(batch.to_pandas())
+        elif self.raw_data:
+            running_stats.update(pd.DataFrame(self.raw_data))
+        
+        self.aggregates = running_stats.aggregates()
+        EquipmentDataset.objects.filter(pk=self.pk).update(aggregates=self.aggregates)
+        return self.aggregates
+    
+    @classmethod
+    def find_processed(cls, content_hash):
+        """
+        Return an already processed dataset with the same file content,
+        or None.
+        """
+        if not content_hash:
+            return None
+        return (
+            cls.objects.filter(content_hash=content_hash)
+            .exclude(rows_file='')
+            .only('id', 'rows_file', 'content_hash', 'summary_stats', 'type_stats', 'distributions', 'anomalies', 'aggregates', 'row_count', 'equipment_types')
+            .first()
+        )
+    
+    @classmethod
+    def create_from_processed(cls, source, user, filename):
+        """
+        Create a dataset for a re-upload of 'source' without parsing
+        the file again: the row file is shared, the statistics copied
+        and the readings duplicated inside the database.
+        """
+        with transaction.atomic():
+            dataset = cls.objects.create(
+                user=user,
+                filename=filename,
+                rows_file=source.rows_file.name,
+                content_hash=source.content_hash,
+                summary_stats=source.summary_stats,
+                type_stats=source.type_stats,
+                distributions=source.distributions,
+                anomalies=source.anomalies,
+                aggregates=source.aggregates,
+                row_count=source.row_count,
+                equipment_types=source.equipment_types,
+            )
+            copied = EquipmentReading.objects.copy_to_dataset(source, dataset)
+            if copied < dataset.row_count:
+                # History cleanup removed the source on save; rebuild the
+                # readings from the shared row file instead
+                dataset.readings.all().delete()
+                EquipmentReading.objects.bulk_create_for_dataset(dataset)
+        return dataset
+    
+    @classmethod
+    def cleanup_old_datasets(cls, user, keep_count=None):
+        """
+        Keep only the most recent 'keep_count' datasets for the user
+        (by default the user's retention policy) and delete older ones.
+        'user' may be a User or its id. Returns the number deleted.
+        The user's finished upload jobs past UPLOAD_JOB_RETENTION are
+        deleted as well.
+        
+        Only ids and row file names are loaded; the deletion collector
+        applies the on_delete rules of readings and upload jobs with
+        set-based statements, and dataset_post_delete releases the files
+        once the transaction commits.
+        """
+        if keep_count is None:
+            keep_count = RetentionPolicy.keep_count_for(user)
+        UploadJob.cleanup_finished(user)
+        
+        stale = list(
+            cls.objects.filter(user=user)
+            .order_by('-uploaded_at', '-id')
+            .values_list('id', flat=True)[keep_count:]
+        )
+        if not stale:
+            return 0
+        
+        with transaction.atomic():
+            _, deleted = cls.objects.filter(pk__in=stale).only('id', 'rows_file').delete()
+        return deleted.get(cls._meta.label, 0)
+    
+    @classmethod
+    def sweep_old_datasets(cls):
+        """
+        Apply retention to every user with more datasets than they keep.
+        Meant for a periodic job. Returns the number of datasets deleted.
+        """
+        limits = dict(RetentionPolicy.objects.values_list('user_id', 'keep_count'))
+        default = settings.DATASET_HISTORY_LIMIT
+        
+        deleted = 0
+        counts = cls.objects.values_list('user_id').annotate(total=Count('id')).order_by()
+        for user_id, total in counts:
+            keep_count = limits.get(user_id, default)
+            if total > keep_count:
+                deleted += cls.cleanup_old_datasets(user_id, keep_count)
+        return deleted
+
+
+def release_dataset_files(dataset_ids, rows_files):
+    """
+    Remove cached reports and compressed payloads of deleted datasets,
+    and the row files no remaining dataset shares.
+    """
+    evict_reports(dataset_ids)
+    evict_compressed(dataset_ids)
+    
+    shared = set(
+        EquipmentDataset.objects.filter(rows_file__in=rows_files)
+        .values_list('rows_file', flat=True)
+    )
+    for name in rows_files:
+        if name not in shared:
+            delete_rows(name)
+
+
+class RetentionPolicy(models.Model):
+    """
+    Per-user override of how many datasets are kept in the history;
+    users without one keep settings.DATASET_HISTORY_LIMIT.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='retention_policy')
+    keep_count = models.PositiveIntegerField(help_text="Number of most recent datasets to keep")
+    
+    class Meta:
+        verbose_name = "Retention Policy"
+        verbose_name_plural = "Retention Policies"
+    
+    def __str__(self):
+        return f"{self.user} keeps {self.keep_count}"
+    
+    @classmethod
+    def keep_count_for(cls, user):
+        """Number of datasets to keep for a User or user id"""
+        keep_count = cls.objects.filter(user=user).values_list('keep_count', flat=True).first()
+        return keep_count if keep_count is not None else settings.DATASET_HISTORY_LIMIT
+    
+    @classmethod
+    def keep_count_expression(cls, user):
+        """
+        keep_count_for() as a query expression, so a query can be limited
+        to the kept datasets without a separate lookup
+        """
+        return Coalesce(
+            Subquery(cls.objects.filter(user=user).values('keep_count')[:1]),
+            Value(settings.DATASET_HISTORY_LIMIT),
+        )
+
+
+class EquipmentReadingQuerySet(models.QuerySet):
+    """
+    Aggregations over equipment readings that run inside the database.
+    """
+    
+    def _metric_aggregates(self):
+        # The sample std is derived from the mean of squares rather than
+        # StdDev, which SQLite computes in Python and fails on NULLs and
+        # single values
+        aggregates = {}
+        for field in EquipmentReading.NUMERIC_FIELDS:
+            aggregates[f'{field}__count'] = Count(field)
+            aggregates[f'{field}__mean'] = Avg(field)
+            aggregates[f'{field}__sqmean'] = Avg(F(field) * F(field))
+            aggregates[f'{field}__min'] = Min(field)
+            aggregates[f'{field}__max'] = Max(field)
+        return aggregates
+    
+    @staticmethod
+    def _format_metrics(values):
+        stats = {}
+        for field in EquipmentReading.NUMERIC_FIELDS:
+            count = values[f'{field}__count']
+            if not count:
+                stats[field] = {'mean': 0.0, 'min': 0.0, 'max': 0.0, 'std': 0.0}
+                continue
+            
+            mean = values[f'{field}__mean']
+            std = 0.0
+            if count > 1:
+                variance = (values[f'{field}__sqmean'] - mean * mean) * count / (count - 1)
+                std = math.sqrt(max(variance, 0.0))
+            
+            stats[field] = {
+                'mean': float(round(mean, 2)),
+                'min': float(round(values[f'{field}__min'], 2)),
+                'max': float(round(values[f'{field}__max'], 2)),
+                'std': float(round(std, 2)),
+            }
+        return stats
+    
+    def summary_statistics(self):
+        """
+        Compute statistics in the same shape as summary_stats with a
+        single aggregate query plus one grouped count per type.
+        """
+        values = self.aggregate(total_count=Count('id'), **self._metric_aggregates())
+        type_counts = (
+            self.exclude(type__isnull=True)
+            .values('type')
+            .annotate(count=Count('id'))
+            .order_by('-count')
+        )
+        
+        stats = {
+            'total_count': values['total_count'],
+            'equipment_types': {row['type']: row['count'] for row in type_counts},
+        }
+        stats.update(self._format_metrics(values))
+        return stats
+    
+    def type_statistics(self):
+        """
+        Per-type count and statistics, grouped and aggregated in SQL.
+        """
+        rows = (
+            self.exclude(type__isnull=True)
+            .values('type')
+            .annotate(count=Count('id'), **self._metric_aggregates())
+            .order_by('type')
+        )
+        
+        result = {}
+        for row in rows:
+            result[row['type']] = {'count': row['count'], **self._format_metrics(row)}
+        return result
+
+
+class EquipmentReadingManager(models.Manager.from_queryset(EquipmentReadingQuerySet)):
+    """Manager that fills readings from a dataset's stored rows."""
+    
+    def bulk_create_for_dataset(self, dataset):
+        """
+        Insert one reading per stored row, streaming record batches from
+        columnar storage into batched bulk_create calls.
+        """
+        if not dataset.rows_file:
+            return 0
+        
+        columns = list(EquipmentReading.CSV_COLUMNS)
+        batch_size = settings.READING_BATCH_SIZE
+        created = 0
+        
+        for batch in iter_row_batches(dataset.rows_file.name, columns):
+            values = [batch.column(col).to_pylist() for col in columns]
+            readings = [
+                EquipmentReading(
+                    dataset=dataset,
+                    name=name[:255] if name is not None else None,
+                    type=equip_type[:255] if equip_type is not None else None,
+                    flowrate=flowrate,
+                    pressure=pressure,
+                    temperature=temperature,
+                )
+                for name, equip_type, flowrate, pressure, temperature in zip(*values)
+            ]
+            self.bulk_create(readings, batch_size=batch_size)
+            created += len(readings)
+        
+        return created
+
+
+    def copy_to_dataset(self, source, target):
+        """
+        Duplicate the readings of 'source' for 'target' with a single
+        INSERT ... SELECT, without loading any rows into Python.
+        """
+        table = connection.ops.quote_name(EquipmentReading._meta.db_table)
+        columns = ', '.join(
+            connection.ops.quote_name(field)
+            for field in ['name', 'type'] + EquipmentReading.NUMERIC_FIELDS
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (dataset_id, {columns}) '
+                f'SELECT %s, {columns} FROM {table} WHERE dataset_id = %s',
+                [target.pk, source.pk],
+            )
+            return cursor.rowcount
+
+
+class EquipmentReading(models.Model):
+    """
+    One row of an uploaded dataset, normalized so filtering and
+    aggregation can be pushed down to the database.
+    """
+    CSV_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+    NUMERIC_FIELDS = ['flowrate', 'pressure', 'temperature']
+    
+    dataset = models.ForeignKey(EquipmentDataset, on_delete=models.CASCADE, related_name='readings')
+    name = models.CharField(max_length=255, null=True, blank=True)
+    type = models.CharField(max_length=255, null=True, blank=True)
+    flowrate = models.FloatField(null=True, blank=True)
+    pressure = models.FloatField(null=True, blank=True)
+    temperature = models.FloatField(null=True, blank=True)
+    
+    objects = EquipmentReadingManager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['dataset', 'type'], name='reading_dataset_type_idx'),
+        ]
+        verbose_name = "Equipment Reading"
+        verbose_name_plural = "Equipment Readings"
+    
+    def __str__(self):
+        return f"{self.name} ({self.type})"
+
+
+class UploadJob(models.Model):
+    """
+    A CSV upload queued for background processing.
+    The uploaded file is kept under MEDIA_ROOT until the job finishes.
+    """
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        SUCCEEDED = 'succeeded', 'Succeeded'
+        FAILED = 'failed', 'Failed'
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_jobs')
+    filename = models.CharField(max_length=255)
+    file = models.FileField(upload_to='uploads/', blank=True)
+    content_hash = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.QUEUED)
+    progress = models.FloatField(default=0.0, help_text="Fraction of the file processed")
+    dataset = models.ForeignKey(EquipmentDataset, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Upload Job"
+        verbose_name_plural = "Upload Jobs"
+    
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+    
     @classmethod
-    def cleanup_old_datasets(cls, user, keep_count=5):
+    def expire_stale(cls):
         """
-        Keep only the most recent 'keep_count' datasets for the user.
-        Delete older ones.
+        Mark jobs whose worker is gone as failed. Running jobs report
+        progress after every chunk, so one without an update for
+        UPLOAD_JOB_STALE_AFTER seconds is no longer being processed.
+        Returns the number of jobs marked failed.
+        """
+        cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_JOB_STALE_AFTER)
+        stale = list(cls.objects.filter(status=cls.Status.RUNNING, updated_at__lt=cutoff))
+        for job in stale:
+            job.file.delete(save=False)
+            job.status = cls.Status.FAILED
+            job.error = 'Processing was interrupted by a server restart; please upload the file again'
+            job.save(update_fields=['file', 'status', 'error', 'updated_at'])
+        return len(stale)
+    
+    @classmethod
+    def cleanup_finished(cls, user=None):
         """
-        datasets = cls.objects.filter(user=user).order_by('-uploaded_at')
-        if datasets.count() > keep_count:
-            old_datasets = datasets[keep_count:]
-            for dataset in old_datasets:
-                dataset.delete()
+        Delete succeeded and failed jobs (of one user, or of everyone)
+        that ended more than UPLOAD_JOB_RETENTION seconds ago. Returns
+        the number deleted.
+        """
+        cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_JOB_RETENTION)
+        jobs = cls.objects.filter(status__in=[cls.Status.SUCCEEDED, cls.Status.FAILED], updated_at__lt=cutoff)
+        if user is not None:
+            jobs = jobs.filter(user=user)
+        return jobs.delete()[0]
 
 
 @receiver(post_save, sender=EquipmentDataset)
 def dataset_post_save(sender, instance, created, **kwargs):
     """
-    Signal to auto-cleanup old datasets after each save.
+    Signal to apply history retention after each upload. Depending on
+    DATASET_RETENTION_MODE this runs inline ('sync'), on the background
+    pool after commit ('async'), or is left to the periodic
+    sweep_datasets command ('sweep').
+    """
+    if not created:
+        return
+    
+    mode = settings.DATASET_RETENTION_MODE
+    if mode == 'sync':
+        EquipmentDataset.cleanup_old_datasets(instance.user_id)
+    elif mode == 'async':
+        from .jobs import submit_background
+        user_id = instance.user_id
+        transaction.on_commit(
+            lambda: submit_background(EquipmentDataset.cleanup_old_datasets, user_id)
+        )
+
+
+@receiver(post_delete, sender=EquipmentDataset)
+def dataset_post_delete(sender, instance, **kwargs):
+    """
+    Signal to remove cached reports, compressed payloads and the row
+    file once a dataset's deletion is committed; the row file is kept
+    while a re-upload still shares it.
+    """
+    pk, name = instance.pk, instance.rows_file.name
+    transaction.on_commit(lambda: release_dataset_files([pk], {name} if name else set()))
+
+
+@receiver(post_delete, sender=Token)
+def token_post_delete(sender, instance, **kwargs):
+    """
+    Signal to drop a deleted token (e.g. on logout) from the
+    authentication cache.
+    """
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_post_save(sender, instance, created, **kwargs):
+    """
+    Signal to drop cached tokens of a changed user, so deactivation,
+    password changes and profile edits take effect without waiting for
+    the cache to expire.
     """
     if created:
-        EquipmentDataset.cleanup_old_datasets(instance.user, keep_count=5)
+        return
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        invalidate_token(key)
@@ -0,0 +1,63 @@
+"""
+CSV upload processing pipeline shared by direct and queued uploads.
+"""
+from django.db import transaction
+
+from .analysis import analyze_rows
+from .models import EquipmentDataset, EquipmentReading
+from .storage import RowFileWriter, delete_rows
+from .utils import iter_csv_chunks, RunningStatistics
+
+
+def process_csv_upload(csv_file, user, filename, content_hash='', progress=None):
+    """
+    Parse, summarize and store an uploaded CSV file.
+    
+    Identical content that was processed before, by any user, is reused
+    instead of parsed again; callers are not told which happened, so an
+    upload reveals nothing about other accounts. 'progress' is called
+    with the fraction of the file consumed after every chunk. Returns
+    the dataset or raises ValueError for invalid CSV data.
+    """
+    source = EquipmentDataset.find_processed(content_hash)
+    if source is not None:
+        return EquipmentDataset.create_from_processed(source, user, filename)
+    
+    size = getattr(csv_file, 'size', None)
+    
+    # Stream the CSV in bounded chunks, feeding running statistics
+    # and appending each chunk to the columnar row file
+    running_stats = RunningStatistics()
+    with RowFileWriter() as writer:
+        for chunk in iter_csv_chunks(csv_file):
+            running_stats.update(chunk)
+            writer.write(chunk)
+            if progress is not None and size:
+                progress(min(csv_file.tell() / size, 1.0))
+        rows_file = writer.close()
+    
+    # Create dataset record and its normalized readings
+    try:
+        # Statistics that need whole columns come from the stored file
+        analysis = analyze_rows(rows_file)
+        
+        with transaction.atomic():
+            dataset = EquipmentDataset.objects.create(
+                user=user,
+                filename=filename,
+                rows_file=rows_file,
+                content_hash=content_hash,
+                summary_stats=running_stats.summary(),
+                type_stats=analysis['type_stats'],
+                distributions=analysis['distributions'],
+                anomalies=analysis['anomalies'],
+                aggregates=running_stats.aggregates(),
+                row_count=running_stats.row_count,
+                equipment_types=running_stats.equipment_types
+            )
+            EquipmentReading.objects.bulk_create_for_dataset(dataset)
+    except Exception:
+        delete_rows(rows_file)
+        raise
+    
+    return dataset
@@ -0,0 +1,249 @@
+"""
+PDF report rendering service and rendered-report cache.
+
+ReportLab layout is CPU-bound, so reports are rendered in a bounded
+process pool whose workers build the report styles once at start-up.
+Datasets are immutable after upload, so a report only has to be rendered
+once per dataset, report content and template version; rendered reports
+are kept under MEDIA_ROOT/reports and served from disk.
+"""
+import collections
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .utils import build_report_context, get_report_styles, render_pdf_report
+
+
+REPORTS_DIR = 'reports'
+
+# Bump whenever render_pdf_report changes its output
+REPORT_TEMPLATE_VERSION = 4
+
+# Entry listing the reports an export archive could not include
+ZIP_ERRORS_NAME = 'errors.txt'
+
+
+class ReportRenderBusy(Exception):
+    """Raised when no render slot frees up within PDF_RENDER_TIMEOUT."""
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_render_slots = None
+
+
+def _warm_worker():
+    """Process pool initializer: build the report styles once per worker."""
+    get_report_styles()
+
+
+def get_render_pool():
+    """Return the shared report rendering process pool, creating it on first use."""
+    global _pool, _render_slots
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_warm_worker,
+            )
+            _render_slots = threading.BoundedSemaphore(settings.PDF_RENDER_MAX_CONCURRENCY)
+    return _pool
+
+
+def shutdown_render_pool():
+    """Stop the render pool's workers; the next render starts a new pool."""
+    global _pool, _render_slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+            _render_slots = None
+
+
+def submit_render(context, block=True):
+    """
+    Start rendering a report context and return a Future of the PDF bytes.
+    
+    Uses the process pool when PDF_RENDER_WORKERS > 0; one of the
+    PDF_RENDER_MAX_CONCURRENCY render slots is held until the render
+    finishes. With block=True this waits up to PDF_RENDER_TIMEOUT for a
+    slot, otherwise it returns None when no slot is free. With 0 workers
+    the report is rendered inline and a completed Future is returned.
+    """
+    if settings.PDF_RENDER_WORKERS <= 0:
+        future = Future()
+        try:
+            future.set_result(render_pdf_report(context))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    pool = get_render_pool()
+    if block:
+        if not _render_slots.acquire(timeout=settings.PDF_RENDER_TIMEOUT):
+            raise ReportRenderBusy('Too many reports are being rendered, please retry shortly')
+    elif not _render_slots.acquire(blocking=False):
+        return None
+    
+    future = pool.submit(render_pdf_report, context)
+    future.add_done_callback(lambda f: _render_slots.release())
+    return future
+
+
+def render_report(context):
+    """Render a report context to PDF bytes, off-process when enabled."""
+    return submit_render(context).result()
+
+
+def report_fingerprint(context):
+    """Hash of everything a rendered report depends on besides its id."""
+    payload = json.dumps({
+        'version': REPORT_TEMPLATE_VERSION,
+        'context': context,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _report_cache_path(dataset, context):
+    return default_storage.path(f'{REPORTS_DIR}/{dataset.id}-{report_fingerprint(context)}.pdf')
+
+
+def _write_report(path, pdf_content):
+    """
+    Write a rendered report to a temporary file first so concurrent
+    readers never see a partial PDF.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf_content)
+    os.replace(tmp_path, path)
+
+
+def get_report_path(dataset):
+    """
+    Return the path of the rendered report, rendering it on a cache miss.
+    """
+    context = build_report_context(dataset)
+    path = _report_cache_path(dataset, context)
+    if not os.path.exists(path):
+        _write_report(path, render_report(context))
+    return path
+
+
+def iter_report_results(datasets):
+    """
+    Yield (dataset, path, error) for every dataset as soon as its report
+    is available: cached reports first, then renders in completion order.
+    Missing reports are rendered in parallel on the process pool. A
+    failed report yields its exception as 'error' (and no path) while
+    the others carry on; when no render slot frees up, the remaining
+    datasets yield ReportRenderBusy.
+    """
+    todo = collections.deque()
+    for dataset in datasets:
+        try:
+            context = build_report_context(dataset)
+        except Exception as e:
+            yield dataset, None, e
+            continue
+        path = _report_cache_path(dataset, context)
+        if os.path.exists(path):
+            yield dataset, path, None
+        else:
+            todo.append((dataset, context, path))
+    
+    pending = {}
+    while todo or pending:
+        # Fill free render slots; only block when nothing is in flight
+        while todo:
+            try:
+                future = submit_render(todo[0][1], block=not pending)
+            except ReportRenderBusy as e:
+                while todo:
+                    yield todo.popleft()[0], None, e
+                break
+            if future is None:
+                break
+            dataset, context, path = todo.popleft()
+            pending[future] = (dataset, path)
+        
+        if not pending:
+            break
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            dataset, path = pending.pop(future)
+            try:
+                _write_report(path, future.result())
+            except Exception as e:
+                yield dataset, None, e
+            else:
+                yield dataset, path, None
+
+
+class _ZipStream:
+    """Write-only file object that collects zip output for a generator."""
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _report_name(dataset):
+    return f'{dataset.id}_{dataset.filename}_report.pdf'
+
+
+def stream_reports_zip(results):
+    """
+    Generate a ZIP archive from iter_report_results, adding each report
+    as soon as it is available. Reports that failed are listed in a
+    final errors.txt entry, so the archive is always complete and
+    readable even when a render fails after streaming has started.
+    """
+    sink = _ZipStream()
+    errors = []
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        try:
+            for dataset, path, error in results:
+                if error is not None:
+                    errors.append(f'{_report_name(dataset)}: {error}')
+                    continue
+                with open(path, 'rb') as f:
+                    archive.writestr(_report_name(dataset), f.read())
+                yield sink.drain()
+        except Exception as e:
+            errors.append(f'Export stopped: {e}')
+        if errors:
+            archive.writestr(ZIP_ERRORS_NAME, '\n'.join(errors) + '\n')
+    yield sink.drain()
+
+
+def evict_reports(dataset_ids):
+    """Remove every cached report of the given datasets."""
+    for dataset_id in dataset_ids:
+        pattern = default_storage.path(f'{REPORTS_DIR}/{int(dataset_id)}-*.pdf')
+        for path in glob.glob(pattern):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -1,6 +1,9 @@
+import orjson
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import EquipmentDataset
+from .models import EquipmentDataset, UploadJob
+from .renderers import ORJSONRenderer
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -38,13 +41,28 @@ class EquipmentDatasetSerializer(serializers.ModelSerializer):
     """Serializer for EquipmentDataset model"""
     user = UserSerializer(read_only=True)
     uploaded_at = serializers.DateTimeField(format='%Y-%m-%d %H:%M:%S', read_only=True)
+    raw_data = serializers.SerializerMethodField()
     
     class Meta:
         model = EquipmentDataset
         fields = ['id', 'user', 'filename', 'uploaded_at', 'raw_data', 
-                  'summary_stats', 'row_count', 'equipment_types']
+                  'summary_stats', 'type_stats', 'row_count', 'equipment_types']
         read_only_fields = ['id', 'user', 'uploaded_at', 'raw_data', 
-                           'summary_stats', 'row_count', 'equipment_types']
+                           'summary_stats', 'type_stats', 'row_count', 'equipment_types']
+    
+    def get_raw_data(self, obj):
+        # Stored rows are already JSON; the orjson renderer embeds them
+        # as-is, other renderers (the browsable API) get plain rows
+        renderer = getattr(self.context.get('request'), 'accepted_renderer', None)
+        if renderer is not None and not isinstance(renderer, ORJSONRenderer):
+            return obj.load_rows()
+        return orjson.Fragment(obj.rows_json())
+
+
+class DatasetMetadataSerializer(EquipmentDatasetSerializer):
+    """Dataset detail without the row payload"""
+    class Meta(EquipmentDatasetSerializer.Meta):
+        fields = [field for field in EquipmentDatasetSerializer.Meta.fields if field != 'raw_data']
 
 
 class DatasetSummarySerializer(serializers.ModelSerializer):
@@ -63,9 +81,24 @@ class CSVUploadSerializer(serializers.Serializer):
         if not value.name.endswith('.csv'):
             raise serializers.ValidationError("Only CSV files are allowed.")
         
-        # Check file size (max 5MB)
-        max_size = 5 * 1024 * 1024  # 5MB
+        # Check file size (uploads are streamed, so the limit is configurable)
+        max_size = settings.MAX_UPLOAD_SIZE
         if value.size > max_size:
-            raise serializers.ValidationError("File size cannot exceed 5MB.")
+            raise serializers.ValidationError(
+                f"File size cannot exceed {max_size // (1024 * 1024)}MB."
+            )
         
         return value
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    """Serializer for background upload job status"""
+    dataset = DatasetSummarySerializer(read_only=True)
+    created_at = serializers.DateTimeField(format='%Y-%m-%d %H:%M:%S', read_only=True)
+    updated_at = serializers.DateTimeField(format='%Y-%m-%d %H:%M:%S', read_only=True)
+    
+    class Meta:
+        model = UploadJob
+        fields = ['id', 'filename', 'status', 'progress', 'error', 'dataset',
+                  'created_at', 'updated_at']
+        read_only_fields = fields
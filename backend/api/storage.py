@@ -0,0 +1,308 @@
+"""
+Columnar on-disk storage for dataset rows.
+
+Rows are written chunk by chunk as compressed Arrow IPC files under
+MEDIA_ROOT and read back through a memory map, so only the requested
+columns are decoded. Next to each Arrow file the full row list is kept
+pre-encoded as compressed JSON, so API responses can stream it out
+without decoding and re-encoding every row.
+"""
+import os
+import uuid
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .utils import get_numeric_columns
+
+
+ROWS_DIR = 'datasets'
+
+# Codec of the JSON copy, and bytes per chunk when streaming it out
+JSON_COMPRESSION = 'zstd'
+JSON_CHUNK_SIZE = 1024 * 1024
+
+
+def to_storage_frame(df):
+    """
+    Normalize a DataFrame so every chunk maps to the same Arrow schema.
+    The numeric schema columns are stored as float64 (later chunks may
+    hold NaN), every other column as nullable strings, whatever dtype
+    pandas inferred for the chunk.
+    """
+    numeric_columns = set(get_numeric_columns())
+    frame = {}
+    for col in df.columns:
+        series = df[col]
+        if col in numeric_columns:
+            frame[col] = series.astype('float64')
+        else:
+            frame[col] = series.astype(object).where(series.isna(), series.astype(str))
+    return pd.DataFrame(frame, index=df.index)
+
+
+def storage_schema(columns):
+    """
+    Arrow schema of a row file, derived from the column names alone so
+    an all-empty first chunk cannot narrow a column's type.
+    """
+    numeric_columns = set(get_numeric_columns())
+    return pa.schema([
+        pa.field(col, pa.float64() if col in numeric_columns else pa.string())
+        for col in columns
+    ])
+
+
+def json_name(name):
+    """Storage name of the pre-encoded JSON copy of a row file."""
+    return f'{os.path.splitext(name)[0]}.json.zst'
+
+
+def legacy_json_name(name):
+    """Storage name of the uncompressed JSON copy of older row files."""
+    return f'{os.path.splitext(name)[0]}.json'
+
+
+def _encode_records(table):
+    """Encode the rows of an Arrow table as comma-separated JSON objects."""
+    return orjson.dumps(table.to_pylist())[1:-1]
+
+
+class RowsJSONWriter:
+    """
+    Write rows as one compressed JSON array, an Arrow table at a time.
+    """
+    
+    def __init__(self, path):
+        self._stream = pa.CompressedOutputStream(path, JSON_COMPRESSION)
+        self._stream.write(b'[')
+        self._empty = True
+    
+    def write(self, table):
+        """Append the rows of an Arrow table."""
+        records = _encode_records(table)
+        if records:
+            if not self._empty:
+                self._stream.write(b',')
+            self._stream.write(records)
+            self._empty = False
+    
+    def close(self):
+        """Close the array and the file."""
+        self._stream.write(b']')
+        self._stream.close()
+
+
+class RowFileWriter:
+    """
+    Incrementally write DataFrame chunks to a new Arrow IPC file.
+    Use as a context manager; the partial file is removed on error.
+    """
+    
+    def __init__(self):
+        self.name = f'{ROWS_DIR}/{uuid.uuid4().hex}.arrow'
+        self.path = default_storage.path(self.name)
+        self.json_path = default_storage.path(json_name(self.name))
+        self._writer = None
+        self._json = None
+        self._schema = None
+        self._written = False
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        if exc_type is not None:
+            self.discard()
+        return False
+    
+    def write(self, df):
+        """Append a chunk of rows to the file."""
+        if self._schema is None:
+            self._schema = storage_schema(df.columns)
+        table = pa.Table.from_pandas(to_storage_frame(df), schema=self._schema, preserve_index=False)
+        
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            options = pa.ipc.IpcWriteOptions(compression=settings.ROW_STORAGE_COMPRESSION)
+            self._writer = pa.ipc.new_file(self.path, self._schema, options=options)
+            self._json = RowsJSONWriter(self.json_path)
+        
+        self._writer.write_table(table)
+        
+        # Keep the JSON copy in step, encoded from the same stored values
+        self._json.write(table)
+        self._written = True
+    
+    def close(self):
+        """
+        Finish the file. Returns the storage name, or an empty string
+        if nothing was written.
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._json is not None:
+            self._json.close()
+            self._json = None
+        return self.name if self._written else ''
+    
+    def discard(self):
+        """Remove the files written so far."""
+        for path in (self.path, self.json_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _open_rows(name, columns=None):
+    """
+    Open a stored row file through a memory map. Returns the reader and
+    the schema of the batches it yields; with 'columns', only those
+    fields are decoded.
+    """
+    source = pa.memory_map(default_storage.path(name), 'r')
+    reader = pa.ipc.open_file(source)
+    
+    if columns is None:
+        return reader, reader.schema
+    
+    indices = [reader.schema.get_field_index(col) for col in columns]
+    missing = [col for col, index in zip(columns, indices) if index < 0]
+    if missing:
+        raise ValueError(f"Unknown columns: {', '.join(missing)}")
+    
+    indices = sorted(set(indices))
+    schema = pa.schema([reader.schema.field(index) for index in indices])
+    options = pa.ipc.IpcReadOptions(included_fields=indices)
+    return pa.ipc.open_file(source, options=options), schema
+
+
+def read_rows(name, columns=None, offset=0, limit=None):
+    """
+    Memory-map a stored row file and return it as an Arrow table.
+    When 'columns' is given, only those columns are read and decoded;
+    'offset'/'limit' stop reading once the requested slice is covered.
+    """
+    reader, schema = _open_rows(name, columns)
+    stop = offset + limit if limit is not None else None
+    
+    batches = []
+    start = 0
+    skipped = 0
+    for i in range(reader.num_record_batches):
+        if stop is not None and start >= stop:
+            break
+        
+        batch = reader.get_batch(i)
+        if start + batch.num_rows > offset:
+            batches.append(batch)
+        else:
+            skipped += batch.num_rows
+        start += batch.num_rows
+    
+    table = pa.Table.from_batches(batches) if batches else schema.empty_table()
+    table = table.slice(offset - skipped, limit)
+    return table.select(columns) if columns is not None else table
+
+
+def iter_row_batches(name, columns=None):
+    """
+    Yield the stored rows as Arrow record batches, one per written chunk,
+    so large files can be processed without materializing every row.
+    """
+    reader, schema = _open_rows(name, columns)
+    
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        yield batch.select(columns) if columns is not None else batch
+
+
+def batch_offsets(name):
+    """
+    First row position of every record batch of a stored row file, plus
+    the total row count. Only one fixed-width column is decoded to count
+    the rows of each batch.
+    """
+    _, schema = _open_rows(name)
+    numeric = [field.name for field in schema if pa.types.is_floating(field.type)]
+    reader, _ = _open_rows(name, numeric[:1] or schema.names[:1])
+    
+    sizes = [reader.get_batch(i).num_rows for i in range(reader.num_record_batches)]
+    return np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+
+
+def take_rows(name, rows, columns=None, offsets=None):
+    """
+    Read the rows at the given positions, in that order, as an Arrow
+    table. Only the record batches holding them are decoded, one at a
+    time; 'offsets' (see batch_offsets) can be passed when known.
+    """
+    reader, schema = _open_rows(name, columns)
+    rows = np.asarray(rows, dtype=np.int64)
+    if offsets is None:
+        offsets = batch_offsets(name)
+    if len(rows) and (rows.min() < 0 or rows.max() >= offsets[-1]):
+        raise IndexError('Row position out of range')
+    
+    batch_of = np.searchsorted(offsets, rows, side='right') - 1
+    pieces = []
+    positions = []
+    for i in np.unique(batch_of):
+        selected = np.flatnonzero(batch_of == i)
+        pieces.append(reader.get_batch(int(i)).take(pa.array(rows[selected] - offsets[i])))
+        positions.append(selected)
+    
+    if not pieces:
+        table = schema.empty_table()
+    else:
+        # Back from batch order to the requested order
+        order = np.argsort(np.concatenate(positions), kind='stable')
+        table = pa.Table.from_batches(pieces).take(pa.array(order))
+    return table.select(columns) if columns is not None else table
+
+
+def iter_rows_json(name):
+    """
+    Yield the stored rows as pre-encoded JSON (a JSON array of row
+    objects) in chunks of about JSON_CHUNK_SIZE bytes, decompressed from
+    the JSON copy as they are read. Row files without a compressed copy
+    get one encoded batch by batch on first access.
+    """
+    path = default_storage.path(json_name(name))
+    if not os.path.exists(path):
+        # Write atomically so concurrent readers never see a partial copy
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        writer = RowsJSONWriter(tmp_path)
+        for batch in iter_row_batches(name):
+            writer.write(pa.Table.from_batches([batch]))
+        writer.close()
+        os.replace(tmp_path, path)
+        
+        # Older uploads kept an uncompressed copy that is no longer read
+        if default_storage.exists(legacy_json_name(name)):
+            default_storage.delete(legacy_json_name(name))
+    
+    with pa.CompressedInputStream(path, JSON_COMPRESSION) as stream:
+        while True:
+            chunk = stream.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def read_rows_json(name):
+    """Return the stored rows as pre-encoded JSON bytes (see iter_rows_json)."""
+    return b''.join(iter_rows_json(name))
+
+
+def delete_rows(name):
+    """Delete a stored row file and its JSON copies if they exist."""
+    if not name:
+        return
+    for stored in (name, json_name(name), legacy_json_name(name)):
+        if default_storage.exists(stored):
+            default_storage.delete(stored)
@@ -1,8 +1,66 @@
-from django.test import TestCase
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock
+import msgpack
+import orjson
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import EquipmentDataset
+from rest_framework.exceptions import AuthenticationFailed
+from .analysis import analyze_frame
+from .authentication import CachedTokenAuthentication, _cache_key
+from .downsampling import downsample
+from .indexes import get_row_index, NameIndex
+from .jobs import recover_upload_jobs, run_upload_job
+from .middleware import CompressionMiddleware
+from .reports import ReportRenderBusy, shutdown_render_pool
+from .storage import json_name, legacy_json_name, read_rows, take_rows
+from .models import EquipmentDataset, EquipmentReading, RetentionPolicy, UploadJob
+from .utils import (
+    parse_csv_file,
+    compute_summary_statistics,
+    dataframe_to_dict,
+    detect_anomalies,
+    iter_csv_chunks,
+    QuantileSketch,
+    RunningStatistics,
+)
+
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(TEST_MEDIA_ROOT, ignore_errors=True)
+
+
+SAMPLE_CSV = (
+    "Equipment Name,Type,Flowrate,Pressure,Temperature\n"
+    "Pump-1,Pump,120.5,5.2,110.0\n"
+    "Pump-2,Pump,130.0,5.8,115.5\n"
+    "Valve-1,Valve,60.2,4.1,105.0\n"
+    "Reactor-1,Reactor,,7.5,140.2\n"
+    "HX-1,Heat Exchanger,150.0,6.2,130.0\n"
+    "Valve-2,Valve,65.0,abc,102.5\n"
+    "HX-2,Heat Exchanger,155.5,6.4,128.0\n"
+)
 
 
 class AuthenticationTests(TestCase):
@@ -31,8 +89,58 @@ class AuthenticationTests(TestCase):
         response = self.client.post(self.login_url, data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('token', response.data)
+    
+    def test_token_lookup_is_cached_until_logout(self):
+        User.objects.create_user(username='testuser', password='testpass123')
+        token = self.client.post(self.login_url, {'username': 'testuser', 'password': 'testpass123'}).data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        
+        self.assertEqual(self.client.get('/api/datasets/').status_code, status.HTTP_200_OK)
+        # A cached token costs no query: only the dataset list is read
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/datasets/').status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('api_equipmentdataset', queries[0]['sql'])
+        
+        # The password hash is never cached
+        state = cache.get(_cache_key(token))
+        self.assertEqual(state['username'], 'testuser')
+        self.assertNotIn('password', state)
+        
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get('/api/datasets/').status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_cached_token_builds_user_per_request(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        token = self.client.post(self.login_url, {'username': 'testuser', 'password': 'testpass123'}).data['token']
+        auth = CachedTokenAuthentication()
+        
+        auth.authenticate_credentials(token)
+        with self.assertNumQueries(0):
+            first, _ = auth.authenticate_credentials(token)
+            second, _ = auth.authenticate_credentials(token)
+        self.assertEqual(first.pk, user.pk)
+        self.assertIsNot(first, second)
+        
+        # Saving a cached user leaves the password alone
+        first.first_name = 'Test'
+        first.save()
+        self.assertTrue(User.objects.get(pk=user.pk).check_password('testpass123'))
+        
+        # A password change and a deactivation drop the cached token
+        auth.authenticate_credentials(token)
+        user.refresh_from_db()
+        user.set_password('newpass456')
+        user.save()
+        self.assertIsNone(cache.get(_cache_key(token)))
+        auth.authenticate_credentials(token)
+        user.is_active = False
+        user.save()
+        with self.assertRaises(AuthenticationFailed):
+            auth.authenticate_credentials(token)
 
 
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, PDF_RENDER_WORKERS=0)
 class DatasetTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -52,6 +160,38 @@ class DatasetTests(TestCase):
         self.assertEqual(dataset.user, self.user)
         self.assertEqual(dataset.filename, 'test.csv')
     
+    def test_metadata_actions_do_not_load_rows(self):
+        dataset = EquipmentDataset.objects.create(
+            user=self.user,
+            filename='big.csv',
+            raw_data=[{'Equipment Name': f'P{i}', 'Type': 'Pump', 'Flowrate': i} for i in range(1000)],
+            summary_stats=compute_summary_statistics(parse_csv_file(io.BytesIO(SAMPLE_CSV.encode()))),
+            row_count=1000,
+            equipment_types=['Pump']
+        )
+        
+        for url in ['/api/datasets/', f'/api/datasets/{dataset.id}/summary/', f'/api/datasets/{dataset.id}/pdf/']:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(queries), 1, url)
+            self.assertNotIn('raw_data', queries[0]['sql'], url)
+            self.assertNotIn('equipment_types', queries[0]['sql'], url)
+            
+            # What the query fetches is a small fraction of the stored rows
+            with connection.cursor() as cursor:
+                cursor.execute(queries[0]['sql'])
+                fetched = sum(len(str(value)) for row in cursor.fetchall() for value in row)
+            self.assertLess(fetched * 10, len(orjson.dumps(dataset.raw_data)), url)
+        
+        # Detail and paged requests skip the large JSON columns they do not use
+        for url in [f'/api/datasets/{dataset.id}/?include_rows=false', f'/api/datasets/{dataset.id}/rows/?limit=1']:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            for column in ('raw_data', 'aggregates', 'distributions', 'anomalies'):
+                self.assertNotIn(column, queries[0]['sql'], url)
+    
     def test_dataset_cleanup(self):
         # Create 7 datasets
         for i in range(7):
@@ -67,3 +207,834 @@ class DatasetTests(TestCase):
         # Should only keep 5 newest
         count = EquipmentDataset.objects.filter(user=self.user).count()
         self.assertEqual(count, 5)
+    
+    def test_cleanup_is_set_based_and_configurable(self):
+        for i in range(4):
+            EquipmentDataset.objects.create(
+                user=self.user, filename=f'test{i}.csv', raw_data=[],
+                summary_stats={}, row_count=0, equipment_types=[]
+            )
+        RetentionPolicy.objects.create(user=self.user, keep_count=2)
+        
+        with CaptureQueriesContext(connection) as queries:
+            deleted = EquipmentDataset.cleanup_old_datasets(self.user)
+        self.assertEqual(deleted, 2)
+        self.assertFalse(any('raw_data' in query['sql'] for query in queries))
+        self.assertEqual(
+            list(EquipmentDataset.objects.filter(user=self.user).values_list('filename', flat=True)),
+            ['test3.csv', 'test2.csv']
+        )
+    
+    @override_settings(DATASET_RETENTION_MODE='sweep')
+    def test_sweep_mode_defers_cleanup_to_command(self):
+        for i in range(7):
+            EquipmentDataset.objects.create(
+                user=self.user, filename=f'test{i}.csv', raw_data=[],
+                summary_stats={}, row_count=0, equipment_types=[]
+            )
+        self.assertEqual(EquipmentDataset.objects.filter(user=self.user).count(), 7)
+        
+        call_command('sweep_datasets', stdout=io.StringIO())
+        self.assertEqual(EquipmentDataset.objects.filter(user=self.user).count(), 5)
+    
+    @override_settings(DATASET_RETENTION_MODE='sweep')
+    def test_list_uses_retention_limit(self):
+        for i in range(4):
+            EquipmentDataset.objects.create(
+                user=self.user, filename=f'test{i}.csv', raw_data=[],
+                summary_stats={}, row_count=0, equipment_types=[]
+            )
+        RetentionPolicy.objects.create(user=self.user, keep_count=3)
+        
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/datasets/')
+        self.assertEqual(
+            [d['filename'] for d in response.data['results']],
+            ['test3.csv', 'test2.csv', 'test1.csv']
+        )
+
+
+class CSVProcessingTests(TestCase):
+    def test_streaming_statistics_match_full_parse(self):
+        df = parse_csv_file(io.BytesIO(SAMPLE_CSV.encode()))
+        expected = compute_summary_statistics(df)
+        
+        running_stats = RunningStatistics()
+        for chunk in iter_csv_chunks(io.BytesIO(SAMPLE_CSV.encode()), chunksize=2):
+            running_stats.update(chunk)
+        
+        self.assertEqual(running_stats.summary(), expected)
+        self.assertEqual(running_stats.row_count, 7)
+        self.assertEqual(running_stats.equipment_types, ['Pump', 'Valve', 'Reactor', 'Heat Exchanger'])
+    
+    def test_dataframe_to_dict_native_values(self):
+        df = parse_csv_file(io.BytesIO(SAMPLE_CSV.encode()))
+        records = dataframe_to_dict(df)
+        
+        self.assertEqual(len(records), 7)
+        self.assertEqual(records[3], {
+            'Equipment Name': 'Reactor-1', 'Type': 'Reactor',
+            'Flowrate': None, 'Pressure': 7.5, 'Temperature': 140.2,
+        })
+        self.assertIsNone(records[5]['Pressure'])
+        self.assertIs(type(records[0]['Flowrate']), float)
+    
+    def test_missing_columns_rejected_from_header(self):
+        csv_file = io.BytesIO(b"Equipment Name,Type,Flowrate\nPump-1,Pump,1.0\n")
+        with self.assertRaises(ValueError):
+            next(iter_csv_chunks(csv_file))
+
+
+@override_settings(CSV_CHUNK_SIZE=3, MEDIA_ROOT=TEST_MEDIA_ROOT, PDF_RENDER_WORKERS=0)
+class UploadTests(TestCase):
+    def setUp(self):
+        # Dataset ids repeat across tests, so drop files cached under them
+        for directory in ('reports', 'compressed'):
+            shutil.rmtree(os.path.join(TEST_MEDIA_ROOT, directory), ignore_errors=True)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.upload_url = '/api/datasets/upload/'
+    
+    def upload(self, content=SAMPLE_CSV, name='plant.csv'):
+        csv_file = SimpleUploadedFile(name, content.encode(), content_type='text/csv')
+        return self.client.post(self.upload_url, {'file': csv_file}, format='multipart')
+    
+    def test_chunked_upload(self):
+        # Three chunks of at most 3 rows give the same result as one pass
+        response = self.upload()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        dataset = response.json()['dataset']
+        self.assertEqual(dataset['row_count'], 7)
+        self.assertEqual(dataset['raw_data'][3], {
+            'Equipment Name': 'Reactor-1', 'Type': 'Reactor',
+            'Flowrate': None, 'Pressure': 7.5, 'Temperature': 140.2,
+        })
+        self.assertIsNone(dataset['raw_data'][5]['Pressure'])
+        
+        summary = dataset['summary_stats']
+        self.assertEqual(summary['equipment_types'], {'Pump': 2, 'Valve': 2, 'Heat Exchanger': 2, 'Reactor': 1})
+        # Six flowrates: 120.5, 130.0, 60.2, 150.0, 65.0, 155.5
+        self.assertEqual(summary['flowrate'], {'mean': 113.53, 'min': 60.2, 'max': 155.5, 'std': 41.5})
+    
+    def test_rows_stored_in_columnar_file(self):
+        response = self.upload()
+        dataset = EquipmentDataset.objects.get(pk=response.data['dataset']['id'])
+        
+        self.assertIsNone(dataset.raw_data)
+        self.assertTrue(dataset.rows_file.name.endswith('.arrow'))
+        self.assertEqual(dataset.load_rows(columns=['Pressure'])[5], {'Pressure': None})
+        self.assertEqual(dataset.load_rows(), response.json()['dataset']['raw_data'])
+        
+        path = dataset.rows_file.path
+        json_path = default_storage.path(json_name(dataset.rows_file.name))
+        # The JSON copy is stored as a zstd frame
+        with open(json_path, 'rb') as f:
+            self.assertEqual(f.read(4), b'\x28\xb5\x2f\xfd')
+        # Files are released once the deletion commits
+        with self.captureOnCommitCallbacks(execute=True):
+            dataset.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(json_path))
+    
+    def test_extra_columns_stored_as_text_across_chunks(self):
+        lines = ["Equipment Name,Type,Flowrate,Pressure,Temperature,Notes,Tag"]
+        lines += [f"Pump-{i},Pump,100,5.0,110,,{i:03d}" for i in range(4)]
+        lines.append("Valve-1,Valve,60,4.0,100,leaky valve,A17")
+        response = self.upload(content='\n'.join(lines) + '\n')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        dataset = EquipmentDataset.objects.get(pk=response.data['dataset']['id'])
+        rows = dataset.load_rows(columns=['Notes', 'Tag'])
+        self.assertEqual(rows[0], {'Notes': None, 'Tag': '000'})
+        self.assertEqual(rows[4], {'Notes': 'leaky valve', 'Tag': 'A17'})
+    
+    def test_retrieve_splices_pre_encoded_rows(self):
+        dataset_id = self.upload().data['dataset']['id']
+        dataset = EquipmentDataset.objects.get(pk=dataset_id)
+        
+        # The rows are streamed out of the stored JSON copy in chunks
+        with mock.patch('api.storage.JSON_CHUNK_SIZE', 64):
+            response = self.client.get(f'/api/datasets/{dataset_id}/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 3)
+        content = b''.join(chunks)
+        self.assertIn(dataset.rows_json(), content)
+        self.assertEqual(orjson.loads(content)['raw_data'], dataset.load_rows())
+        self.assertEqual(orjson.loads(content)['summary_stats'], dataset.summary_stats)
+        
+        # Row files with only the older uncompressed copy get a compressed
+        # one encoded on first access, and the old copy is dropped
+        compressed_path = default_storage.path(json_name(dataset.rows_file.name))
+        legacy_path = default_storage.path(legacy_json_name(dataset.rows_file.name))
+        os.replace(compressed_path, legacy_path)
+        response = self.client.get(f'/api/datasets/{dataset_id}/')
+        self.assertEqual(orjson.loads(response.getvalue())['raw_data'], dataset.load_rows())
+        self.assertTrue(os.path.exists(compressed_path))
+        self.assertFalse(os.path.exists(legacy_path))
+    
+    def test_readings_aggregated_in_database(self):
+        response = self.upload()
+        dataset_id = response.data['dataset']['id']
+        self.assertEqual(EquipmentReading.objects.filter(dataset_id=dataset_id).count(), 7)
+        
+        response = self.client.get(f'/api/datasets/{dataset_id}/aggregates/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        df = parse_csv_file(io.BytesIO(SAMPLE_CSV.encode()))
+        self.assertEqual(response.data['summary_stats'], compute_summary_statistics(df))
+        self.assertEqual(response.data['type_stats']['Pump']['count'], 2)
+        self.assertEqual(response.data['type_stats']['Pump']['pressure'],
+                         {'mean': 5.5, 'min': 5.2, 'max': 5.8, 'std': 0.42})
+        
+        # A single reading has no spread, a missing one is not counted
+        self.assertEqual(response.data['type_stats']['Reactor']['pressure'],
+                         {'mean': 7.5, 'min': 7.5, 'max': 7.5, 'std': 0.0})
+        self.assertEqual(response.data['type_stats']['Reactor']['flowrate'],
+                         {'mean': 0.0, 'min': 0.0, 'max': 0.0, 'std': 0.0})
+        self.assertEqual(response.data['type_stats']['Valve']['pressure'],
+                         {'mean': 4.1, 'min': 4.1, 'max': 4.1, 'std': 0.0})
+        
+        response = self.client.get(f'/api/datasets/{dataset_id}/aggregates/?type=Reactor')
+        self.assertEqual(response.data['summary_stats']['total_count'], 1)
+        self.assertEqual(response.data['summary_stats']['temperature']['std'], 0.0)
+    
+    def test_rows_paging_and_projection(self):
+        dataset_id = self.upload().data['dataset']['id']
+        
+        response = self.client.get(f'/api/datasets/{dataset_id}/rows/?offset=2&limit=3&fields=Type,Pressure')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(response.data['results'], [
+            {'Type': 'Valve', 'Pressure': 4.1},
+            {'Type': 'Reactor', 'Pressure': 7.5},
+            {'Type': 'Heat Exchanger', 'Pressure': 6.2},
+        ])
+        self.assertIn('offset=5', response.data['next'])
+        
+        response = self.client.get(f'/api/datasets/{dataset_id}/rows/?fields=Missing')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_retrieve_without_rows(self):
+        dataset_id = self.upload().data['dataset']['id']
+        
+        response = self.client.get(f'/api/datasets/{dataset_id}/?include_rows=false')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('raw_data', response.data)
+        self.assertEqual(response.data['row_count'], 7)
+    
+    def test_identical_upload_reuses_processed_rows(self):
+        first = EquipmentDataset.objects.get(pk=self.upload().data['dataset']['id'])
+        self.assertEqual(len(first.content_hash), 64)
+        
+        response = self.upload(name='plant-copy.csv')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        
+        second = EquipmentDataset.objects.get(pk=response.data['dataset']['id'])
+        self.assertEqual(second.filename, 'plant-copy.csv')
+        self.assertEqual(second.rows_file.name, first.rows_file.name)
+        self.assertEqual(second.summary_stats, first.summary_stats)
+        self.assertEqual(second.readings.count(), 7)
+        
+        # The shared row file survives until its last dataset is deleted
+        path = first.rows_file.path
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+    
+    def test_reuse_across_users_is_not_disclosed(self):
+        first = self.upload()
+        
+        other = User.objects.create_user(username='otheruser', password='testpass123')
+        self.client.force_authenticate(user=other)
+        second = self.upload()
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        
+        # The response looks the same whether or not the content was seen before
+        self.assertEqual(set(second.data), set(first.data))
+        self.assertNotIn('reused', second.data)
+        self.assertEqual(second.data['dataset']['user']['username'], 'otheruser')
+        self.assertEqual(second.json()['dataset']['raw_data'], first.json()['dataset']['raw_data'])
+        
+        # Each user only sees their own dataset
+        self.assertEqual([d['id'] for d in self.client.get('/api/datasets/').data['results']], [second.data['dataset']['id']])
+        response = self.client.get(f"/api/datasets/{first.data['dataset']['id']}/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    @override_settings(BACKGROUND_WORKERS=0)
+    def test_async_upload_reports_job_status(self):
+        csv_file = SimpleUploadedFile('plant.csv', SAMPLE_CSV.encode(), content_type='text/csv')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{self.upload_url}?async=true', {'file': csv_file}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job_id = response.data['job']['id']
+        
+        response = self.client.get(f'/api/jobs/{job_id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], UploadJob.Status.SUCCEEDED)
+        self.assertEqual(response.data['progress'], 1.0)
+        self.assertEqual(response.data['dataset']['row_count'], 7)
+        self.assertFalse(UploadJob.objects.get(pk=job_id).file)
+    
+    @override_settings(BACKGROUND_WORKERS=0, UPLOAD_JOB_STALE_AFTER=600, UPLOAD_JOB_RETENTION=3600)
+    def test_lost_jobs_recovered_and_finished_jobs_expire(self):
+        def create_job(job_status, age):
+            job = UploadJob.objects.create(
+                user=self.user, filename='plant.csv', status=job_status,
+                file=SimpleUploadedFile('plant.csv', SAMPLE_CSV.encode())
+            )
+            UploadJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(seconds=age))
+            return UploadJob.objects.get(pk=job.pk)
+        
+        stale = create_job(UploadJob.Status.RUNNING, 3000)
+        active = create_job(UploadJob.Status.RUNNING, 60)
+        queued = create_job(UploadJob.Status.QUEUED, 3000)
+        old = create_job(UploadJob.Status.SUCCEEDED, 7200)
+        
+        self.assertEqual(recover_upload_jobs(), (1, 1))
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, UploadJob.Status.FAILED)
+        self.assertIn('restart', stale.error)
+        self.assertFalse(stale.file)
+        self.assertEqual(UploadJob.objects.get(pk=active.pk).status, UploadJob.Status.RUNNING)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, UploadJob.Status.SUCCEEDED)
+        self.assertEqual(queued.dataset.row_count, 7)
+        
+        # A job is processed only by the worker that claims it
+        run_upload_job(queued.pk)
+        self.assertEqual(EquipmentDataset.objects.filter(user=self.user).count(), 1)
+        
+        # Retention removes finished jobs once they are old enough; the
+        # upload above already applied it to the old job
+        self.assertFalse(UploadJob.objects.filter(pk=old.pk).exists())
+        UploadJob.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timedelta(seconds=7200))
+        self.assertEqual(UploadJob.cleanup_finished(self.user), 1)
+        self.assertEqual(set(UploadJob.objects.values_list('pk', flat=True)), {active.pk, queued.pk})
+    
+    def test_pdf_report_cached_until_dataset_deleted(self):
+        dataset_id = self.upload().data['dataset']['id']
+        url = f'/api/datasets/{dataset_id}/pdf/'
+        
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_pdf = b''.join(response.streaming_content)
+        self.assertTrue(first_pdf.startswith(b'%PDF'))
+        
+        with mock.patch('api.reports.render_report') as render:
+            response = self.client.get(url)
+            self.assertEqual(b''.join(response.streaming_content), first_pdf)
+            render.assert_not_called()
+        
+        reports_dir = os.path.join(TEST_MEDIA_ROOT, 'reports')
+        self.assertTrue(any(name.startswith(f'{dataset_id}-') for name in os.listdir(reports_dir)))
+        with self.captureOnCommitCallbacks(execute=True):
+            EquipmentDataset.objects.get(pk=dataset_id).delete()
+        self.assertFalse(any(name.startswith(f'{dataset_id}-') for name in os.listdir(reports_dir)))
+    
+    def test_retention_removes_files_of_deleted_datasets(self):
+        datasets = []
+        for i in range(3):
+            dataset_id = self.upload(SAMPLE_CSV + f"Tank-{i},Tank,1.0,1.0,1.0\n").data['dataset']['id']
+            b''.join(self.client.get(f'/api/datasets/{dataset_id}/pdf/').streaming_content)
+            with override_settings(COMPRESSION_MIN_SIZE=0, COMPRESSION_ENCODINGS=['gzip']):
+                self.client.get(f'/api/datasets/{dataset_id}/', HTTP_ACCEPT_ENCODING='gzip').getvalue()
+            datasets.append(EquipmentDataset.objects.get(pk=dataset_id))
+        
+        def stored_files(dataset):
+            path = dataset.rows_file.path
+            files = [path, default_storage.path(json_name(dataset.rows_file.name))]
+            for directory in ('reports', 'compressed'):
+                files += [
+                    os.path.join(TEST_MEDIA_ROOT, directory, name)
+                    for name in os.listdir(os.path.join(TEST_MEDIA_ROOT, directory))
+                    if name.startswith(f'{dataset.id}-')
+                ]
+            return files
+        
+        files = {dataset.id: stored_files(dataset) for dataset in datasets}
+        self.assertTrue(all(len(paths) >= 4 for paths in files.values()))
+        
+        RetentionPolicy.objects.create(user=self.user, keep_count=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(EquipmentDataset.cleanup_old_datasets(self.user), 2)
+        self.assertEqual(list(EquipmentDataset.objects.values_list('pk', flat=True)), [datasets[2].id])
+        self.assertFalse(EquipmentReading.objects.filter(dataset_id__in=[datasets[0].id, datasets[1].id]).exists())
+        for dataset in datasets[:2]:
+            self.assertFalse([path for path in files[dataset.id] if os.path.exists(path)])
+        self.assertTrue(all(os.path.exists(path) for path in files[datasets[2].id]))
+        with self.captureOnCommitCallbacks(execute=True):
+            datasets[2].delete()
+    
+    def test_report_styles_built_once(self):
+        from .utils import get_report_styles, render_pdf_report, build_report_context
+        dataset = EquipmentDataset.objects.get(pk=self.upload().data['dataset']['id'])
+        
+        render_pdf_report(build_report_context(dataset))
+        self.assertIs(get_report_styles(), get_report_styles())
+        
+        with mock.patch('api.utils.getSampleStyleSheet') as sample_styles:
+            self.assertTrue(render_pdf_report(build_report_context(dataset)).startswith(b'%PDF'))
+            sample_styles.assert_not_called()
+    
+    def test_export_streams_zip_of_reports(self):
+        first_id = self.upload().data['dataset']['id']
+        second_id = self.upload(content=SAMPLE_CSV + "Tank-1,Tank,10.0,1.0,20.0\n").data['dataset']['id']
+        
+        response = self.client.post('/api/datasets/export/', {'ids': [first_id, second_id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), sorted([
+            f'{first_id}_plant.csv_report.pdf', f'{second_id}_plant.csv_report.pdf',
+        ]))
+        self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in archive.namelist()))
+        
+        response = self.client.post('/api/datasets/export/', {'ids': [first_id, 999999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    @override_settings(PDF_RENDER_WORKERS=2, PDF_RENDER_MAX_CONCURRENCY=2)
+    def test_export_renders_on_process_pool(self):
+        self.addCleanup(shutdown_render_pool)
+        ids = [self.upload(content=SAMPLE_CSV + f"Tank-{i},Tank,10.0,1.0,20.0\n").data['dataset']['id'] for i in range(3)]
+        
+        response = self.client.post('/api/datasets/export/', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        # Entries follow completion order
+        self.assertEqual(sorted(archive.namelist()), sorted(f'{i}_plant.csv_report.pdf' for i in ids))
+        self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in archive.namelist()))
+    
+    def test_export_fails_before_streaming(self):
+        dataset_id = self.upload().data['dataset']['id']
+        url = '/api/datasets/export/'
+        
+        with mock.patch('api.reports.submit_render', side_effect=ReportRenderBusy('busy')):
+            response = self.client.post(url, {'ids': [dataset_id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(response.streaming)
+        
+        with mock.patch('api.reports.render_pdf_report', side_effect=RuntimeError('layout failed')):
+            response = self.client.post(url, {'ids': [dataset_id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertIn('layout failed', response.data['error'])
+    
+    def test_export_reports_failures_after_streaming_started(self):
+        cached_id = self.upload().data['dataset']['id']
+        failing_id = self.upload(content=SAMPLE_CSV + "Tank-1,Tank,1.0,1.0,1.0\n").data['dataset']['id']
+        b''.join(self.client.get(f'/api/datasets/{cached_id}/pdf/').streaming_content)
+        
+        with mock.patch('api.reports.render_pdf_report', side_effect=RuntimeError('layout failed')):
+            response = self.client.post('/api/datasets/export/', {'ids': [cached_id, failing_id]}, format='json')
+            content = b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        
+        # The archive is complete, with the failed report listed last
+        archive = zipfile.ZipFile(io.BytesIO(content))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.namelist(), [f'{cached_id}_plant.csv_report.pdf', 'errors.txt'])
+        self.assertEqual(archive.read('errors.txt').decode(), f'{failing_id}_plant.csv_report.pdf: layout failed\n')
+    
+    def test_conditional_get_returns_not_modified(self):
+        dataset_id = self.upload().data['dataset']['id']
+        
+        for url in [f'/api/datasets/{dataset_id}/', f'/api/datasets/{dataset_id}/summary/',
+                    f'/api/datasets/{dataset_id}/rows/?limit=2', f'/api/datasets/{dataset_id}/pdf/']:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            etag = response['ETag']
+            self.assertIn('Last-Modified', response)
+            
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED, url)
+            self.assertEqual(response['ETag'], etag)
+            self.assertEqual(len(queries), 1, url)
+            self.assertNotIn('raw_data', queries[0]['sql'], url)
+        
+        # Different representations of the same dataset get different ETags
+        first = self.client.get(f'/api/datasets/{dataset_id}/rows/?limit=2')
+        second = self.client.get(f'/api/datasets/{dataset_id}/rows/?limit=3')
+        self.assertNotEqual(first['ETag'], second['ETag'])
+    
+    def test_rows_in_columnar_binary_formats(self):
+        dataset_id = self.upload().data['dataset']['id']
+        url = f'/api/datasets/{dataset_id}/rows/?limit=4&fields=Type,Flowrate'
+        
+        response = self.client.get(url, HTTP_ACCEPT='application/vnd.apache.arrow.stream')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Total-Count'], '7')
+        self.assertIn('offset=4', response['Link'])
+        table = pa.ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.column_names, ['Type', 'Flowrate'])
+        self.assertEqual(table.num_rows, 4)
+        self.assertIsNone(table.column('Flowrate')[3].as_py())
+        
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        payload = msgpack.unpackb(response.content, raw=False)
+        flowrate = np.frombuffer(payload['columns']['Flowrate'], dtype=payload['dtypes']['Flowrate'])
+        self.assertEqual(payload['columns']['Type'][:2], ['Pump', 'Pump'])
+        self.assertTrue(np.isnan(flowrate[3]))
+        
+        # Errors stay JSON, and other endpoints do not offer binary formats
+        response = self.client.get(f'/api/datasets/{dataset_id}/rows/?fields=Bogus',
+                                   HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('error', response.json())
+        response = self.client.get(f'/api/datasets/{dataset_id}/summary/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_406_NOT_ACCEPTABLE)
+    
+    def test_large_payloads_are_compressed_once(self):
+        dataset_id = self.upload().data['dataset']['id']
+        url = f'/api/datasets/{dataset_id}/'
+        plain = self.client.get(url)
+        content = plain.getvalue()
+        
+        with override_settings(COMPRESSION_MIN_SIZE=0, COMPRESSION_ENCODINGS=['gzip']):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn('Accept-Encoding', response['Vary'])
+            self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+            # The streamed detail is compressed as it goes and stored
+            # once the whole body has been sent
+            self.assertEqual(gzip.decompress(response.getvalue()), content)
+            cached = os.listdir(os.path.join(TEST_MEDIA_ROOT, 'compressed'))
+            self.assertEqual(len([name for name in cached if name.startswith(f'{dataset_id}-')]), 1)
+            
+            with mock.patch('api.models.iter_rows_json') as iter_rows_json:
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(gzip.decompress(response.getvalue()), content)
+            iter_rows_json.assert_not_called()
+            
+            # The weak ETag still revalidates
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='identity')
+            self.assertFalse(response.has_header('Content-Encoding'))
+            
+            # Parameterized requests are compressed per response, never stored
+            for query in ['search/?q=p', 'search/?q=pu', 'rows/?limit=2', 'series/?column=Pressure']:
+                response = self.client.get(f'{url}{query}', HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+            cached = os.listdir(os.path.join(TEST_MEDIA_ROOT, 'compressed'))
+            self.assertEqual(len([name for name in cached if name.startswith(f'{dataset_id}-')]), 1)
+            
+            # The stored copy is per host, as bodies may hold absolute links
+            self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_HOST='localhost').getvalue()
+            cached = os.listdir(os.path.join(TEST_MEDIA_ROOT, 'compressed'))
+            self.assertEqual(len([name for name in cached if name.startswith(f'{dataset_id}-')]), 2)
+            
+            # HTML pages hold CSRF tokens and stay uncompressed
+            page = HttpResponse(b'<input name="csrfmiddlewaretoken">' * 100, content_type='text/html')
+            request = RequestFactory().get('/admin/', HTTP_ACCEPT_ENCODING='gzip')
+            response = CompressionMiddleware(lambda request: page)(request)
+            self.assertFalse(response.has_header('Content-Encoding'))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            EquipmentDataset.objects.get(pk=dataset_id).delete()
+        cached = os.listdir(os.path.join(TEST_MEDIA_ROOT, 'compressed'))
+        self.assertFalse([name for name in cached if name.startswith(f'{dataset_id}-')])
+    
+    def test_compare_merges_stored_aggregates(self):
+        extra = "Tank-1,Tank,10.0,1.0,20.0\nPump-3,Pump,90.0,4.0,100.0\n"
+        first_id = self.upload().data['dataset']['id']
+        second_id = self.upload(content=SAMPLE_CSV + extra).data['dataset']['id']
+        
+        # Datasets stored before aggregates existed get them computed once
+        EquipmentDataset.objects.filter(pk=first_id).update(aggregates={})
+        
+        url = f'/api/datasets/compare/?ids={first_id},{second_id}'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any('equipmentreading' in query['sql'] for query in queries))
+        
+        first, second = response.data['datasets']
+        self.assertEqual(first['summary_stats'], compute_summary_statistics(
+            parse_csv_file(io.BytesIO(SAMPLE_CSV.encode()))))
+        self.assertEqual(second['type_stats']['Pump']['count'], 3)
+        
+        combined = parse_csv_file(io.BytesIO((SAMPLE_CSV + SAMPLE_CSV.split('\n', 1)[1] + extra).encode()))
+        self.assertEqual(response.data['combined']['row_count'], 16)
+        self.assertEqual(response.data['combined']['summary_stats'], compute_summary_statistics(combined))
+        self.assertEqual(response.data['combined']['type_stats']['Pump']['count'], 5)
+        
+        # Aggregates are only computed once
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse(any(query['sql'].startswith('UPDATE') for query in queries))
+        
+        response = self.client.get(f'/api/datasets/compare/?ids={first_id},999999')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/api/datasets/compare/?ids=a,b')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_type_statistics_precomputed_at_upload(self):
+        dataset_id = self.upload().data['dataset']['id']
+        
+        response = self.client.get(f'/api/datasets/{dataset_id}/summary/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        type_stats = response.data['type_stats']
+        self.assertEqual(list(type_stats), ['Heat Exchanger', 'Pump', 'Reactor', 'Valve'])
+        self.assertEqual(type_stats['Pump']['count'], 2)
+        self.assertEqual(type_stats['Pump']['pressure'], {
+            'count': 2, 'mean': 5.5, 'min': 5.2, 'max': 5.8, 'std': 0.42,
+            'p25': 5.35, 'median': 5.5, 'p75': 5.65,
+        })
+        self.assertEqual(type_stats['Reactor']['flowrate']['count'], 0)
+        self.assertEqual(type_stats['Valve']['pressure'], {
+            'count': 1, 'mean': 4.1, 'min': 4.1, 'max': 4.1, 'std': 0.0,
+            'p25': 4.1, 'median': 4.1, 'p75': 4.1,
+        })
+        
+        # Matches the per-type aggregation done in the database, including
+        # single-reading types and missing values
+        response = self.client.get(f'/api/datasets/{dataset_id}/aggregates/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        readings = response.data['type_stats']
+        self.assertEqual(list(readings), list(type_stats))
+        for equipment_type, stats in readings.items():
+            self.assertEqual(stats['count'], type_stats[equipment_type]['count'])
+            for column in ('flowrate', 'pressure', 'temperature'):
+                for metric in ('mean', 'min', 'max', 'std'):
+                    self.assertEqual(stats[column][metric], type_stats[equipment_type][column][metric])
+    
+    @override_settings(HISTOGRAM_BINS=4)
+    def test_distributions_precomputed_at_upload(self):
+        dataset_id = self.upload().data['dataset']['id']
+        url = f'/api/datasets/{dataset_id}/distributions/'
+        
+        # Flowrates 60.2, 65.0 | - | 120.5, 130.0 | 150.0, 155.5 over
+        # four bins of width 23.825; the missing reading is not counted
+        response = self.client.get(f'{url}?quantiles=0,0.5,1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        flowrate = response.data['columns']['flowrate']
+        np.testing.assert_allclose(flowrate['edges'], [60.2, 84.025, 107.85, 131.675, 155.5])
+        self.assertEqual(flowrate['counts'], [2, 0, 2, 2])
+        self.assertEqual(flowrate['quantiles'], {'0.0': 60.2, '0.5': 125.25, '1.0': 155.5})
+        self.assertNotIn('sketch', flowrate)
+        
+        # Per-type histograms share the overall edges
+        expected = {'Pump': [0, 0, 2, 0], 'Valve': [2, 0, 0, 0], 'Heat Exchanger': [0, 0, 0, 2], 'Reactor': [0, 0, 0, 0]}
+        for equipment_type, counts in expected.items():
+            response = self.client.get(url, {'type': equipment_type})
+            self.assertEqual(response.data['columns']['flowrate']['counts'], counts, equipment_type)
+        
+        response = self.client.get(f'{url}?type=Pump&sketches=true')
+        self.assertEqual(response.data['columns']['pressure']['sketch'], {
+            'means': [5.2, 5.8], 'weights': [1.0, 1.0], 'min': 5.2, 'max': 5.8,
+        })
+        
+        response = self.client.get(f'/api/datasets/{dataset_id}/distributions/?type=Bogus')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_quantile_sketches_merge(self):
+        values = np.arange(10000, dtype=np.float64)
+        left = QuantileSketch.from_values(values[:4000], 100)
+        right = QuantileSketch.from_values(values[4000:], 100)
+        merged = QuantileSketch.from_dict(left.merge(right, 100).to_dict())
+        
+        self.assertLess(len(merged.means), 100)
+        self.assertEqual(merged.weights.sum(), 10000)
+        estimates = merged.quantile([0.01, 0.5, 0.99])
+        np.testing.assert_allclose(estimates, [99.99, 4999.5, 9899.01], atol=50)
+    
+    def test_series_downsampled_and_cached(self):
+        dataset_id = self.upload().data['dataset']['id']
+        url = f'/api/datasets/{dataset_id}/series/?column=pressure&points=4'
+        
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['column'], 'Pressure')
+        self.assertEqual(response.data['total'], 7)
+        self.assertEqual(response.data['points'], 4)
+        # Pressures at rows 0-4 and 6 (row 5 is missing). LTTB keeps both
+        # endpoints and, from buckets {1, 2} and {3, 4}, the point making
+        # the largest triangle: row 2 (4.1) and then row 3 (7.5)
+        self.assertEqual(response.data['x'], [0, 2, 3, 6])
+        self.assertEqual(response.data['y'], [5.2, 4.1, 7.5, 6.4])
+        
+        with mock.patch.object(EquipmentDataset, 'load_table') as load_table:
+            self.assertEqual(self.client.get(url).data['y'], response.data['y'])
+        load_table.assert_not_called()
+        
+        response = self.client.get(f'/api/datasets/{dataset_id}/series/?column=pressure&points=4&method=minmax')
+        self.assertEqual(sorted(response.data['y']), [4.1, 5.8, 6.2, 7.5])
+        
+        response = self.client.get(f'/api/datasets/{dataset_id}/series/?column=Type')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_lttb_keeps_peaks(self):
+        # One interior bucket: the peak makes the largest triangle
+        x = np.arange(5, dtype=np.float64)
+        selected_x, selected_y = downsample(x, np.array([0.0, 1.0, 5.0, 1.0, 0.0]), 3, 'lttb')
+        self.assertEqual(selected_x.tolist(), [0.0, 2.0, 4.0])
+        self.assertEqual(selected_y.tolist(), [0.0, 5.0, 0.0])
+        
+        x = np.arange(1000, dtype=np.float64)
+        y = np.sin(x / 50)
+        y[333] = 10.0
+        
+        selected_x, selected_y = downsample(x, y, 50, 'lttb')
+        self.assertEqual(len(selected_x), 50)
+        self.assertEqual((selected_x[0], selected_x[-1]), (0.0, 999.0))
+        self.assertIn(333.0, selected_x)
+        self.assertTrue(np.all(np.diff(selected_x) > 0))
+    
+    def test_query_filters_and_sorts_through_index(self):
+        dataset_id = self.upload().data['dataset']['id']
+        url = f'/api/datasets/{dataset_id}/query/'
+        
+        response = self.client.get(url, {'type': 'Heat Exchanger', 'pressure_min': 6, 'sort': '-Pressure'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([row['Equipment Name'] for row in response.data['results']], ['HX-2', 'HX-1'])
+        
+        response = self.client.get(url, {'pressure_min': 6, 'sort': 'pressure', 'fields': 'Equipment Name'})
+        self.assertEqual(response.data['results'], [
+            {'Equipment Name': 'HX-1'}, {'Equipment Name': 'HX-2'}, {'Equipment Name': 'Reactor-1'}
+        ])
+        
+        # Missing readings sort last in both directions
+        response = self.client.get(url, {'sort': '-flowrate', 'offset': 5, 'limit': 2})
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual([row['Equipment Name'] for row in response.data['results']], ['Valve-1', 'Reactor-1'])
+        self.assertIsNone(response.data['next'])
+        
+        # The index is built once per dataset and reused
+        dataset = EquipmentDataset.objects.get(pk=dataset_id)
+        self.assertIs(get_row_index(dataset), get_row_index(dataset))
+        
+        # Pages read their rows by position instead of scanning the file
+        with mock.patch('api.models.read_rows') as read_rows, \
+                mock.patch('api.models.take_rows', wraps=take_rows) as take:
+            response = self.client.get(url, {'type': 'Valve', 'fields': 'Equipment Name,Pressure'})
+        read_rows.assert_not_called()
+        self.assertEqual(take.call_args.args[1].tolist(), [2, 5])
+        self.assertEqual(response.data['results'], [
+            {'Equipment Name': 'Valve-1', 'Pressure': 4.1}, {'Equipment Name': 'Valve-2', 'Pressure': None}
+        ])
+        
+        self.assertEqual(self.client.get(url, {'pressure_min': 'abc'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'fields': 'Bogus'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'sort': 'Type'}).status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_search_equipment_names(self):
+        dataset_id = self.upload().data['dataset']['id']
+        url = f'/api/datasets/{dataset_id}/search/'
+        
+        response = self.client.get(url, {'q': 'pu'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['results'][0], {'row': 0, 'name': 'Pump-1', 'type': 'Pump'})
+        
+        response = self.client.get(url, {'q': '-1', 'mode': 'substring'})
+        self.assertEqual([r['name'] for r in response.data['results']], ['HX-1', 'Pump-1', 'Reactor-1', 'Valve-1'])
+        response = self.client.get(url, {'q': 'LVE-2', 'mode': 'substring'})
+        self.assertEqual([r['name'] for r in response.data['results']], ['Valve-2'])
+        response = self.client.get(url, {'q': 'p', 'type': 'Valve'})
+        self.assertEqual(response.data['count'], 0)
+        
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'q': 'p', 'mode': 'fuzzy'}).status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_name_index_prefix_and_substring(self):
+        names = ['VALVE-PUMP-3A', 'PUMP-3B', 'pump-3a2', None, 'PUMP-3A1']
+        index = NameIndex(names, ['Valve', 'Pump', 'Pump', None, 'Pump'])
+        
+        self.assertEqual(index.prefix('PUMP-3A').tolist(), [4, 2])
+        self.assertEqual(index.substring('pump-3a').tolist(), [4, 2, 0])
+        self.assertEqual(index.substring('3b').tolist(), [1])
+        total, rows = index.search('pump-3', limit=2)
+        self.assertEqual((total, rows.tolist()), (3, [4, 2]))
+        self.assertEqual(index.substring('xyz').tolist(), [])
+    
+    def test_anomaly_index_built_at_upload(self):
+        lines = ["Equipment Name,Type,Flowrate,Pressure,Temperature"]
+        lines += [f"Pump-{i},Pump,{100 + i % 5},{5.0 + (i % 3) * 0.1},{110 + i % 4}" for i in range(30)]
+        lines += [f"Valve-{i},Valve,{60 + i % 3},{4.0 + (i % 2) * 0.1},{100 + i % 2}" for i in range(10)]
+        lines.append("Pump-X,Pump,101,50.0,111")
+        dataset_id = self.upload(content='\n'.join(lines) + '\n').data['dataset']['id']
+        
+        response = self.client.get(f'/api/datasets/{dataset_id}/anomalies/?column=pressure&method=zscore')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        result = response.data['results'][0]
+        self.assertEqual(result['row'], 40)
+        self.assertEqual(result['data']['Equipment Name'], 'Pump-X')
+        self.assertEqual(result['flags'], [
+            'pressure:zscore:global', 'pressure:zscore:type', 'pressure:iqr:global', 'pressure:iqr:type'
+        ])
+        
+        # Valve pressures only stand out against the whole dataset
+        response = self.client.get(f'/api/datasets/{dataset_id}/anomalies/?column=pressure&type=Valve')
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual([r['row'] for r in response.data['results']], list(range(30, 40)))
+        self.assertIn('pressure:iqr:global', response.data['results'][0]['flags'])
+        self.assertNotIn('pressure:iqr:type', response.data['results'][0]['flags'])
+        
+        # Later pages read only their own rows from the row file
+        with mock.patch('api.models.read_rows') as read_rows:
+            response = self.client.get(f'/api/datasets/{dataset_id}/anomalies/?column=pressure&type=Valve&offset=8')
+        read_rows.assert_not_called()
+        self.assertEqual([r['data']['Equipment Name'] for r in response.data['results']], ['Valve-8', 'Valve-9'])
+        response = self.client.get(f'/api/datasets/{dataset_id}/anomalies/?column=pressure&scope=type&type=Valve')
+        self.assertEqual(response.data['count'], 0)
+        response = self.client.get(f'/api/datasets/{dataset_id}/anomalies/?column=bogus')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        dataset = EquipmentDataset.objects.get(pk=dataset_id)
+        self.assertEqual(dataset.anomalies['top'][0]['Equipment Name'], 'Pump-X')
+        response = self.client.get(f'/api/datasets/{dataset_id}/pdf/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_anomaly_rules_flag_hand_computed_rows(self):
+        # Eleven flowrates of 10 and one of 40: mean 12.5, sample std
+        # sqrt(75) ~ 8.66, so |z| of the 40 is ~3.18 and of the rest ~0.29;
+        # Q1 = Q3 = 10 puts the IQR fences at 10. Constant columns have no
+        # spread and flag nothing.
+        df = pd.DataFrame({
+            'Equipment Name': [f'Pump-{i}' for i in range(12)],
+            'Type': ['Pump'] * 12,
+            'Flowrate': [10.0] * 11 + [40.0],
+            'Pressure': [5.0] * 12,
+            'Temperature': [100.0] * 12,
+        })
+        index = detect_anomalies(df, z_threshold=3.0, iqr_factor=1.5)
+        
+        self.assertEqual(index['rows'], [11])
+        # Bits 0-3: flowrate zscore global/type, iqr global/type
+        self.assertEqual(index['flags'], [0b1111])
+        self.assertEqual(
+            {name: count for name, count in index['counts'].items() if count},
+            {'flowrate:zscore:global': 1, 'flowrate:zscore:type': 1, 'flowrate:iqr:global': 1, 'flowrate:iqr:type': 1}
+        )
+        self.assertEqual(index['top'][0]['row'], 11)
+        self.assertEqual(index['top'][0]['Flowrate'], 40.0)
+        
+        # A stricter z threshold leaves only the IQR flags
+        index = detect_anomalies(df, z_threshold=3.2, iqr_factor=1.5)
+        self.assertEqual(index['flags'], [0b1100])
+    
+    def test_analysis_over_chunks_matches_one_frame(self):
+        # The upload is analyzed over three record batches; the result
+        # equals analyzing all rows at once
+        dataset = EquipmentDataset.objects.get(pk=self.upload().data['dataset']['id'])
+        df = read_rows(dataset.rows_file.name).to_pandas()
+        analysis = analyze_frame(df)
+        
+        self.assertEqual(dataset.type_stats, analysis['type_stats'])
+        self.assertEqual(dataset.distributions, analysis['distributions'])
+        self.assertEqual(dataset.anomalies, analysis['anomalies'])
+        
+        # Rows are fetched by position across batches, in the given order
+        rows = take_rows(dataset.rows_file.name, [6, 0, 4], ['Equipment Name'])
+        self.assertEqual(rows.column('Equipment Name').to_pylist(), ['HX-2', 'Pump-1', 'HX-1'])
@@ -0,0 +1,46 @@
+"""
+Upload handlers for the API.
+"""
+import hashlib
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class ContentHashUploadHandler(FileUploadHandler):
+    """
+    Hash every uploaded file while its chunks stream in.
+    
+    The handler passes all data through to the next handler unchanged
+    and records the SHA-256 digest per form field on
+    request.upload_hashes, so identical uploads can be recognized
+    without reading the file a second time.
+    """
+    
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+    
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+    
+    def file_complete(self, file_size):
+        if not hasattr(self.request, 'upload_hashes'):
+            self.request.upload_hashes = {}
+        self.request.upload_hashes[self.field_name] = self.hasher.hexdigest()
+        return None
+
+
+def get_upload_hash(request, field_name, uploaded_file):
+    """
+    Return the SHA-256 digest of an uploaded file, using the digest
+    recorded by ContentHashUploadHandler when available.
+    """
+    upload_hashes = getattr(request._request, 'upload_hashes', {})
+    if field_name in upload_hashes:
+        return upload_hashes[field_name]
+    
+    hasher = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        hasher.update(chunk)
+    uploaded_file.seek(0)
+    return hasher.hexdigest()
@@ -4,6 +4,7 @@ from . import views
 
 router = DefaultRouter()
 router.register(r'datasets', views.EquipmentDatasetViewSet, basename='dataset')
+router.register(r'jobs', views.UploadJobViewSet, basename='job')
 
 urlpatterns = [
     # Health check
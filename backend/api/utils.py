@@ -1,6 +1,7 @@
 """
 Utility functions for CSV processing, statistics computation, and PDF generation.
 """
+import functools
 import pandas as pd
 import numpy as np
 import io
@@ -13,12 +14,23 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from django.conf import settings
 
 
+def get_text_columns():
+    """Text columns of the configured equipment CSV schema."""
+    return list(settings.EQUIPMENT_CSV_SCHEMA['text_columns'])
+
+
+def get_numeric_columns():
+    """Numeric sensor columns of the configured equipment CSV schema."""
+    return list(settings.EQUIPMENT_CSV_SCHEMA['numeric_columns'])
+
+
 def validate_csv_columns(df):
     """
     Validate that the CSV has required columns.
-    Expected columns: Equipment Name, Type, Flowrate, Pressure, Temperature
+    Expected columns come from settings.EQUIPMENT_CSV_SCHEMA
+    (by default: Equipment Name, Type, Flowrate, Pressure, Temperature).
     """
-    required_columns = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+    required_columns = get_text_columns() + get_numeric_columns()
     missing_columns = [col for col in required_columns if col not in df.columns]
     
     if missing_columns:
@@ -27,103 +39,878 @@ def validate_csv_columns(df):
     return True
 
 
+def read_csv_header(csv_file):
+    """
+    Read and validate only the header row of the uploaded CSV.
+    Returns a mapping of stripped column names to the raw header names.
+    The file is rewound so it can be consumed again from the start.
+    """
+    try:
+        csv_file.seek(0)
+        header = pd.read_csv(csv_file, nrows=0)
+    except pd.errors.EmptyDataError:
+        raise ValueError("CSV file is empty")
+    except pd.errors.ParserError as e:
+        raise ValueError(f"CSV parsing error: {str(e)}")
+    finally:
+        csv_file.seek(0)
+    
+    columns = {str(col).strip(): col for col in header.columns}
+    validate_csv_columns(pd.DataFrame(columns=list(columns)))
+    
+    return columns
+
+
+def clean_csv_chunk(df):
+    """
+    Normalize a raw CSV chunk: strip column names, coerce numeric
+    columns and drop rows where every value is missing.
+    """
+    df.columns = df.columns.str.strip()
+    
+    for col in get_numeric_columns():
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    
+    return df.dropna(how='all')
+
+
+def iter_csv_chunks(csv_file, chunksize=None):
+    """
+    Stream the uploaded CSV as cleaned DataFrame chunks of bounded size.
+    The header is validated before any data rows are parsed, so peak
+    memory depends on the chunk size rather than the file size.
+    """
+    columns = read_csv_header(csv_file)
+    chunksize = chunksize or settings.CSV_CHUNK_SIZE
+    
+    # Read everything but the numeric schema columns as text, so every
+    # chunk has the same dtypes whatever values the first one holds
+    numeric_columns = set(get_numeric_columns())
+    dtype = {raw: object for col, raw in columns.items() if col not in numeric_columns}
+    
+    try:
+        with pd.read_csv(csv_file, chunksize=chunksize, dtype=dtype) as reader:
+            for chunk in reader:
+                yield clean_csv_chunk(chunk)
+    except pd.errors.ParserError as e:
+        raise ValueError(f"CSV parsing error: {str(e)}")
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Error processing CSV: {str(e)}")
+
+
 def parse_csv_file(csv_file):
     """
     Parse uploaded CSV file into pandas DataFrame.
     Returns DataFrame or raises ValueError.
     """
-    try:
-        # Read CSV with pandas
-        df = pd.read_csv(csv_file)
-        
-        # Validate columns
-        validate_csv_columns(df)
+    chunks = list(iter_csv_chunks(csv_file))
+    return pd.concat(chunks, ignore_index=True)
+
+
+class ColumnMoments:
+    """
+    Mergeable per-column moments (count, mean, M2, min, max) for a block
+    of numeric columns. Every metric is held as a NumPy array with one
+    entry per column, so moments of all columns merge together.
+    """
+    
+    def __init__(self, count, mean, m2, minimum, maximum):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+    
+    @classmethod
+    def empty(cls, width):
+        """Moments of zero rows for 'width' columns."""
+        return cls(
+            np.zeros(width, dtype=np.int64),
+            np.zeros(width),
+            np.zeros(width),
+            np.full(width, np.nan),
+            np.full(width, np.nan),
+        )
+    
+    @classmethod
+    def from_block(cls, block):
+        """
+        Compute moments for every column of a 2-D float block; NaN values
+        are ignored. The present values of each column are compacted into
+        one contiguous array, then reduced with NumPy: the mean first and
+        M2 from the deviations around it (two passes, for a stable
+        variance), plus min and max.
+        """
+        moments = cls.empty(block.shape[1])
+        for i in range(block.shape[1]):
+            column = block[:, i]
+            values = column[~np.isnan(column)]
+            if len(values) == 0:
+                continue
+            
+            mean = values.mean()
+            deviations = values - mean
+            moments.count[i] = len(values)
+            moments.mean[i] = mean
+            moments.m2[i] = deviations @ deviations
+            moments.minimum[i] = values.min()
+            moments.maximum[i] = values.max()
         
-        # Clean column names (strip whitespace)
-        df.columns = df.columns.str.strip()
+        return moments
+    
+    def merge(self, other):
+        """Combine two sets of moments with Chan's parallel update."""
+        count = self.count + other.count
+        fraction = np.divide(other.count, count, out=np.zeros(len(count)), where=count > 0)
+        delta = other.mean - self.mean
         
-        # Convert numeric columns
-        numeric_columns = ['Flowrate', 'Pressure', 'Temperature']
-        for col in numeric_columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+        return ColumnMoments(
+            count,
+            self.mean + delta * fraction,
+            self.m2 + other.m2 + delta * delta * self.count * fraction,
+            np.fmin(self.minimum, other.minimum),
+            np.fmax(self.maximum, other.maximum),
+        )
+    
+    def std(self):
+        """Sample standard deviation per column (0 where undefined)."""
+        variance = np.divide(self.m2, self.count - 1,
+                             out=np.zeros(len(self.count)), where=self.count > 1)
+        return np.sqrt(variance)
+    
+    def to_dict(self):
+        """
+        Plain-JSON form of the moments (lists per metric, NaN as None),
+        for storing partial aggregates with a dataset.
+        """
+        def values(array):
+            return [None if np.isnan(v) else float(v) for v in array]
         
-        # Remove rows with all NaN values
-        df = df.dropna(how='all')
+        return {
+            'count': [int(v) for v in self.count],
+            'mean': values(self.mean),
+            'm2': values(self.m2),
+            'min': values(self.minimum),
+            'max': values(self.maximum),
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild moments stored with to_dict()."""
+        def values(items):
+            return np.array([np.nan if v is None else v for v in items], dtype=np.float64)
         
-        return df
+        return cls(
+            np.array(data['count'], dtype=np.int64),
+            values(data['mean']),
+            values(data['m2']),
+            values(data['min']),
+            values(data['max']),
+        )
     
-    except pd.errors.EmptyDataError:
-        raise ValueError("CSV file is empty")
-    except pd.errors.ParserError as e:
-        raise ValueError(f"CSV parsing error: {str(e)}")
-    except Exception as e:
-        raise ValueError(f"Error processing CSV: {str(e)}")
+    def select(self, index):
+        """Moments of the columns at the given positions, in that order."""
+        return ColumnMoments(
+            self.count[index], self.mean[index], self.m2[index],
+            self.minimum[index], self.maximum[index],
+        )
+    
+    def as_stats(self, columns):
+        """
+        Format the moments as summary_stats entries keyed by the
+        lowercased column name.
+        """
+        std = self.std()
+        stats = {}
+        for i, col in enumerate(columns):
+            if self.count[i] == 0:
+                stats[col.lower()] = {'mean': 0.0, 'min': 0.0, 'max': 0.0, 'std': 0.0}
+                continue
+            
+            stats[col.lower()] = {
+                'mean': float(np.round(self.mean[i], 2)),
+                'min': float(np.round(self.minimum[i], 2)),
+                'max': float(np.round(self.maximum[i], 2)),
+                'std': float(np.round(std[i], 2)),
+            }
+        return stats
+
+
+def numeric_block(df, columns=None):
+    """Extract the numeric schema columns as one 2-D float64 array."""
+    columns = columns or get_numeric_columns()
+    return df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def count_equipment_types(df):
+    """Equipment type counts as a plain dict, most common first."""
+    return {str(k): int(v) for k, v in df['Type'].value_counts().to_dict().items()}
 
 
 def compute_summary_statistics(df):
     """
     Compute summary statistics from the DataFrame.
-    Returns a dictionary with statistics.
+    All numeric schema columns are taken as one 2-D float block and
+    reduced with ColumnMoments. Returns a dictionary with statistics.
     """
+    columns = get_numeric_columns()
+    moments = ColumnMoments.from_block(numeric_block(df, columns))
+    
     stats = {
         'total_count': int(len(df)),
-        'equipment_types': {str(k): int(v) for k, v in df['Type'].value_counts().to_dict().items()},
-        'flowrate': {
-            'mean': float(round(df['Flowrate'].mean(), 2)) if not df['Flowrate'].isna().all() else 0.0,
-            'min': float(round(df['Flowrate'].min(), 2)) if not df['Flowrate'].isna().all() else 0.0,
-            'max': float(round(df['Flowrate'].max(), 2)) if not df['Flowrate'].isna().all() else 0.0,
-            'std': float(round(df['Flowrate'].std(), 2)) if not df['Flowrate'].isna().all() else 0.0,
-        },
-        'pressure': {
-            'mean': float(round(df['Pressure'].mean(), 2)) if not df['Pressure'].isna().all() else 0.0,
-            'min': float(round(df['Pressure'].min(), 2)) if not df['Pressure'].isna().all() else 0.0,
-            'max': float(round(df['Pressure'].max(), 2)) if not df['Pressure'].isna().all() else 0.0,
-            'std': float(round(df['Pressure'].std(), 2)) if not df['Pressure'].isna().all() else 0.0,
-        },
-        'temperature': {
-            'mean': float(round(df['Temperature'].mean(), 2)) if not df['Temperature'].isna().all() else 0.0,
-            'min': float(round(df['Temperature'].min(), 2)) if not df['Temperature'].isna().all() else 0.0,
-            'max': float(round(df['Temperature'].max(), 2)) if not df['Temperature'].isna().all() else 0.0,
-            'std': float(round(df['Temperature'].std(), 2)) if not df['Temperature'].isna().all() else 0.0,
-        },
+        'equipment_types': count_equipment_types(df),
     }
+    stats.update(moments.as_stats(columns))
     
     return stats
 
 
+# Percentiles reported per type, keyed by their name in type_stats
+TYPE_PERCENTILES = {'p25': 0.25, 'median': 0.5, 'p75': 0.75}
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch in the style of a merging t-digest: values
+    are summarized as weighted centroids, kept small in the middle of the
+    distribution and fine-grained in the tails. Building, merging and
+    compressing are vectorized over NumPy arrays.
+    """
+    
+    def __init__(self, means, weights, minimum, maximum):
+        self.means = means
+        self.weights = weights
+        self.minimum = minimum
+        self.maximum = maximum
+    
+    @classmethod
+    def empty(cls):
+        """Sketch of no values."""
+        return cls(np.zeros(0), np.zeros(0), np.nan, np.nan)
+    
+    @classmethod
+    def from_values(cls, values, compression):
+        """Sketch a 1-D float array; NaN values are ignored."""
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return cls.empty()
+        
+        sketch = cls(values, np.ones(len(values)), float(values.min()), float(values.max()))
+        return sketch.compress(compression)
+    
+    def compress(self, compression):
+        """
+        Merge neighbouring centroids so that each one covers at most one
+        unit of the k1 scale function k(q) = compression / 2pi * asin(2q - 1).
+        """
+        if len(self.means) == 0:
+            return self
+        
+        order = np.argsort(self.means, kind='mergesort')
+        means = self.means[order]
+        weights = self.weights[order]
+        
+        # Bucket every centroid by the scale value at its midpoint
+        total = weights.sum()
+        midpoints = (np.cumsum(weights) - weights / 2) / total
+        k = compression / (2 * np.pi) * np.arcsin(2 * midpoints - 1)
+        buckets = np.floor(k - k[0]).astype(np.int64)
+        
+        merged_weights = np.bincount(buckets, weights=weights)
+        merged_sums = np.bincount(buckets, weights=means * weights)
+        present = merged_weights > 0
+        
+        return QuantileSketch(
+            merged_sums[present] / merged_weights[present],
+            merged_weights[present],
+            self.minimum,
+            self.maximum,
+        )
+    
+    def merge(self, other, compression):
+        """Combine two sketches into one of the given compression."""
+        return QuantileSketch(
+            np.concatenate([self.means, other.means]),
+            np.concatenate([self.weights, other.weights]),
+            float(np.fmin(self.minimum, other.minimum)),
+            float(np.fmax(self.maximum, other.maximum)),
+        ).compress(compression)
+    
+    def quantile(self, q):
+        """Estimate the q-quantile(s) (0 <= q <= 1); NaN when empty."""
+        q = np.asarray(q, dtype=np.float64)
+        if len(self.means) == 0:
+            return np.full(q.shape, np.nan)
+        
+        # Interpolate between the mid ranks of the centroids, anchored at
+        # min and max; while every centroid is a single value this is the
+        # linear percentile of np.percentile
+        total = self.weights.sum()
+        positions = np.concatenate([[0.0], np.cumsum(self.weights) - self.weights / 2 - 0.5, [total - 1]])
+        values = np.concatenate([[self.minimum], self.means, [self.maximum]])
+        return np.interp(q * (total - 1), positions, values)
+    
+    def to_dict(self):
+        """Plain-JSON form of the sketch."""
+        return {
+            'means': [float(v) for v in self.means],
+            'weights': [float(v) for v in self.weights],
+            'min': None if np.isnan(self.minimum) else float(self.minimum),
+            'max': None if np.isnan(self.maximum) else float(self.maximum),
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a sketch stored with to_dict()."""
+        return cls(
+            np.array(data['means'], dtype=np.float64),
+            np.array(data['weights'], dtype=np.float64),
+            np.nan if data['min'] is None else data['min'],
+            np.nan if data['max'] is None else data['max'],
+        )
+
+
+ANOMALY_METHODS = ('zscore', 'iqr')
+ANOMALY_SCOPES = ('global', 'type')
+
+
+def anomaly_flag_names(columns=None):
+    """
+    Names of the anomaly flag bits, one per column, method and scope,
+    e.g. 'pressure:zscore:type'. Bit i of a row's flags is name i.
+    """
+    columns = columns or get_numeric_columns()
+    return [
+        f'{col.lower()}:{method}:{scope}'
+        for col in columns for method in ANOMALY_METHODS for scope in ANOMALY_SCOPES
+    ]
+
+
+def _outliers(values, mean, std, q1, q3, z_threshold, iqr_factor):
+    """
+    Z-score and IQR outlier masks of 'values' against the given centers
+    and spreads (scalars or per-row arrays). Also returns |z|, 0 where
+    undefined.
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = np.nan_to_num(np.abs(values - mean) / std, nan=0.0, posinf=0.0)
+    fence = iqr_factor * (q3 - q1)
+    masks = {
+        'zscore': z > z_threshold,
+        'iqr': (values < q1 - fence) | (values > q3 + fence),
+    }
+    return masks, z
+
+
+class DatasetAnalysis:
+    """
+    Whole-dataset analysis computed one chunk at a time: per-type
+    statistics, distributions and the anomaly index.
+    
+    The rows are passed twice. observe() merges moments and quantile
+    sketches per chunk, overall and per equipment type; evaluate() then
+    bins every value and flags outliers against the merged centers and
+    spreads. Memory follows the chunk size and the number of flagged
+    rows, not the size of the dataset. Percentiles and IQR quartiles
+    come from the sketches, which are exact while every value is still
+    its own centroid.
+    """
+    
+    def __init__(self, bins, compression, z_threshold, iqr_factor, top=20):
+        self.columns = get_numeric_columns()
+        self.bins = bins
+        self.compression = compression
+        self.z_threshold = z_threshold
+        self.iqr_factor = iqr_factor
+        self.top = top
+        
+        # First pass: totals overall and per type code
+        self.types = {}
+        self.type_rows = []
+        self.moments = ColumnMoments.empty(len(self.columns))
+        self.type_moments = []
+        self.sketches = [QuantileSketch.empty() for _ in self.columns]
+        self.type_sketches = []
+        
+        # Second pass: bin counts, flagged rows and the top candidates
+        self.offset = 0
+        self.edges = None
+        self.flagged_rows = []
+        self.flagged = []
+        self.top_rows = np.zeros(0, dtype=np.int64)
+        self.top_flags = np.zeros(0, dtype=np.int64)
+        self.top_scores = np.zeros(0)
+    
+    def _codes(self, types):
+        """Type code per row, stable across chunks (-1 without a type)."""
+        codes, names = pd.factorize(types.astype(object))
+        for name in names:
+            key = str(name)
+            if key not in self.types:
+                self.types[key] = len(self.types)
+                self.type_rows.append(0)
+                self.type_moments.append(ColumnMoments.empty(len(self.columns)))
+                self.type_sketches.append([QuantileSketch.empty() for _ in self.columns])
+        
+        mapping = np.array([self.types[str(name)] for name in names] + [-1], dtype=np.int64)
+        return mapping[codes]
+    
+    def _merge_sketches(self, sketches, block):
+        return [
+            sketch.merge(QuantileSketch.from_values(block[:, i], self.compression), self.compression)
+            for i, sketch in enumerate(sketches)
+        ]
+    
+    def observe(self, df):
+        """First pass: fold a chunk into the moments and sketches."""
+        block = numeric_block(df, self.columns)
+        codes = self._codes(df['Type'])
+        
+        self.moments = self.moments.merge(ColumnMoments.from_block(block))
+        self.sketches = self._merge_sketches(self.sketches, block)
+        for code in np.unique(codes[codes >= 0]):
+            rows = codes == code
+            self.type_rows[code] += int(rows.sum())
+            self.type_moments[code] = self.type_moments[code].merge(ColumnMoments.from_block(block[rows]))
+            self.type_sketches[code] = self._merge_sketches(self.type_sketches[code], block[rows])
+    
+    def _prepare(self):
+        """Bin edges, centers and spreads for the second pass."""
+        if self.edges is not None:
+            return
+        
+        self.edges = []
+        for low, high in zip(self.moments.minimum, self.moments.maximum):
+            if np.isnan(low):
+                low, high = 0.0, 1.0
+            elif low == high:
+                low, high = low - 0.5, high + 0.5
+            self.edges.append(np.linspace(low, high, self.bins + 1))
+        self.counts = np.zeros((len(self.columns), self.bins), dtype=np.int64)
+        self.type_counts = np.zeros((len(self.columns), len(self.types), self.bins), dtype=np.int64)
+        
+        def spread(moments, sketches):
+            quartiles = np.array([sketch.quantile([0.25, 0.75]) for sketch in sketches])
+            return np.stack([moments.mean, moments.std(), quartiles[:, 0], quartiles[:, 1]])
+        
+        # (mean, std, q1, q3) x column overall, and per type code with a
+        # trailing NaN row that rows without a type pick up through -1
+        self.overall = spread(self.moments, self.sketches)
+        self.per_type = np.stack([
+            spread(moments, sketches)
+            for moments, sketches in zip(self.type_moments, self.type_sketches)
+        ] + [np.full((4, len(self.columns)), np.nan)])
+    
+    def evaluate(self, df):
+        """Second pass: bin a chunk and flag its outlying readings."""
+        self._prepare()
+        block = numeric_block(df, self.columns)
+        codes = self._codes(df['Type'])
+        typed = codes >= 0
+        
+        flags = np.zeros(len(df), dtype=np.int64)
+        score = np.zeros(len(df))
+        
+        bit = 0
+        for i in range(len(self.columns)):
+            values = block[:, i]
+            present = ~np.isnan(values)
+            
+            # Bin index per value; the top edge belongs to the last bin
+            index = np.clip(np.searchsorted(self.edges[i], values, side='right') - 1, 0, self.bins - 1)
+            self.counts[i] += np.bincount(index[present], minlength=self.bins)
+            counted = present & typed
+            self.type_counts[i] += np.bincount(
+                codes[counted] * self.bins + index[counted], minlength=len(self.types) * self.bins
+            ).reshape(len(self.types), self.bins)
+            
+            global_masks, z = _outliers(values, *self.overall[:, i], self.z_threshold, self.iqr_factor)
+            type_masks, _ = _outliers(values, *self.per_type[codes, :, i].T, self.z_threshold, self.iqr_factor)
+            score = np.maximum(score, z)
+            
+            for method in ANOMALY_METHODS:
+                for masks in (global_masks, type_masks):
+                    flags |= masks[method].astype(np.int64) << bit
+                    bit += 1
+        
+        rows = np.flatnonzero(flags)
+        self.flagged_rows.append(rows + self.offset)
+        self.flagged.append(flags[rows])
+        
+        # Earlier candidates hold lower rows, so ties keep row order
+        candidates = np.concatenate([self.top_rows, rows + self.offset])
+        candidate_flags = np.concatenate([self.top_flags, flags[rows]])
+        scores = np.concatenate([self.top_scores, score[rows]])
+        keep = np.argsort(-scores, kind='stable')[:self.top]
+        self.top_rows, self.top_flags, self.top_scores = candidates[keep], candidate_flags[keep], scores[keep]
+        
+        self.offset += len(df)
+    
+    def type_statistics(self):
+        """
+        Per-type count, mean, min, max, std and percentiles for every
+        numeric column: {type: {'count': rows, '<column>': {...}}},
+        types sorted.
+        """
+        type_stats = {}
+        for key in sorted(self.types):
+            code = self.types[key]
+            moments = self.type_moments[code]
+            std = moments.std()
+            
+            entry = {'count': self.type_rows[code]}
+            for i, col in enumerate(self.columns):
+                if moments.count[i] == 0:
+                    entry[col.lower()] = {
+                        'count': 0, 'mean': 0.0, 'min': 0.0, 'max': 0.0, 'std': 0.0,
+                        **{name: 0.0 for name in TYPE_PERCENTILES},
+                    }
+                    continue
+                
+                percentiles = self.type_sketches[code][i].quantile(list(TYPE_PERCENTILES.values()))
+                entry[col.lower()] = {
+                    'count': int(moments.count[i]),
+                    'mean': float(np.round(moments.mean[i], 2)),
+                    'min': float(np.round(moments.minimum[i], 2)),
+                    'max': float(np.round(moments.maximum[i], 2)),
+                    'std': float(np.round(std[i], 2)),
+                    **{name: float(np.round(v, 2)) for name, v in zip(TYPE_PERCENTILES, percentiles)},
+                }
+            type_stats[key] = entry
+        
+        return type_stats
+    
+    def distributions(self):
+        """
+        Fixed-bin histograms and quantile sketches for every numeric
+        column, overall and per equipment type. Per-type histograms share
+        the overall bin edges.
+        """
+        self._prepare()
+        distributions = {
+            'bins': self.bins,
+            'columns': {},
+            'types': {name: {} for name in sorted(self.types)},
+        }
+        
+        for i, col in enumerate(self.columns):
+            key = col.lower()
+            distributions['columns'][key] = {
+                'edges': [float(v) for v in self.edges[i]],
+                'counts': [int(v) for v in self.counts[i]],
+                'sketch': self.sketches[i].to_dict(),
+            }
+            for name, code in self.types.items():
+                distributions['types'][name][key] = {
+                    'counts': [int(v) for v in self.type_counts[i][code]],
+                    'sketch': self.type_sketches[code][i].to_dict(),
+                }
+        
+        return distributions
+    
+    def anomalies(self, fetch_rows):
+        """
+        The anomaly index: the flagged row positions with one bit field
+        per row (bits as in anomaly_flag_names), counts per flag, and the
+        'top' most extreme rows (by global z-score) for reports.
+        
+        'fetch_rows' is called once with the positions of the top rows
+        and returns a DataFrame of those rows, in that order.
+        """
+        self._prepare()
+        names = anomaly_flag_names(self.columns)
+        rows = np.concatenate(self.flagged_rows) if self.flagged_rows else np.zeros(0, dtype=np.int64)
+        row_flags = np.concatenate(self.flagged) if self.flagged else np.zeros(0, dtype=np.int64)
+        counts = {name: int(((row_flags >> i) & 1).sum()) for i, name in enumerate(names)}
+        
+        top_rows = []
+        frame = fetch_rows(self.top_rows) if len(self.top_rows) else None
+        for position, (row, flags) in enumerate(zip(self.top_rows, self.top_flags)):
+            entry = {'row': int(row), 'flags': [name for i, name in enumerate(names) if flags >> i & 1]}
+            for col in frame.columns:
+                value = frame[col].iat[position]
+                if pd.isna(value):
+                    entry[col] = None
+                else:
+                    entry[col] = float(value) if col in self.columns else str(value)
+            top_rows.append(entry)
+        
+        return {
+            'z_threshold': self.z_threshold,
+            'iqr_factor': self.iqr_factor,
+            'flag_names': names,
+            'counts': counts,
+            'rows': [int(v) for v in rows],
+            'flags': [int(v) for v in row_flags],
+            'top': top_rows,
+        }
+
+
+def detect_anomalies(df, z_threshold, iqr_factor, top=20):
+    """
+    Anomaly index of the rows of a single DataFrame; see
+    DatasetAnalysis.anomalies.
+    """
+    analysis = DatasetAnalysis(
+        settings.HISTOGRAM_BINS, settings.QUANTILE_SKETCH_COMPRESSION, z_threshold, iqr_factor, top=top
+    )
+    analysis.observe(df)
+    analysis.evaluate(df)
+    return analysis.anomalies(lambda rows: df.iloc[rows])
+
+
+class RunningStatistics:
+    """
+    Online accumulator for summary statistics over a stream of chunks.
+    Per-chunk moments are merged with Chan's parallel update, so memory
+    stays constant no matter how many rows are consumed.
+    """
+    
+    def __init__(self):
+        self.columns = get_numeric_columns()
+        self.row_count = 0
+        self.type_counts = {}
+        self.moments = ColumnMoments.empty(len(self.columns))
+        self.type_moments = {}
+    
+    def update(self, df):
+        """Fold a cleaned chunk into the running totals."""
+        self.row_count += len(df)
+        block = numeric_block(df, self.columns)
+        
+        # Rows without a type (code -1) count towards the totals only
+        codes, types = pd.factorize(df['Type'])
+        for code, equip_type in enumerate(types):
+            key = str(equip_type)
+            rows = codes == code
+            self.type_counts[key] = self.type_counts.get(key, 0) + int(rows.sum())
+            
+            moments = ColumnMoments.from_block(block[rows])
+            if key in self.type_moments:
+                moments = self.type_moments[key].merge(moments)
+            self.type_moments[key] = moments
+        
+        self.moments = self.moments.merge(ColumnMoments.from_block(block))
+    
+    @property
+    def equipment_types(self):
+        """Equipment types in order of first appearance."""
+        return list(self.type_counts.keys())
+    
+    def summary(self):
+        """
+        Return the accumulated statistics in the same shape as
+        compute_summary_statistics.
+        """
+        stats = {
+            'total_count': int(self.row_count),
+            'equipment_types': dict(
+                sorted(self.type_counts.items(), key=lambda item: item[1], reverse=True)
+            ),
+        }
+        stats.update(self.moments.as_stats(self.columns))
+        
+        return stats
+    
+    def aggregates(self):
+        """
+        Return the mergeable partial aggregates (moments overall and per
+        type) as plain JSON, so statistics across datasets can later be
+        combined without reading any rows.
+        """
+        return {
+            'columns': list(self.columns),
+            'rows': int(self.row_count),
+            'moments': self.moments.to_dict(),
+            'types': {
+                key: {'rows': self.type_counts[key], 'moments': moments.to_dict()}
+                for key, moments in self.type_moments.items()
+            },
+        }
+
+
+def combine_aggregates(aggregates_list):
+    """
+    Merge stored partial aggregates of several datasets into one set,
+    as if the rows of all of them had been summarized together.
+    """
+    columns = get_numeric_columns()
+    combined = {'columns': columns, 'rows': 0, 'moments': ColumnMoments.empty(len(columns)), 'types': {}}
+    
+    for aggregates in aggregates_list:
+        # Align stored columns with the current schema order
+        index = [aggregates['columns'].index(col) for col in columns]
+        
+        combined['rows'] += aggregates['rows']
+        combined['moments'] = combined['moments'].merge(
+            ColumnMoments.from_dict(aggregates['moments']).select(index)
+        )
+        for key, entry in aggregates['types'].items():
+            rows, moments = combined['types'].get(key, (0, ColumnMoments.empty(len(columns))))
+            combined['types'][key] = (
+                rows + entry['rows'],
+                moments.merge(ColumnMoments.from_dict(entry['moments']).select(index)),
+            )
+    
+    return {
+        'columns': columns,
+        'rows': combined['rows'],
+        'moments': combined['moments'].to_dict(),
+        'types': {
+            key: {'rows': rows, 'moments': moments.to_dict()}
+            for key, (rows, moments) in combined['types'].items()
+        },
+    }
+
+
+def aggregates_to_stats(aggregates):
+    """
+    Format partial aggregates as (summary_stats, type_stats), in the
+    shapes of compute_summary_statistics and the per-type statistics of
+    the aggregates endpoint.
+    """
+    columns = aggregates['columns']
+    types = sorted(aggregates['types'].items(), key=lambda item: item[1]['rows'], reverse=True)
+    
+    summary = {
+        'total_count': aggregates['rows'],
+        'equipment_types': {key: entry['rows'] for key, entry in types},
+    }
+    summary.update(ColumnMoments.from_dict(aggregates['moments']).as_stats(columns))
+    
+    type_stats = {}
+    for key, entry in sorted(aggregates['types'].items()):
+        type_stats[key] = {'count': entry['rows']}
+        type_stats[key].update(ColumnMoments.from_dict(entry['moments']).as_stats(columns))
+    
+    return summary, type_stats
+
+
 def dataframe_to_dict(df):
     """
     Convert DataFrame to list of dictionaries for JSON storage.
-    Converts all numpy types to native Python types for JSON compatibility.
-    """
-    # Replace NaN with None for JSON compatibility
-    df_clean = df.where(pd.notnull(df), None)
-    records = df_clean.to_dict(orient='records')
-    
-    # Convert numpy types to native Python types
-    cleaned_records = []
-    for record in records:
-        cleaned_record = {}
-        for key, value in record.items():
-            if pd.isna(value) or value is None:
-                cleaned_record[key] = None
-            elif isinstance(value, (np.integer, np.int64, np.int32)):
-                cleaned_record[key] = int(value)
-            elif isinstance(value, (np.floating, np.float64, np.float32)):
-                cleaned_record[key] = float(value)
-            else:
-                cleaned_record[key] = value
-        cleaned_records.append(cleaned_record)
-    
-    return cleaned_records
+    Each column is converted to native Python values in bulk with
+    Series.tolist(), and missing values are replaced with None, so no
+    per-cell type checks are needed.
+    """
+    keys = list(df.columns)
+    if not keys:
+        return [{} for _ in range(len(df))]
+    
+    columns = []
+    for i in range(len(keys)):
+        series = df.iloc[:, i]
+        values = series.tolist()
+        
+        # Replace NaN with None for JSON compatibility
+        missing = series.isna().to_numpy()
+        if missing.any():
+            for idx in np.flatnonzero(missing):
+                values[idx] = None
+        
+        columns.append(values)
+    
+    return [dict(zip(keys, row)) for row in zip(*columns)]
 
 
-def generate_pdf_report(dataset):
+# Header colors of the per-column statistics tables in the PDF report
+REPORT_COLUMN_COLORS = {
+    'Flowrate': '#10b981',
+    'Pressure': '#f59e0b',
+    'Temperature': '#ef4444',
+}
+REPORT_DEFAULT_COLOR = '#6b7280'
+
+
+@functools.lru_cache(maxsize=None)
+def get_report_styles():
     """
-    Generate a PDF report for the given dataset.
-    Returns BytesIO buffer containing the PDF.
+    Build the paragraph and table styles of the PDF report.
+    Styles are created once per process and reused for every report.
+    """
+    styles = getSampleStyleSheet()
+    
+    def header_table_style(color, extra=()):
+        return TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(color)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            *extra,
+        ])
+    
+    return {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor('#1f2937'),
+            spaceAfter=30,
+            alignment=TA_CENTER,
+        ),
+        'heading': ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=16,
+            textColor=colors.HexColor('#374151'),
+            spaceAfter=12,
+            spaceBefore=12,
+        ),
+        'info_table': header_table_style('#3b82f6', [
+            ('FONTSIZE', (0, 0), (-1, 0), 14),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ]),
+        'column_tables': {
+            col: header_table_style(color) for col, color in REPORT_COLUMN_COLORS.items()
+        },
+        'default_column_table': header_table_style(REPORT_DEFAULT_COLOR),
+        'type_table': header_table_style('#8b5cf6', [
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+        ]),
+        'type_column_tables': {
+            col: header_table_style(color, [('FONTSIZE', (0, 0), (-1, -1), 8)])
+            for col, color in REPORT_COLUMN_COLORS.items()
+        },
+        'default_type_column_table': header_table_style(REPORT_DEFAULT_COLOR, [
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ]),
+        'anomaly_table': header_table_style('#dc2626', [
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.mistyrose]),
+        ]),
+    }
+
+
+def build_report_context(dataset):
+    """
+    Collect everything the PDF report needs from a dataset as plain,
+    picklable data, so rendering can happen in another process.
+    """
+    return {
+        'filename': dataset.filename,
+        'uploaded_at': dataset.uploaded_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'row_count': dataset.row_count,
+        'summary_stats': dataset.summary_stats,
+        'type_stats': dataset.type_stats,
+        'anomalies': {
+            key: dataset.anomalies[key]
+            for key in ('z_threshold', 'iqr_factor', 'counts', 'top')
+        } if dataset.anomalies else {},
+        'numeric_columns': get_numeric_columns(),
+    }
+
+
+def render_pdf_report(context):
+    """
+    Render the PDF report for a context built by build_report_context.
+    Returns the PDF as bytes.
     """
     buffer = io.BytesIO()
+    styles = get_report_styles()
     
     # Create PDF document
     doc = SimpleDocTemplate(buffer, pagesize=letter,
@@ -133,125 +920,55 @@ def generate_pdf_report(dataset):
     # Container for the 'Flowable' objects
     elements = []
     
-    # Define styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#1f2937'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=colors.HexColor('#374151'),
-        spaceAfter=12,
-        spaceBefore=12,
-    )
-    
     # Title
-    title = Paragraph("Chemical Equipment Parameter Report", title_style)
+    title = Paragraph("Chemical Equipment Parameter Report", styles['title'])
     elements.append(title)
     elements.append(Spacer(1, 12))
     
     # Dataset Info
     info_data = [
         ['Dataset Information', ''],
-        ['Filename:', dataset.filename],
-        ['Upload Date:', dataset.uploaded_at.strftime('%Y-%m-%d %H:%M:%S')],
-        ['Total Records:', str(dataset.row_count)],
+        ['Filename:', context['filename']],
+        ['Upload Date:', context['uploaded_at']],
+        ['Total Records:', str(context['row_count'])],
     ]
     
     info_table = Table(info_data, colWidths=[2*inch, 4*inch])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (1, 0), colors.HexColor('#3b82f6')),
-        ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
+    info_table.setStyle(styles['info_table'])
     
     elements.append(info_table)
     elements.append(Spacer(1, 20))
     
     # Summary Statistics
-    elements.append(Paragraph("Summary Statistics", heading_style))
+    elements.append(Paragraph("Summary Statistics", styles['heading']))
     elements.append(Spacer(1, 12))
     
-    stats = dataset.summary_stats
-    
-    # Flowrate Stats
-    flowrate_data = [
-        ['Flowrate Statistics', ''],
-        ['Mean:', f"{stats['flowrate']['mean']}"],
-        ['Min:', f"{stats['flowrate']['min']}"],
-        ['Max:', f"{stats['flowrate']['max']}"],
-        ['Std Dev:', f"{stats['flowrate']['std']}"],
-    ]
+    stats = context['summary_stats']
     
-    flowrate_table = Table(flowrate_data, colWidths=[2*inch, 2*inch])
-    flowrate_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (1, 0), colors.HexColor('#10b981')),
-        ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    
-    elements.append(flowrate_table)
-    elements.append(Spacer(1, 12))
-    
-    # Pressure Stats
-    pressure_data = [
-        ['Pressure Statistics', ''],
-        ['Mean:', f"{stats['pressure']['mean']}"],
-        ['Min:', f"{stats['pressure']['min']}"],
-        ['Max:', f"{stats['pressure']['max']}"],
-        ['Std Dev:', f"{stats['pressure']['std']}"],
-    ]
-    
-    pressure_table = Table(pressure_data, colWidths=[2*inch, 2*inch])
-    pressure_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (1, 0), colors.HexColor('#f59e0b')),
-        ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    
-    elements.append(pressure_table)
-    elements.append(Spacer(1, 12))
-    
-    # Temperature Stats
-    temp_data = [
-        ['Temperature Statistics', ''],
-        ['Mean:', f"{stats['temperature']['mean']}"],
-        ['Min:', f"{stats['temperature']['min']}"],
-        ['Max:', f"{stats['temperature']['max']}"],
-        ['Std Dev:', f"{stats['temperature']['std']}"],
-    ]
-    
-    temp_table = Table(temp_data, colWidths=[2*inch, 2*inch])
-    temp_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (1, 0), colors.HexColor('#ef4444')),
-        ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
+    # One table per numeric column
+    for col in context['numeric_columns']:
+        col_stats = stats.get(col.lower())
+        if col_stats is None:
+            continue
+        
+        col_data = [
+            [f'{col} Statistics', ''],
+            ['Mean:', f"{col_stats['mean']}"],
+            ['Min:', f"{col_stats['min']}"],
+            ['Max:', f"{col_stats['max']}"],
+            ['Std Dev:', f"{col_stats['std']}"],
+        ]
+        
+        col_table = Table(col_data, colWidths=[2*inch, 2*inch])
+        col_table.setStyle(styles['column_tables'].get(col, styles['default_column_table']))
+        
+        elements.append(col_table)
+        elements.append(Spacer(1, 12))
     
-    elements.append(temp_table)
-    elements.append(Spacer(1, 20))
+    elements.append(Spacer(1, 8))
     
     # Equipment Type Distribution
-    elements.append(Paragraph("Equipment Type Distribution", heading_style))
+    elements.append(Paragraph("Equipment Type Distribution", styles['heading']))
     elements.append(Spacer(1, 12))
     
     type_data = [['Equipment Type', 'Count']]
@@ -259,17 +976,72 @@ def generate_pdf_report(dataset):
         type_data.append([str(equip_type), str(count)])
     
     type_table = Table(type_data, colWidths=[3*inch, 2*inch])
-    type_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (1, 0), colors.HexColor('#8b5cf6')),
-        ('TEXTCOLOR', (0, 0), (1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-    ]))
+    type_table.setStyle(styles['type_table'])
     
     elements.append(type_table)
     
+    # Statistics by Equipment Type, one table per numeric column
+    type_stats = context.get('type_stats') or {}
+    if type_stats:
+        elements.append(Spacer(1, 20))
+        elements.append(Paragraph("Statistics by Equipment Type", styles['heading']))
+        elements.append(Spacer(1, 12))
+        
+        for col in context['numeric_columns']:
+            rows = [[f'{col} by Type', 'Count', 'Mean', 'Min', 'P25', 'Median', 'P75', 'Max', 'Std']]
+            for equip_type, entry in type_stats.items():
+                col_stats = entry.get(col.lower())
+                if col_stats is None:
+                    continue
+                rows.append([str(equip_type), str(col_stats['count'])] + [
+                    f"{col_stats[metric]}"
+                    for metric in ('mean', 'min', 'p25', 'median', 'p75', 'max', 'std')
+                ])
+            
+            col_table = Table(rows, colWidths=[1.5*inch] + [0.62*inch] * 8)
+            col_table.setStyle(styles['type_column_tables'].get(col, styles['default_type_column_table']))
+            
+            elements.append(col_table)
+            elements.append(Spacer(1, 12))
+    
+    # Anomalies: flag counts and the most extreme flagged readings
+    anomalies = context.get('anomalies') or {}
+    if anomalies:
+        elements.append(Spacer(1, 20))
+        elements.append(Paragraph("Anomalies", styles['heading']))
+        elements.append(Spacer(1, 12))
+        
+        counts = anomalies['counts']
+        count_data = [['Column', 'Method', 'Whole Dataset', 'Within Type']]
+        for col in context['numeric_columns']:
+            for method, label in (('zscore', f"|z| > {anomalies['z_threshold']}"),
+                                  ('iqr', f"{anomalies['iqr_factor']} x IQR")):
+                count_data.append([
+                    col, label,
+                    str(counts.get(f'{col.lower()}:{method}:global', 0)),
+                    str(counts.get(f'{col.lower()}:{method}:type', 0)),
+                ])
+        
+        count_table = Table(count_data, colWidths=[1.5*inch, 1.5*inch, 1.25*inch, 1.25*inch])
+        count_table.setStyle(styles['anomaly_table'])
+        elements.append(count_table)
+        
+        if anomalies['top']:
+            elements.append(Spacer(1, 12))
+            top_data = [['Equipment', 'Type'] + context['numeric_columns'] + ['Flagged']]
+            for entry in anomalies['top']:
+                flagged = sorted({flag.split(':')[0] for flag in entry['flags']})
+                top_data.append(
+                    [str(entry.get('Equipment Name') or ''), str(entry.get('Type') or '')]
+                    + ['' if entry.get(col) is None else f"{entry[col]}" for col in context['numeric_columns']]
+                    + [', '.join(flagged)]
+                )
+            
+            widths = [1.5*inch, 1.1*inch] + [0.8*inch] * len(context['numeric_columns']) + [1.4*inch]
+            top_table = Table(top_data, colWidths=widths, repeatRows=1)
+            top_table.setStyle(styles['anomaly_table'])
+            elements.append(top_table)
+    
     # Build PDF
     doc.build(elements)
     
@@ -278,3 +1050,11 @@ def generate_pdf_report(dataset):
     buffer.close()
     
     return pdf
+
+
+def generate_pdf_report(dataset):
+    """
+    Generate a PDF report for the given dataset.
+    Returns the PDF as bytes.
+    """
+    return render_pdf_report(build_report_context(dataset))
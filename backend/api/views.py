@@ -1,20 +1,111 @@
+import hashlib
+import itertools
+import numpy as np
 from rest_framework import status, viewsets
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.authtoken.models import Token
+from django.conf import settings
+from django.core.cache import cache
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.http import HttpResponse
-from .models import EquipmentDataset
+from django.db import transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from .models import EquipmentDataset, RetentionPolicy, UploadJob
 from .serializers import (
     EquipmentDatasetSerializer,
+    DatasetMetadataSerializer,
     DatasetSummarySerializer,
     CSVUploadSerializer,
+    UploadJobSerializer,
     UserSerializer,
     UserRegistrationSerializer
 )
-from .utils import parse_csv_file, compute_summary_statistics, dataframe_to_dict, generate_pdf_report
+from .jobs import enqueue_upload_job
+from .processing import process_csv_upload
+from .uploadhandlers import get_upload_hash
+from .downsampling import downsample, DOWNSAMPLERS
+from .indexes import get_batch_offsets, get_name_index, get_row_index
+from .utils import (
+    aggregates_to_stats,
+    anomaly_flag_names,
+    combine_aggregates,
+    get_numeric_columns,
+    QuantileSketch,
+)
+from .renderers import ArrowStreamRenderer, MessagePackRenderer, ORJSONRenderer
+from .reports import (
+    get_report_path,
+    iter_report_results,
+    stream_reports_zip,
+    ReportRenderBusy,
+    REPORT_TEMPLATE_VERSION,
+)
+
+
+def _query_flag(request, name, default=True):
+    """Read a boolean query parameter such as ?include_rows=false."""
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    return value.lower() not in ('0', 'false', 'no', 'off')
+
+
+def _query_int(request, name, default, minimum=0, maximum=None):
+    """Read a bounded integer query parameter, raising ValueError if invalid."""
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an integer")
+    if value < minimum:
+        raise ValueError(f"'{name}' must be at least {minimum}")
+    if maximum is not None:
+        value = min(value, maximum)
+    return value
+
+
+def _query_float(request, name):
+    """Read an optional numeric query parameter, raising ValueError if invalid."""
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be a number")
+    if np.isnan(value):
+        raise ValueError(f"'{name}' must be a number")
+    return value
+
+
+def _query_ids(request, maximum):
+    """Read ?ids=1,2,3 as unique dataset ids, raising ValueError if invalid."""
+    value = request.query_params.get('ids', '')
+    try:
+        ids = list(dict.fromkeys(int(i) for i in value.split(',') if i.strip()))
+    except ValueError:
+        raise ValueError("'ids' must be comma-separated integers")
+    if not ids:
+        raise ValueError("Provide dataset 'ids', e.g. ?ids=1,2")
+    if len(ids) > maximum:
+        raise ValueError(f'At most {maximum} datasets can be compared at once')
+    return ids
+
+
+def _replace_query(request, **params):
+    """Return the request's query string with the given parameters replaced."""
+    query = request.query_params.copy()
+    for key, value in params.items():
+        query[key] = value
+    return query.urlencode()
 
 
 @api_view(['POST'])
@@ -89,20 +180,141 @@ class EquipmentDatasetViewSet(viewsets.ModelViewSet):
     serializer_class = EquipmentDatasetSerializer
     permission_classes = [IsAuthenticated]
     
+    # Columns loaded per action (others load the full row). raw_data is
+    # never listed: legacy datasets without a row file load it on access
+    action_fields = {
+        'list': ['id', 'filename', 'uploaded_at', 'row_count'],
+        'retrieve': ['id', 'user', 'filename', 'uploaded_at', 'rows_file', 'summary_stats',
+                     'type_stats', 'row_count', 'equipment_types'],
+        'rows': ['id', 'uploaded_at', 'rows_file', 'row_count'],
+        'summary': ['id', 'filename', 'uploaded_at', 'row_count', 'summary_stats', 'type_stats'],
+        'pdf': ['id', 'filename', 'uploaded_at', 'row_count', 'summary_stats', 'type_stats', 'anomalies'],
+        'export': ['id', 'filename', 'uploaded_at', 'row_count', 'summary_stats', 'type_stats', 'anomalies'],
+        'aggregates': ['id'],
+        'compare': ['id', 'filename', 'uploaded_at', 'row_count', 'rows_file', 'aggregates'],
+        'distributions': ['id', 'uploaded_at', 'distributions'],
+        'series': ['id', 'uploaded_at', 'rows_file', 'row_count'],
+        'anomalies': ['id', 'uploaded_at', 'rows_file', 'row_count', 'anomalies'],
+        'query': ['id', 'uploaded_at', 'rows_file', 'row_count'],
+        'search': ['id', 'uploaded_at', 'rows_file', 'row_count'],
+    }
+    
+    # Columnar binary formats offered for row data, chosen by Accept header
+    binary_renderer_classes = [ArrowStreamRenderer, MessagePackRenderer]
+    binary_actions = ('retrieve', 'rows', 'query')
+    
+    # Whole-dataset payloads whose compressed bodies are stored on disk,
+    # when requested with at most these query parameters; other queries
+    # would add a stored file per distinct query string
+    compression_cached_actions = ('retrieve', 'rows')
+    compression_cached_params = {'include_rows'}
+    
+    def get_renderers(self):
+        """Offer the binary row formats on the row endpoints only"""
+        renderers = super().get_renderers()
+        if self.action in self.binary_actions:
+            renderers += [renderer() for renderer in self.binary_renderer_classes]
+        return renderers
+    
+    def _binary_requested(self):
+        """Whether content negotiation picked a columnar binary format"""
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        return isinstance(renderer, tuple(self.binary_renderer_classes))
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Render errors as JSON even when a binary format was negotiated"""
+        if isinstance(response, Response) and response.status_code >= 400 and self._binary_requested():
+            renderer = self.get_renderers()[0]
+            request.accepted_renderer = renderer
+            request.accepted_media_type = renderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+    
     def get_queryset(self):
         """Return only datasets belonging to the current user"""
-        return EquipmentDataset.objects.filter(user=self.request.user)
+        queryset = EquipmentDataset.objects.filter(user=self.request.user)
+        
+        fields = self.action_fields.get(self.action)
+        if fields:
+            queryset = queryset.only(*fields)
+        return queryset
+    
+    def _validators(self, dataset_id, uploaded_at):
+        """
+        Strong ETag and Last-Modified for the current representation of a
+        dataset. Datasets never change after upload, so the id and upload
+        time identify the content; the action, query string and Accept
+        header identify the representation.
+        """
+        query = sorted(self.request.query_params.lists())
+        variant = f"{self.action}|{query}|{self.request.META.get('HTTP_ACCEPT', '')}"
+        if self.action == 'pdf':
+            variant += f'|report-v{REPORT_TEMPLATE_VERSION}'
+        digest = hashlib.sha256(variant.encode()).hexdigest()[:16]
+        
+        etag = quote_etag(f'{dataset_id}-{int(uploaded_at.timestamp() * 1000000)}-{digest}')
+        return etag, int(uploaded_at.timestamp())
+    
+    def _add_validators(self, response, dataset_id, uploaded_at):
+        """Attach ETag/Last-Modified and ask clients to revalidate."""
+        etag, last_modified = self._validators(dataset_id, uploaded_at)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        # Immutable payload: let CompressionMiddleware reuse compressed
+        # copies. Bodies may hold absolute 'next' links, so the host is
+        # part of the key.
+        if (self.action in self.compression_cached_actions
+                and set(self.request.query_params) <= self.compression_cached_params):
+            response.compression_cache = (dataset_id, f'{self.request.get_host()}|{etag}')
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        return response
+    
+    def _not_modified(self, dataset_id, uploaded_at):
+        """Return a 304 response if the client's copy is current, else None."""
+        etag, last_modified = self._validators(dataset_id, uploaded_at)
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            self._add_validators(response, dataset_id, uploaded_at)
+        return response
+    
+    def _precheck_not_modified(self, pk):
+        """
+        Answer conditional requests before loading the dataset, looking
+        up only its upload time. Returns a 304 response or None.
+        """
+        meta = self.request.META
+        if 'HTTP_IF_NONE_MATCH' not in meta and 'HTTP_IF_MODIFIED_SINCE' not in meta:
+            return None
+        
+        try:
+            uploaded_at = (
+                EquipmentDataset.objects.filter(user=self.request.user, pk=pk)
+                .values_list('uploaded_at', flat=True)
+                .first()
+            )
+        except (TypeError, ValueError):
+            return None
+        if uploaded_at is None:
+            return None
+        return self._not_modified(pk, uploaded_at)
     
     def get_serializer_class(self):
-        """Use lightweight serializer for list action"""
+        """
+        Use lightweight serializer for list action, and leave out the rows
+        on retrieve when ?include_rows=false is given
+        """
         if self.action == 'list':
             return DatasetSummarySerializer
+        if self.action == 'retrieve' and not _query_flag(self.request, 'include_rows'):
+            return DatasetMetadataSerializer
         return EquipmentDatasetSerializer
     
     @action(detail=False, methods=['post'], serializer_class=CSVUploadSerializer)
     def upload(self, request):
         """
         Upload and process CSV file.
+        With ?async=true the file is stored and processed by a background
+        worker; the response is 202 with a job to poll at /api/jobs/{id}/.
         POST /api/datasets/upload/
         """
         serializer = CSVUploadSerializer(data=request.data)
@@ -111,32 +323,26 @@ class EquipmentDatasetViewSet(viewsets.ModelViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         csv_file = serializer.validated_data['file']
+        content_hash = get_upload_hash(request, 'file', csv_file)
         
-        try:
-            # Parse CSV with pandas
-            df = parse_csv_file(csv_file)
-            
-            # Compute summary statistics
-            summary_stats = compute_summary_statistics(df)
-            
-            # Convert DataFrame to dict for JSON storage
-            raw_data = dataframe_to_dict(df)
-            
-            # Get equipment types list
-            equipment_types = df['Type'].unique().tolist()
-            
-            # Create dataset record
-            dataset = EquipmentDataset.objects.create(
+        if _query_flag(request, 'async', default=settings.UPLOAD_ASYNC):
+            job = UploadJob.objects.create(
                 user=request.user,
                 filename=csv_file.name,
-                raw_data=raw_data,
-                summary_stats=summary_stats,
-                row_count=len(df),
-                equipment_types=equipment_types
+                file=csv_file,
+                content_hash=content_hash
             )
+            transaction.on_commit(lambda: enqueue_upload_job(job))
+            return Response({
+                'message': 'CSV upload queued for processing',
+                'job': UploadJobSerializer(job).data
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        try:
+            dataset = process_csv_upload(csv_file, request.user, csv_file.name, content_hash)
             
             # Serialize and return
-            response_serializer = EquipmentDatasetSerializer(dataset)
+            response_serializer = EquipmentDatasetSerializer(dataset, context=self.get_serializer_context())
             return Response({
                 'message': 'CSV uploaded and processed successfully',
                 'dataset': response_serializer.data
@@ -151,19 +357,470 @@ class EquipmentDatasetViewSet(viewsets.ModelViewSet):
                 'error': f'An error occurred while processing the file: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Get a dataset with its rows; supports conditional GET.
+        GET /api/datasets/{id}/
+        """
+        not_modified = self._precheck_not_modified(kwargs.get('pk'))
+        if not_modified is not None:
+            return not_modified
+        
+        dataset = self.get_object()
+        if self._binary_requested():
+            # Columnar formats carry just the rows, for charting clients
+            response = Response(dataset.load_table(), headers={'X-Total-Count': str(dataset.row_count)})
+        elif (isinstance(request.accepted_renderer, ORJSONRenderer)
+                and self.get_serializer_class() is EquipmentDatasetSerializer):
+            response = StreamingHttpResponse(self._stream_detail(dataset), content_type='application/json')
+        else:
+            response = Response(self.get_serializer(dataset).data)
+        return self._add_validators(response, dataset.id, dataset.uploaded_at)
+    
+    def _stream_detail(self, dataset):
+        """
+        Yield the JSON detail of a dataset with its rows streamed from the
+        stored JSON copy, so the row list is never held in memory.
+        """
+        data = DatasetMetadataSerializer(dataset, context=self.get_serializer_context()).data
+        head = ORJSONRenderer().render(data)
+        return itertools.chain([head[:-1] + b',"raw_data":'], dataset.iter_rows_json(), [b'}'])
+    
     @action(detail=True, methods=['get'])
     def summary(self, request, pk=None):
         """
-        Get summary statistics for a specific dataset.
+        Get summary and per-type statistics for a specific dataset.
         GET /api/datasets/{id}/summary/
         """
         dataset = self.get_object()
-        return Response({
+        not_modified = self._not_modified(dataset.id, dataset.uploaded_at)
+        if not_modified is not None:
+            return not_modified
+        
+        response = Response({
             'id': dataset.id,
             'filename': dataset.filename,
             'uploaded_at': dataset.uploaded_at,
             'row_count': dataset.row_count,
-            'summary_stats': dataset.summary_stats
+            'summary_stats': dataset.summary_stats,
+            'type_stats': dataset.type_stats,
+        })
+        return self._add_validators(response, dataset.id, dataset.uploaded_at)
+    
+    @action(detail=True, methods=['get'])
+    def rows(self, request, pk=None):
+        """
+        Page through dataset rows, optionally projecting columns.
+        Query params: offset, limit, fields (comma-separated column names).
+        GET /api/datasets/{id}/rows/?offset=0&limit=500&fields=Type,Pressure
+        """
+        not_modified = self._precheck_not_modified(pk)
+        if not_modified is not None:
+            return not_modified
+        
+        dataset = self.get_object()
+        
+        try:
+            offset = _query_int(request, 'offset', 0)
+            limit = _query_int(request, 'limit', settings.ROWS_PAGE_SIZE,
+                               minimum=1, maximum=settings.ROWS_PAGE_MAX)
+            fields = request.query_params.get('fields')
+            columns = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+            if self._binary_requested():
+                results = dataset.load_table(columns, offset, limit)
+            else:
+                results = dataset.load_rows(columns, offset, limit)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        next_url = None
+        if offset + len(results) < dataset.row_count:
+            next_url = request.build_absolute_uri(
+                f"{request.path}?{_replace_query(request, offset=offset + limit)}"
+            )
+        
+        if self._binary_requested():
+            # Paging metadata travels in headers next to the binary body
+            response = Response(results, headers={'X-Total-Count': str(dataset.row_count)})
+            if next_url:
+                response['Link'] = f'<{next_url}>; rel="next"'
+            return self._add_validators(response, dataset.id, dataset.uploaded_at)
+        
+        response = Response({
+            'count': dataset.row_count,
+            'offset': offset,
+            'limit': limit,
+            'next': next_url,
+            'results': results,
+        })
+        return self._add_validators(response, dataset.id, dataset.uploaded_at)
+    
+    @action(detail=True, methods=['get'])
+    def query(self, request, pk=None):
+        """
+        Rows matching a type and numeric ranges, optionally sorted, served
+        from an in-memory index of the dataset instead of a full scan.
+        Query params: type, <column>_min / <column>_max (inclusive, e.g.
+        pressure_min), sort (column name, '-' prefix for descending),
+        offset, limit and fields as for the rows endpoint.
+        GET /api/datasets/{id}/query/?type=Heat Exchanger&pressure_min=6&sort=-Pressure
+        """
+        not_modified = self._precheck_not_modified(pk)
+        if not_modified is not None:
+            return not_modified
+        
+        dataset = self.get_object()
+        
+        columns = {col.lower(): col for col in get_numeric_columns()}
+        try:
+            ranges = {}
+            for key, column in columns.items():
+                low = _query_float(request, f'{key}_min')
+                high = _query_float(request, f'{key}_max')
+                if low is not None or high is not None:
+                    ranges[column] = (low, high)
+            
+            sort = request.query_params.get('sort')
+            descending = bool(sort) and sort.startswith('-')
+            if sort:
+                sort = columns.get(sort.lstrip('-').lower())
+                if sort is None:
+                    raise ValueError(f"'sort' must be one of: {', '.join(columns.values())}")
+            
+            offset = _query_int(request, 'offset', 0)
+            limit = _query_int(request, 'limit', settings.ROWS_PAGE_SIZE,
+                               minimum=1, maximum=settings.ROWS_PAGE_MAX)
+            fields = request.query_params.get('fields')
+            fields = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+            
+            total, rows = get_row_index(dataset).query(
+                request.query_params.get('type'), ranges, sort, descending, offset, limit
+            )
+            # Read only the record batches holding the page's rows
+            if len(rows):
+                table = dataset.take_table(rows, fields, get_batch_offsets(dataset))
+            else:
+                table = dataset.load_table(fields, 0, 0)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        next_url = None
+        if offset + len(rows) < total:
+            next_url = request.build_absolute_uri(
+                f"{request.path}?{_replace_query(request, offset=offset + limit)}"
+            )
+        
+        if self._binary_requested():
+            # Paging metadata travels in headers next to the binary body
+            response = Response(table, headers={'X-Total-Count': str(total)})
+            if next_url:
+                response['Link'] = f'<{next_url}>; rel="next"'
+            return self._add_validators(response, dataset.id, dataset.uploaded_at)
+        
+        response = Response({
+            'count': total,
+            'offset': offset,
+            'limit': limit,
+            'next': next_url,
+            'results': table.to_pylist(),
+        })
+        return self._add_validators(response, dataset.id, dataset.uploaded_at)
+    
+    @action(detail=True, methods=['get'])
+    def search(self, request, pk=None):
+        """
+        Equipment names matching 'q' by prefix (default) or substring,
+        case-insensitively and in name order, for type-ahead lookups.
+        Served from a cached per-dataset name index. Optional ?type=
+        restricts matches to one equipment type.
+        GET /api/datasets/{id}/search/?q=PUMP-3A&mode=prefix&limit=20
+        """
+        not_modified = self._precheck_not_modified(pk)
+        if not_modified is not None:
+            return not_modified
+        
+        dataset = self.get_object()
+        
+        text = request.query_params.get('q', '').strip()
+        mode = request.query_params.get('mode', 'prefix')
+        try:
+            if not text:
+                raise ValueError("Provide a search text, e.g. ?q=PUMP-3A")
+            if mode not in ('prefix', 'substring'):
+                raise ValueError("'mode' must be one of: prefix, substring")
+            limit = _query_int(request, 'limit', settings.SEARCH_RESULTS_DEFAULT,
+                               minimum=1, maximum=settings.SEARCH_RESULTS_MAX)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        index = get_name_index(dataset)
+        total, rows = index.search(text, mode, request.query_params.get('type'), limit)
+        
+        response = Response({
+            'id': dataset.id,
+            'q': text,
+            'mode': mode,
+            'count': total,
+            'results': [
+                {'row': int(row), 'name': index.names[row], 'type': index.types[row]}
+                for row in rows
+            ],
+        })
+        return self._add_validators(response, dataset.id, dataset.uploaded_at)
+    
+    @action(detail=True, methods=['get'])
+    def aggregates(self, request, pk=None):
+        """
+        Compute summary and per-type statistics in the database.
+        Optional ?type= restricts the readings to one equipment type.
+        GET /api/datasets/{id}/aggregates/
+        """
+        dataset = self.get_object()
+        readings = dataset.readings.all()
+        
+        equipment_type = request.query_params.get('type')
+        if equipment_type:
+            readings = readings.filter(type=equipment_type)
+        
+        return Response({
+            'id': dataset.id,
+            'summary_stats': readings.summary_statistics(),
+            'type_stats': readings.type_statistics(),
+        })
+    
+    @action(detail=True, methods=['get'])
+    def anomalies(self, request, pk=None):
+        """
+        Rows flagged as outliers at upload, from the stored anomaly index.
+        Optional filters: column (e.g. pressure), method (zscore, iqr),
+        scope (global, type) and type (equipment type); paged with
+        offset/limit like the rows endpoint.
+        GET /api/datasets/{id}/anomalies/?column=pressure&method=iqr
+        """
+        dataset = self.get_object()
+        not_modified = self._not_modified(dataset.id, dataset.uploaded_at)
+        if not_modified is not None:
+            return not_modified
+        
+        index = dataset.anomalies or {'flag_names': anomaly_flag_names(), 'counts': {}, 'rows': [], 'flags': []}
+        names = index['flag_names']
+        
+        # Select the flag bits matching the filters
+        filters = [
+            request.query_params.get('column', '').lower(),
+            request.query_params.get('method', ''),
+            request.query_params.get('scope', ''),
+        ]
+        mask = 0
+        for bit, name in enumerate(names):
+            if all(not wanted or part == wanted for part, wanted in zip(name.split(':'), filters)):
+                mask |= 1 << bit
+        
+        try:
+            if not mask:
+                raise ValueError(f"No anomaly flags match; flags are: {', '.join(names)}")
+            offset = _query_int(request, 'offset', 0)
+            limit = _query_int(request, 'limit', settings.ROWS_PAGE_SIZE,
+                               minimum=1, maximum=settings.ROWS_PAGE_MAX)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        rows = np.array(index['rows'], dtype=np.int64)
+        flags = np.array(index['flags'], dtype=np.int64)
+        selected = (flags & mask) != 0
+        rows, flags = rows[selected], flags[selected]
+        
+        # Narrow by type with the cached query index, and read only the
+        # record batches holding the page's rows
+        equipment_type = request.query_params.get('type')
+        if equipment_type and len(rows):
+            type_bitmaps = get_row_index(dataset).type_bitmaps
+            selected = type_bitmaps.get(equipment_type, np.zeros(dataset.row_count, dtype=bool))[rows]
+            rows, flags = rows[selected], flags[selected]
+        
+        page = slice(offset, offset + limit)
+        results = []
+        if len(rows[page]):
+            records = dataset.take_table(rows[page], offsets=get_batch_offsets(dataset)).to_pylist()
+            for row, row_flags, record in zip(rows[page], flags[page], records):
+                results.append({
+                    'row': int(row),
+                    'flags': [name for bit, name in enumerate(names) if row_flags >> bit & 1],
+                    'data': record,
+                })
+        
+        response = Response({
+            'id': dataset.id,
+            'counts': index['counts'],
+            'count': len(rows),
+            'offset': offset,
+            'limit': limit,
+            'results': results,
+        })
+        return self._add_validators(response, dataset.id, dataset.uploaded_at)
+    
+    @action(detail=True, methods=['get'])
+    def series(self, request, pk=None):
+        """
+        A numeric column as a trend series downsampled to at most 'points'
+        points, with Largest-Triangle-Three-Buckets (default) or min/max
+        bucketing. Results are cached per dataset, column and resolution.
+        GET /api/datasets/{id}/series/?column=Pressure&points=500&method=lttb
+        """
+        dataset = self.get_object()
+        not_modified = self._not_modified(dataset.id, dataset.uploaded_at)
+        if not_modified is not None:
+            return not_modified
+        
+        columns = {col.lower(): col for col in get_numeric_columns()}
+        column = columns.get(request.query_params.get('column', '').lower())
+        method = request.query_params.get('method', 'lttb')
+        try:
+            if column is None:
+                raise ValueError(f"'column' must be one of: {', '.join(columns.values())}")
+            if method not in DOWNSAMPLERS:
+                raise ValueError(f"'method' must be one of: {', '.join(DOWNSAMPLERS)}")
+            points = _query_int(request, 'points', settings.SERIES_DEFAULT_POINTS,
+                                minimum=3, maximum=settings.SERIES_MAX_POINTS)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Datasets are immutable, so the upload time versions the cache key
+        cache_key = (
+            f'series:{dataset.id}:{int(dataset.uploaded_at.timestamp() * 1000000)}'
+            f':{column}:{method}:{points}'
+        )
+        data = cache.get(cache_key)
+        if data is None:
+            values = dataset.load_table([column]).column(column).to_numpy(zero_copy_only=False)
+            values = values.astype(np.float64)
+            x, y = downsample(np.arange(len(values), dtype=np.float64), values, points, method)
+            data = {
+                'column': column,
+                'method': method,
+                'points': len(y),
+                'total': len(values),
+                'x': x.astype(np.int64).tolist(),
+                'y': y.tolist(),
+            }
+            cache.set(cache_key, data, settings.SERIES_CACHE_TIMEOUT)
+        
+        response = Response({'id': dataset.id, **data})
+        return self._add_validators(response, dataset.id, dataset.uploaded_at)
+    
+    @action(detail=True, methods=['get'])
+    def distributions(self, request, pk=None):
+        """
+        Histograms and quantiles per numeric column, precomputed at upload,
+        so charts never need the rows. Optional ?type= narrows them to one
+        equipment type (bin edges stay shared), ?quantiles=0.1,0.9 picks
+        the quantiles and ?sketches=true adds the mergeable sketches.
+        GET /api/datasets/{id}/distributions/
+        """
+        dataset = self.get_object()
+        not_modified = self._not_modified(dataset.id, dataset.uploaded_at)
+        if not_modified is not None:
+            return not_modified
+        
+        stored = dataset.distributions or {'bins': 0, 'columns': {}, 'types': {}}
+        try:
+            quantiles = [
+                float(q) for q in request.query_params.get('quantiles', '0.05,0.25,0.5,0.75,0.95').split(',')
+                if q.strip()
+            ]
+        except ValueError:
+            quantiles = None
+        if quantiles is None or any(not 0 <= q <= 1 for q in quantiles):
+            return Response({
+                'error': "'quantiles' must be comma-separated numbers between 0 and 1"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        equipment_type = request.query_params.get('type')
+        if equipment_type is not None and equipment_type not in stored['types']:
+            return Response({
+                'error': f"Unknown equipment type: {equipment_type}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        include_sketches = _query_flag(request, 'sketches', default=False)
+        columns = {}
+        for col, overall in stored['columns'].items():
+            entry = stored['types'][equipment_type][col] if equipment_type else overall
+            sketch = QuantileSketch.from_dict(entry['sketch'])
+            
+            columns[col] = {
+                'edges': overall['edges'],
+                'counts': entry['counts'],
+                'quantiles': {
+                    str(q): None if np.isnan(value) else round(float(value), 4)
+                    for q, value in zip(quantiles, sketch.quantile(quantiles))
+                },
+            }
+            if include_sketches:
+                columns[col]['sketch'] = entry['sketch']
+        
+        response = Response({
+            'id': dataset.id,
+            'type': equipment_type,
+            'bins': stored['bins'],
+            'columns': columns,
+        })
+        return self._add_validators(response, dataset.id, dataset.uploaded_at)
+    
+    @action(detail=False, methods=['get'])
+    def compare(self, request):
+        """
+        Compare datasets: statistics of each one and of all combined,
+        overall and per equipment type. Combined statistics are merged
+        from the aggregates stored at upload, without reading rows.
+        GET /api/datasets/compare/?ids=1,2,3
+        """
+        try:
+            ids = _query_ids(request, settings.COMPARE_MAX_DATASETS)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        datasets = {dataset.id: dataset for dataset in self.get_queryset().filter(pk__in=ids)}
+        missing = [i for i in ids if i not in datasets]
+        if missing:
+            return Response({
+                'error': f"Datasets not found: {', '.join(map(str, missing))}"
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        results = []
+        for dataset_id in ids:
+            dataset = datasets[dataset_id]
+            summary_stats, type_stats = aggregates_to_stats(dataset.get_aggregates())
+            results.append({
+                'id': dataset.id,
+                'filename': dataset.filename,
+                'uploaded_at': dataset.uploaded_at,
+                'row_count': dataset.row_count,
+                'summary_stats': summary_stats,
+                'type_stats': type_stats,
+            })
+        
+        summary_stats, type_stats = aggregates_to_stats(
+            combine_aggregates([datasets[i].aggregates for i in ids])
+        )
+        return Response({
+            'datasets': results,
+            'combined': {
+                'row_count': summary_stats['total_count'],
+                'summary_stats': summary_stats,
+                'type_stats': type_stats,
+            },
         })
     
     @action(detail=True, methods=['get'])
@@ -173,32 +830,123 @@ class EquipmentDatasetViewSet(viewsets.ModelViewSet):
         GET /api/datasets/{id}/pdf/
         """
         dataset = self.get_object()
+        not_modified = self._not_modified(dataset.id, dataset.uploaded_at)
+        if not_modified is not None:
+            return not_modified
         
         try:
-            pdf_content = generate_pdf_report(dataset)
-            
-            response = HttpResponse(pdf_content, content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{dataset.filename}_report.pdf"'
+            # Rendered once per dataset and statistics, then streamed from disk
+            report = open(get_report_path(dataset), 'rb')
             
-            return response
+            response = FileResponse(
+                report,
+                as_attachment=True,
+                filename=f'{dataset.filename}_report.pdf',
+                content_type='application/pdf'
+            )
+            return self._add_validators(response, dataset.id, dataset.uploaded_at)
+        except ReportRenderBusy as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except Exception as e:
             return Response({
                 'error': f'Error generating PDF: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @action(detail=False, methods=['post'])
+    def export(self, request):
+        """
+        Render PDF reports for several datasets in parallel and stream
+        them back as a ZIP archive, each entry as soon as its report is
+        ready. Reports that fail after streaming started are listed in
+        an errors.txt entry at the end of the archive.
+        Body: {"ids": [1, 2, 3]}
+        POST /api/datasets/export/
+        """
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return Response({
+                'error': "Provide a non-empty list of dataset 'ids'"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            ids = list(dict.fromkeys(int(i) for i in ids))
+        except (TypeError, ValueError):
+            return Response({
+                'error': "'ids' must be integers"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(ids) > settings.EXPORT_MAX_DATASETS:
+            return Response({
+                'error': f'At most {settings.EXPORT_MAX_DATASETS} datasets can be exported at once'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        datasets = list(self.get_queryset().filter(pk__in=ids))
+        missing = sorted(set(ids) - {dataset.id for dataset in datasets})
+        if missing:
+            return Response({
+                'error': f"Datasets not found: {', '.join(map(str, missing))}"
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        # Archive entries follow the requested order
+        position = {dataset_id: i for i, dataset_id in enumerate(ids)}
+        datasets.sort(key=lambda dataset: position[dataset.id])
+        
+        # Wait for the first report before the response starts, so a busy
+        # renderer or a failing export is an error status; later reports
+        # are added to the streamed archive as each one finishes
+        results = iter_report_results(datasets)
+        dataset, path, error = next(results)
+        if error is not None:
+            results.close()
+            if isinstance(error, ReportRenderBusy):
+                return Response({
+                    'error': str(error)
+                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            return Response({
+                'error': f'Error generating PDF: {str(error)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        reports = itertools.chain([(dataset, path, error)], results)
+        response = StreamingHttpResponse(stream_reports_zip(reports), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="reports.zip"'
+        return response
+    
     def list(self, request, *args, **kwargs):
         """
-        List last 5 datasets for the current user.
+        List the datasets the current user's retention policy keeps,
+        newest first.
         GET /api/datasets/
         """
-        queryset = self.get_queryset()[:5]  # Only return last 5
-        serializer = self.get_serializer(queryset, many=True)
+        # Number the rows in the query itself, so the limit costs no
+        # extra query
+        position = Window(RowNumber(), order_by=(F('uploaded_at').desc(), F('id').desc()))
+        datasets = list(
+            self.get_queryset()
+            .annotate(position=position)
+            .filter(position__lte=RetentionPolicy.keep_count_expression(request.user))
+        )
+        serializer = self.get_serializer(datasets, many=True)
         return Response({
-            'count': queryset.count(),
+            'count': len(datasets),
             'results': serializer.data
         })
 
 
+class UploadJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Status of background upload jobs.
+    GET /api/jobs/{id}/
+    """
+    serializer_class = UploadJobSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        """Return only jobs belonging to the current user"""
+        return UploadJob.objects.filter(user=self.request.user).select_related('dataset')
+
+
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def health_check(request):
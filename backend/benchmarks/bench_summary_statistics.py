@@ -0,0 +1,69 @@
+"""
+Micro-benchmark for compute_summary_statistics.
+
+Compares the block-based statistics engine with the original per-column
+pandas implementation on a synthetic upload.
+
+Usage (from the backend directory):
+    python benchmarks/bench_summary_statistics.py [rows]
+"""
+import os
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'equipment_visualizer.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from api.utils import compute_summary_statistics  # noqa: E402
+
+
+def legacy_summary_statistics(df):
+    """Original implementation: up to nine scans per numeric column."""
+    stats = {
+        'total_count': int(len(df)),
+        'equipment_types': {str(k): int(v) for k, v in df['Type'].value_counts().to_dict().items()},
+    }
+    for col in ['Flowrate', 'Pressure', 'Temperature']:
+        stats[col.lower()] = {
+            'mean': float(round(df[col].mean(), 2)) if not df[col].isna().all() else 0.0,
+            'min': float(round(df[col].min(), 2)) if not df[col].isna().all() else 0.0,
+            'max': float(round(df[col].max(), 2)) if not df[col].isna().all() else 0.0,
+            'std': float(round(df[col].std(), 2)) if not df[col].isna().all() else 0.0,
+        }
+    return stats
+
+
+def make_frame(rows):
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({
+        'Equipment Name': [f'EQ-{i}' for i in range(rows)],
+        'Type': rng.choice(['Pump', 'Valve', 'Reactor', 'Heat Exchanger', 'Compressor'], rows),
+        'Flowrate': rng.normal(120, 30, rows),
+        'Pressure': rng.normal(6, 1.5, rows),
+        'Temperature': rng.normal(110, 20, rows),
+    })
+    df.loc[rng.choice(rows, rows // 100, replace=False), 'Pressure'] = np.nan
+    return df
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    df = make_frame(rows)
+    
+    assert compute_summary_statistics(df) == legacy_summary_statistics(df)
+    
+    for label, func in [('legacy', legacy_summary_statistics), ('block', compute_summary_statistics)]:
+        best = min(timeit.repeat(lambda: func(df), number=1, repeat=5))
+        print(f'{label:>8}: {best * 1000:8.1f} ms for {rows:,} rows')
+
+
+if __name__ == '__main__':
+    main()
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -102,16 +103,106 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Dataset rows are stored as Arrow IPC files under MEDIA_ROOT
+ROW_STORAGE_COMPRESSION = os.getenv('ROW_STORAGE_COMPRESSION', 'zstd')
+
+# Uploads are processed in the request unless ?async=true (or UPLOAD_ASYNC)
+# queues them for the in-process background pool; 0 workers runs jobs inline
+UPLOAD_ASYNC = os.getenv('UPLOAD_ASYNC', 'False') == 'True'
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+
+# A running upload job without progress for UPLOAD_JOB_STALE_AFTER seconds
+# was lost with its worker and is marked failed when a process starts;
+# finished jobs are deleted UPLOAD_JOB_RETENTION seconds after they end
+UPLOAD_JOB_STALE_AFTER = int(os.getenv('UPLOAD_JOB_STALE_AFTER', 600))
+UPLOAD_JOB_RETENTION = int(os.getenv('UPLOAD_JOB_RETENTION', 7 * 24 * 3600))
+
+# PDF reports render in a process pool; 0 workers renders in the request.
+# At most PDF_RENDER_MAX_CONCURRENCY renders run at once per API worker.
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', 2))
+PDF_RENDER_MAX_CONCURRENCY = int(os.getenv('PDF_RENDER_MAX_CONCURRENCY', 4))
+PDF_RENDER_TIMEOUT = float(os.getenv('PDF_RENDER_TIMEOUT', 30))
+
+# Token -> user lookups (without the password hash) are cached in-process
+# and in the Django cache; other processes see a logout, deactivation or
+# password change at most TOKEN_CACHE_TTL seconds later
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 30))
+
+# Datasets kept per user (RetentionPolicy overrides it per user), and when
+# older ones are deleted: 'sync' on upload, 'async' on the background
+# pool, or 'sweep' only by the periodic sweep_datasets command
+DATASET_HISTORY_LIMIT = int(os.getenv('DATASET_HISTORY_LIMIT', 5))
+DATASET_RETENTION_MODE = os.getenv('DATASET_RETENTION_MODE', 'sync')
+
+# Maximum number of datasets in one POST /api/datasets/export/
+EXPORT_MAX_DATASETS = int(os.getenv('EXPORT_MAX_DATASETS', 50))
+
+# Histogram bins and quantile sketch size (about compression / 2
+# centroids) precomputed per column and type for distribution charts
+HISTOGRAM_BINS = int(os.getenv('HISTOGRAM_BINS', 20))
+QUANTILE_SKETCH_COMPRESSION = int(os.getenv('QUANTILE_SKETCH_COMPRESSION', 100))
+
+# Outlier detection at upload: z-score threshold, IQR fence factor and
+# how many of the most extreme rows are listed in the PDF report
+ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', 3.0))
+ANOMALY_IQR_FACTOR = float(os.getenv('ANOMALY_IQR_FACTOR', 1.5))
+REPORT_MAX_ANOMALIES = int(os.getenv('REPORT_MAX_ANOMALIES', 20))
+
+# Downsampled trend series: default and maximum points per series, and
+# how long a computed series stays in the cache (seconds)
+SERIES_DEFAULT_POINTS = int(os.getenv('SERIES_DEFAULT_POINTS', 500))
+SERIES_MAX_POINTS = int(os.getenv('SERIES_MAX_POINTS', 5000))
+SERIES_CACHE_TIMEOUT = int(os.getenv('SERIES_CACHE_TIMEOUT', 3600))
+
+# In-memory row query and name search indexes, and the row file batch
+# offsets that query and anomaly pages are read by: how many are kept
+# per process, and how long one is kept after it is built (seconds)
+QUERY_INDEX_CACHE_SIZE = int(os.getenv('QUERY_INDEX_CACHE_SIZE', 32))
+QUERY_INDEX_CACHE_TTL = int(os.getenv('QUERY_INDEX_CACHE_TTL', 3600))
+
+# Default and maximum matches returned by GET /api/datasets/{id}/search/
+SEARCH_RESULTS_DEFAULT = int(os.getenv('SEARCH_RESULTS_DEFAULT', 20))
+SEARCH_RESULTS_MAX = int(os.getenv('SEARCH_RESULTS_MAX', 200))
+
+# Maximum number of datasets in one GET /api/datasets/compare/
+COMPARE_MAX_DATASETS = int(os.getenv('COMPARE_MAX_DATASETS', 20))
+
+# Default and maximum page size for GET /api/datasets/{id}/rows/
+ROWS_PAGE_SIZE = int(os.getenv('ROWS_PAGE_SIZE', 500))
+ROWS_PAGE_MAX = int(os.getenv('ROWS_PAGE_MAX', 10000))
+
+# Response compression: encodings in order of preference (br and zstd
+# need the brotli/zstandard packages), minimum body size and levels.
+# Only API data types are compressed: HTML and text pages such as the
+# admin and the browsable API carry CSRF tokens, which compressing would
+# expose to BREACH-style length attacks
+COMPRESSION_ENCODINGS = os.getenv('COMPRESSION_ENCODINGS', 'zstd,br,gzip').split(',')
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_LEVELS = {'gzip': 6, 'br': 5, 'zstd': 3}
+COMPRESSION_CONTENT_TYPES = [
+    'application/json',
+    'application/msgpack',
+    'application/vnd.apache.arrow.stream',
+]
+
+# Rows per INSERT when filling EquipmentReading at upload
+READING_BATCH_SIZE = int(os.getenv('READING_BATCH_SIZE', 5000))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 }
@@ -133,4 +224,20 @@ CSRF_TRUSTED_ORIGINS = os.getenv(
     'http://localhost:3000,http://localhost:5173'
 ).split(',')
 
-MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+# Uploads are hashed while they stream in so identical files can be reused
+FILE_UPLOAD_HANDLERS = [
+    'api.uploadhandlers.ContentHashUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Column schema for uploaded equipment CSVs. Every numeric column gets
+# mean/min/max/std in summary_stats under its lowercased name.
+EQUIPMENT_CSV_SCHEMA = {
+    'text_columns': ['Equipment Name', 'Type'],
+    'numeric_columns': ['Flowrate', 'Pressure', 'Temperature'],
+}
+
+# CSV uploads are parsed in bounded chunks, so the size limit only guards disk usage
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 512 * 1024 * 1024))
+CSV_CHUNK_SIZE = int(os.getenv('CSV_CHUNK_SIZE', 50000))
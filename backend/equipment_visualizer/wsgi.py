@@ -9,3 +9,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'equipment_visualizer.settings')
 
 application = get_wsgi_application()
+
+# Background jobs queued in memory are lost on restart; pick them up again
+from api.jobs import recover_upload_jobs_on_startup  # noqa: E402
+
+recover_upload_jobs_on_startup()
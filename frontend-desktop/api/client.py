@@ -1,5 +1,37 @@
 import requests
 import json
+import urllib3
+import msgpack
+import numpy as np
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+MSGPACK = 'application/msgpack'
+
+
+def decode_columns(content, content_type):
+    """
+    Decode a columnar binary response into a dict of NumPy arrays.
+    Numeric columns become float64 arrays (missing values as NaN),
+    text columns object arrays.
+    """
+    if content_type.startswith(ARROW_STREAM):
+        import pyarrow as pa
+        table = pa.ipc.open_stream(content).read_all()
+        return {
+            name: table.column(name).to_numpy(zero_copy_only=False)
+            for name in table.column_names
+        }
+    
+    payload = msgpack.unpackb(content, raw=False)
+    columns = {}
+    for name, values in payload['columns'].items():
+        dtype = payload['dtypes'][name]
+        if dtype == 'object':
+            columns[name] = np.array(values, dtype=object)
+        else:
+            columns[name] = np.frombuffer(values, dtype=dtype)
+    return columns
+
 
 class APIClient:
     """
@@ -9,6 +41,12 @@ class APIClient:
         self.base_url = base_url.rstrip('/')
         self.token = None
         self.session = requests.Session()
+        # Advertise every encoding urllib3 can decode here (gzip, plus br
+        # and zstd when brotli/zstandard are installed); responses are
+        # decoded transparently
+        self.session.headers['Accept-Encoding'] = urllib3.util.make_headers(accept_encoding=True)['accept-encoding']
+        # url -> (etag, json) for conditional re-fetches of datasets
+        self._etag_cache = {}
     
     def _get_headers(self):
         headers = {'Content-Type': 'application/json'}
@@ -71,6 +109,7 @@ class APIClient:
             pass
         finally:
             self.token = None
+            self._etag_cache.clear()
     
     def upload_csv(self, file_path):
         """Upload CSV file"""
@@ -88,6 +127,31 @@ class APIClient:
         else:
             raise Exception(response.json().get('error', 'Upload failed'))
     
+    def upload_csv_async(self, file_path):
+        """Queue CSV file for background processing and return the job"""
+        url = f'{self.base_url}/datasets/upload/'
+        headers = {}
+        if self.token:
+            headers['Authorization'] = f'Token {self.token}'
+        
+        with open(file_path, 'rb') as f:
+            files = {'file': f}
+            response = self.session.post(url, files=files, params={'async': 'true'}, headers=headers)
+        
+        if response.status_code == 202:
+            return response.json()['job']
+        else:
+            raise Exception(response.json().get('error', 'Upload failed'))
+    
+    def get_job(self, job_id):
+        """Get status of a background upload job"""
+        url = f'{self.base_url}/jobs/{job_id}/'
+        response = self.session.get(url, headers=self._get_headers())
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception('Failed to fetch job status')
+    
     def get_datasets(self):
         """Get list of datasets"""
         url = f'{self.base_url}/datasets/'
@@ -97,15 +161,102 @@ class APIClient:
         else:
             raise Exception('Failed to fetch datasets')
     
-    def get_dataset(self, dataset_id):
-        """Get specific dataset"""
+    def get_dataset(self, dataset_id, include_rows=True):
+        """Get specific dataset, optionally without its rows"""
         url = f'{self.base_url}/datasets/{dataset_id}/'
-        response = self.session.get(url, headers=self._get_headers())
+        params = {} if include_rows else {'include_rows': 'false'}
+        headers = self._get_headers()
+        cache_key = (url, include_rows)
+        cached = self._etag_cache.get(cache_key)
+        if cached:
+            headers['If-None-Match'] = cached[0]
+        
+        response = self.session.get(url, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached[1]
         if response.status_code == 200:
-            return response.json()
+            data = response.json()
+            if response.headers.get('ETag'):
+                self._etag_cache[cache_key] = (response.headers['ETag'], data)
+            return data
         else:
             raise Exception('Failed to fetch dataset')
     
+    def get_rows(self, dataset_id, offset=0, limit=500, fields=None):
+        """Get one page of dataset rows, optionally projected to some columns"""
+        url = f'{self.base_url}/datasets/{dataset_id}/rows/'
+        params = {'offset': offset, 'limit': limit}
+        if fields:
+            params['fields'] = ','.join(fields)
+        response = self.session.get(url, params=params, headers=self._get_headers())
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception('Failed to fetch rows')
+    
+    def query_rows(self, dataset_id, equipment_type=None, ranges=None, sort=None, offset=0, limit=500):
+        """
+        Get one page of rows matching a type and numeric ranges, e.g.
+        ranges={'Pressure': (6, None)}, optionally sorted by a column
+        ('-Pressure' for descending)
+        """
+        url = f'{self.base_url}/datasets/{dataset_id}/query/'
+        params = {'offset': offset, 'limit': limit}
+        if equipment_type:
+            params['type'] = equipment_type
+        for column, (low, high) in (ranges or {}).items():
+            if low is not None:
+                params[f'{column.lower()}_min'] = low
+            if high is not None:
+                params[f'{column.lower()}_max'] = high
+        if sort:
+            params['sort'] = sort
+        response = self.session.get(url, params=params, headers=self._get_headers())
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception('Failed to query rows')
+    
+    def search_equipment(self, dataset_id, text, mode='prefix', limit=20, equipment_type=None):
+        """Find equipment names by prefix or substring, for type-ahead lookups"""
+        url = f'{self.base_url}/datasets/{dataset_id}/search/'
+        params = {'q': text, 'mode': mode, 'limit': limit}
+        if equipment_type:
+            params['type'] = equipment_type
+        response = self.session.get(url, params=params, headers=self._get_headers())
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception('Failed to search equipment')
+    
+    def get_columns(self, dataset_id, fields=None, page_size=10000, media_type=MSGPACK):
+        """
+        Get dataset rows as NumPy arrays keyed by column, using a columnar
+        binary format (MessagePack by default, or Arrow if pyarrow is
+        installed). Follows the server's paging until all rows are read.
+        """
+        url = f'{self.base_url}/datasets/{dataset_id}/rows/'
+        params = {'offset': 0, 'limit': page_size}
+        if fields:
+            params['fields'] = ','.join(fields)
+        headers = self._get_headers()
+        headers['Accept'] = media_type
+        
+        pages = []
+        while url:
+            response = self.session.get(url, params=params, headers=headers)
+            if response.status_code != 200:
+                raise Exception('Failed to fetch rows')
+            pages.append(decode_columns(response.content, response.headers.get('Content-Type', '')))
+            
+            # The next page URL already carries the query parameters
+            url = response.links.get('next', {}).get('url')
+            params = None
+        
+        if len(pages) == 1:
+            return pages[0]
+        return {name: np.concatenate([page[name] for page in pages]) for name in pages[0]}
+    
     def get_summary(self, dataset_id):
         """Get dataset summary"""
         url = f'{self.base_url}/datasets/{dataset_id}/summary/'
@@ -115,6 +266,47 @@ class APIClient:
         else:
             raise Exception('Failed to fetch summary')
     
+    def get_anomalies(self, dataset_id, column=None, method=None, equipment_type=None):
+        """Get rows flagged as outliers, optionally filtered by column, method and type"""
+        url = f'{self.base_url}/datasets/{dataset_id}/anomalies/'
+        params = {'column': column, 'method': method, 'type': equipment_type}
+        params = {key: value for key, value in params.items() if value}
+        response = self.session.get(url, params=params, headers=self._get_headers())
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception('Failed to fetch anomalies')
+    
+    def get_series(self, dataset_id, column, points=500, method='lttb'):
+        """Get a numeric column downsampled to at most 'points' points"""
+        url = f'{self.base_url}/datasets/{dataset_id}/series/'
+        params = {'column': column, 'points': points, 'method': method}
+        response = self.session.get(url, params=params, headers=self._get_headers())
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception('Failed to fetch series')
+    
+    def get_distributions(self, dataset_id, equipment_type=None):
+        """Get precomputed histograms and quantiles per numeric column"""
+        url = f'{self.base_url}/datasets/{dataset_id}/distributions/'
+        params = {'type': equipment_type} if equipment_type else {}
+        response = self.session.get(url, params=params, headers=self._get_headers())
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception('Failed to fetch distributions')
+    
+    def compare_datasets(self, dataset_ids):
+        """Get per-dataset and combined statistics for several datasets"""
+        url = f'{self.base_url}/datasets/compare/'
+        params = {'ids': ','.join(str(i) for i in dataset_ids)}
+        response = self.session.get(url, params=params, headers=self._get_headers())
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise Exception('Failed to compare datasets')
+    
     def download_pdf(self, dataset_id, save_path):
         """Download PDF report"""
         url = f'{self.base_url}/datasets/{dataset_id}/pdf/'
@@ -126,3 +318,16 @@ class APIClient:
             return True
         else:
             raise Exception('Failed to download PDF')
+    
+    def export_reports(self, dataset_ids, save_path):
+        """Download PDF reports of several datasets as one ZIP archive"""
+        url = f'{self.base_url}/datasets/export/'
+        response = self.session.post(url, json={'ids': list(dataset_ids)},
+                                     headers=self._get_headers(), stream=True)
+        if response.status_code == 200:
+            with open(save_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=65536):
+                    f.write(chunk)
+            return True
+        else:
+            raise Exception('Failed to export reports')
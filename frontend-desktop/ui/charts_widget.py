@@ -11,6 +11,8 @@ class ChartsWidget(QWidget):
         super().__init__(parent)
         self.data = None
         self.summary = None
+        self.distributions = None
+        self.series = None
         self.init_ui()
     
     def init_ui(self):
@@ -26,10 +28,12 @@ class ChartsWidget(QWidget):
         
         self.setLayout(layout)
     
-    def load_data(self, data, summary):
+    def load_data(self, data, summary, distributions=None, series=None):
         """Load and display charts"""
         self.data = data
         self.summary = summary
+        self.distributions = distributions
+        self.series = series or {}
         
         # Clear previous charts
         for i in reversed(range(self.charts_layout.count())): 
@@ -56,6 +60,18 @@ class ChartsWidget(QWidget):
         canvas = FigureCanvas(figure)
         ax = figure.add_subplot(111)
         
+        # Precomputed histogram: size independent of the row count
+        flowrate = (self.distributions or {}).get('columns', {}).get('flowrate')
+        if flowrate:
+            edges = flowrate['edges']
+            ax.stairs(flowrate['counts'], edges, fill=True, color='#10b981')
+            ax.set_title('Flowrate Distribution')
+            ax.set_xlabel('Flowrate')
+            ax.set_ylabel('Equipment Count')
+            
+            figure.tight_layout()
+            return canvas
+        
         equipment_names = [row.get('Equipment Name', f'Eq {i}') for i, row in enumerate(self.data)]
         flowrates = [row.get('Flowrate', 0) for row in self.data]
         
@@ -75,9 +91,14 @@ class ChartsWidget(QWidget):
         canvas = FigureCanvas(figure)
         ax = figure.add_subplot(111)
         
-        pressures = [row.get('Pressure', 0) for row in self.data]
-        
-        ax.plot(pressures, marker='o', color='#f59e0b', linewidth=2)
+        series = self.series.get('Pressure')
+        if series:
+            # Downsampled on the server; markers only while every point is shown
+            marker = 'o' if series['points'] == series['total'] else None
+            ax.plot(series['x'], series['y'], marker=marker, color='#f59e0b', linewidth=2)
+        else:
+            pressures = [row.get('Pressure', 0) for row in self.data]
+            ax.plot(pressures, marker='o', color='#f59e0b', linewidth=2)
         ax.set_title('Pressure Trend')
         ax.set_xlabel('Equipment Index')
         ax.set_ylabel('Pressure')
@@ -92,9 +113,13 @@ class ChartsWidget(QWidget):
         canvas = FigureCanvas(figure)
         ax = figure.add_subplot(111)
         
-        temperatures = [row.get('Temperature', 0) for row in self.data]
-        
-        ax.plot(temperatures, marker='s', color='#ef4444', linewidth=2)
+        series = self.series.get('Temperature')
+        if series:
+            marker = 's' if series['points'] == series['total'] else None
+            ax.plot(series['x'], series['y'], marker=marker, color='#ef4444', linewidth=2)
+        else:
+            temperatures = [row.get('Temperature', 0) for row in self.data]
+            ax.plot(temperatures, marker='s', color='#ef4444', linewidth=2)
         ax.set_title('Temperature Trend')
         ax.set_xlabel('Equipment Index')
         ax.set_ylabel('Temperature')
@@ -1,7 +1,8 @@
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QTabWidget,
                              QPushButton, QFileDialog, QMessageBox, QMenuBar,
-                             QMenu, QAction, QLabel, QInputDialog, QHBoxLayout, QScrollArea)
-from PyQt5.QtCore import Qt
+                             QMenu, QAction, QLabel, QInputDialog, QHBoxLayout, QScrollArea,
+                             QLineEdit, QCompleter)
+from PyQt5.QtCore import Qt, QStringListModel
 from api.client import APIClient
 from ui.login_dialog import LoginDialog
 from ui.data_table_widget import DataTableWidget
@@ -98,6 +99,21 @@ class MainWindow(QMainWindow):
         self.summary_widget = SummaryWidget()
         viz_layout.addWidget(self.summary_widget)
         
+        # Equipment name search with type-ahead from the server's name index
+        self.search_matches = {}
+        self.search_model = QStringListModel()
+        search_completer = QCompleter(self.search_model, self)
+        search_completer.setCaseSensitivity(Qt.CaseInsensitive)
+        search_completer.setFilterMode(Qt.MatchContains)
+        search_completer.activated[str].connect(self.handle_search_selected)
+        
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText('Search equipment name...')
+        self.search_input.setCompleter(search_completer)
+        self.search_input.textEdited.connect(self.handle_search_edited)
+        self.search_input.setEnabled(False)
+        viz_layout.addWidget(self.search_input)
+        
         # Data table
         self.data_table = DataTableWidget()
         self.data_table.setMinimumHeight(400)  # Ensure table has enough height
@@ -200,15 +216,51 @@ class MainWindow(QMainWindow):
         self.current_dataset = dataset
         self.dataset_label.setText(f"Dataset: {dataset.get('filename', 'Unknown')}")
         self.pdf_btn.setEnabled(True)
+        self.search_input.clear()
+        self.search_input.setEnabled(True)
         
         # Load data
         raw_data = dataset.get('raw_data', [])
         summary_stats = dataset.get('summary_stats', {})
         row_count = dataset.get('row_count', 0)
         
+        # Charts use precomputed histograms and downsampled trend series
+        # when available
+        try:
+            distributions = self.api_client.get_distributions(dataset['id'])
+            series = {
+                column: self.api_client.get_series(dataset['id'], column)
+                for column in ('Pressure', 'Temperature')
+            }
+        except Exception:
+            distributions = None
+            series = None
+        
         self.summary_widget.load_stats(summary_stats, row_count)
         self.data_table.load_data(raw_data)
-        self.charts_widget.load_data(raw_data, summary_stats)
+        self.charts_widget.load_data(raw_data, summary_stats, distributions, series)
+    
+    def handle_search_edited(self, text):
+        """Refresh the type-ahead suggestions for the typed name"""
+        text = text.strip()
+        if not text or not self.current_dataset:
+            self.search_model.setStringList([])
+            return
+        
+        mode = 'prefix' if len(text) < 3 else 'substring'
+        try:
+            results = self.api_client.search_equipment(self.current_dataset['id'], text, mode)['results']
+        except Exception:
+            return
+        self.search_matches = {match['name']: match['row'] for match in results if match['name']}
+        self.search_model.setStringList(list(self.search_matches))
+    
+    def handle_search_selected(self, name):
+        """Select and scroll to the row of the chosen equipment"""
+        row = self.search_matches.get(name)
+        if row is not None and row < self.data_table.rowCount():
+            self.data_table.selectRow(row)
+            self.data_table.scrollToItem(self.data_table.item(row, 0))
     
     def handle_download_pdf(self):
         """Download PDF report"""
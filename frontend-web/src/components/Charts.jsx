@@ -1,3 +1,4 @@
+import { useEffect, useState } from 'react';
 import {
     Chart as ChartJS,
     CategoryScale,
@@ -11,6 +12,7 @@ import {
     Legend,
 } from 'chart.js';
 import { Bar, Line, Doughnut } from 'react-chartjs-2';
+import { datasetAPI } from '../services/api';
 import './Charts.css';
 
 ChartJS.register(
@@ -25,12 +27,47 @@ ChartJS.register(
     Legend
 );
 
-function Charts({ data, summary }) {
+function Charts({ data, summary, datasetId }) {
+    const [distributions, setDistributions] = useState(null);
+
+    // Distribution charts use the histograms precomputed at upload
+    useEffect(() => {
+        setDistributions(null);
+        if (!datasetId) return undefined;
+
+        let cancelled = false;
+        datasetAPI.getDistributions(datasetId)
+            .then((response) => {
+                if (!cancelled) setDistributions(response.data);
+            })
+            .catch(() => {
+                if (!cancelled) setDistributions(null);
+            });
+        return () => {
+            cancelled = true;
+        };
+    }, [datasetId]);
+
     if (!data || data.length === 0) {
         return <div className="no-data">No data available for visualization</div>;
     }
 
-    const flowrateData = {
+    // Precomputed histogram: size independent of the row count
+    const flowrateHistogram = distributions?.columns?.flowrate;
+    const flowrateData = flowrateHistogram ? {
+        labels: flowrateHistogram.counts.map((_, i) => (
+            `${flowrateHistogram.edges[i].toFixed(1)}–${flowrateHistogram.edges[i + 1].toFixed(1)}`
+        )),
+        datasets: [
+            {
+                label: 'Equipment Count',
+                data: flowrateHistogram.counts,
+                backgroundColor: 'rgba(16, 185, 129, 0.6)',
+                borderColor: 'rgba(16, 185, 129, 1)',
+                borderWidth: 2,
+            },
+        ],
+    } : {
         labels: data.map((row, idx) => row['Equipment Name'] || `Equipment ${idx + 1}`),
         datasets: [
             {
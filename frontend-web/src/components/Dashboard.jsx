@@ -144,11 +144,12 @@ function Dashboard({ user, onLogout }) {
                                 rowCount={currentDataset.row_count}
                             />
 
-                            <DataTable data={currentDataset.raw_data} />
+                            <DataTable data={currentDataset.raw_data} datasetId={currentDataset.id} />
 
                             <Charts
                                 data={currentDataset.raw_data}
                                 summary={currentDataset.summary_stats}
+                                datasetId={currentDataset.id}
                             />
                         </div>
                     )}
@@ -1,15 +1,75 @@
+import { useEffect, useRef, useState } from 'react';
+import { datasetAPI } from '../services/api';
 import './DataTable.css';
 
-function DataTable({ data }) {
+function DataTable({ data, datasetId }) {
+    const [query, setQuery] = useState('');
+    const [matches, setMatches] = useState([]);
+    const [selectedRow, setSelectedRow] = useState(null);
+    const rowRefs = useRef({});
+
+    // Type-ahead suggestions come from the dataset's server-side name index
+    useEffect(() => {
+        const text = query.trim();
+        if (!datasetId || !text) {
+            setMatches([]);
+            return undefined;
+        }
+
+        let cancelled = false;
+        const timer = setTimeout(async () => {
+            try {
+                const response = await datasetAPI.searchEquipment(datasetId, text);
+                if (!cancelled) setMatches(response.data.results);
+            } catch {
+                if (!cancelled) setMatches([]);
+            }
+        }, 150);
+        return () => {
+            cancelled = true;
+            clearTimeout(timer);
+        };
+    }, [datasetId, query]);
+
     if (!data || data.length === 0) {
         return <div className="no-data">No data available</div>;
     }
 
     const columns = Object.keys(data[0]);
 
+    const handleSearchChange = (e) => {
+        const value = e.target.value;
+        setQuery(value);
+
+        // Picking a suggestion jumps to its row
+        const match = matches.find((m) => m.name === value);
+        if (match) {
+            setSelectedRow(match.row);
+            rowRefs.current[match.row]?.scrollIntoView({ block: 'center', behavior: 'smooth' });
+        }
+    };
+
     return (
         <div className="data-table-wrapper">
             <h3>Equipment Data</h3>
+            {datasetId && (
+                <div className="table-search">
+                    <input
+                        type="search"
+                        list="equipment-names"
+                        placeholder="Search equipment name..."
+                        value={query}
+                        onChange={handleSearchChange}
+                    />
+                    <datalist id="equipment-names">
+                        {matches.map((match) => (
+                            <option key={match.row} value={match.name}>
+                                {match.type}
+                            </option>
+                        ))}
+                    </datalist>
+                </div>
+            )}
             <div className="table-container">
                 <table className="data-table">
                     <thead>
@@ -21,7 +81,11 @@ function DataTable({ data }) {
                     </thead>
                     <tbody>
                         {data.map((row, idx) => (
-                            <tr key={idx}>
+                            <tr
+                                key={idx}
+                                ref={(el) => { rowRefs.current[idx] = el; }}
+                                className={idx === selectedRow ? 'selected' : undefined}
+                            >
                                 {columns.map((column) => (
                                     <td key={column}>
                                         {row[column] !== null && row[column] !== undefined
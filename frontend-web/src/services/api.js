@@ -39,21 +39,46 @@ export const authAPI = {
 };
 
 export const datasetAPI = {
-  uploadCSV: (file) => {
+  uploadCSV: (file, { async = false } = {}) => {
     const formData = new FormData();
     formData.append('file', file);
     return api.post('/datasets/upload/', formData, {
+      params: async ? { async: 'true' } : {},
       headers: {
         'Content-Type': 'multipart/form-data',
       },
     });
   },
+  getJob: (id) => api.get(`/jobs/${id}/`),
   getDatasets: () => api.get('/datasets/'),
-  getDataset: (id) => api.get(`/datasets/${id}/`),
+  getDataset: (id, { includeRows = true } = {}) => api.get(`/datasets/${id}/`, {
+    params: includeRows ? {} : { include_rows: 'false' },
+  }),
+  getRows: (id, { offset = 0, limit = 500, fields } = {}) => api.get(`/datasets/${id}/rows/`, {
+    params: { offset, limit, ...(fields ? { fields: fields.join(',') } : {}) },
+  }),
+  // filters: { type, pressure_min, pressure_max, ..., sort: '-Pressure' }
+  queryRows: (id, filters = {}, { offset = 0, limit = 500 } = {}) => api.get(`/datasets/${id}/query/`, {
+    params: { ...filters, offset, limit },
+  }),
+  searchEquipment: (id, q, { mode = 'prefix', limit = 20, type } = {}) => api.get(`/datasets/${id}/search/`, {
+    params: { q, mode, limit, ...(type ? { type } : {}) },
+  }),
   getSummary: (id) => api.get(`/datasets/${id}/summary/`),
   downloadPDF: (id) => api.get(`/datasets/${id}/pdf/`, {
     responseType: 'blob',
   }),
+  getAnomalies: (id, params = {}) => api.get(`/datasets/${id}/anomalies/`, { params }),
+  getSeries: (id, column, { points = 500, method = 'lttb' } = {}) => api.get(`/datasets/${id}/series/`, {
+    params: { column, points, method },
+  }),
+  getDistributions: (id, { type } = {}) => api.get(`/datasets/${id}/distributions/`, {
+    params: type ? { type } : {},
+  }),
+  compareDatasets: (ids) => api.get('/datasets/compare/', { params: { ids: ids.join(',') } }),
+  exportReports: (ids) => api.post('/datasets/export/', { ids }, {
+    responseType: 'blob',
+  }),
 };
 
 export const healthCheck = () => api.get('/health/');